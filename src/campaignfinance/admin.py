@@ -5,22 +5,31 @@ from .models import (Industry, IndustrySector, EntityCategory, Entity, ExternalI
                     FormerOfficeHolder, Campaign, ElectionCategory, Election,
                     DocumentCategory, Document, ReportedTotals, ReportedSubtotals,
                     TransactionCategory, Transaction, AddressCategory, Address,
-                    PhoneNumber, Email, Website, AssumedName)
+                    PhoneNumber, Email, Website, AssumedName, ViolationCategory)
+from .categories import filter_by_category
+from .pagination import EstimatedCountPaginator
+
+# Changelists follow every foreign key they display with list_select_related,
+# so a page of rows costs the same few queries however many rows it shows.
+
+
+class LargeTableMixin:
+    """
+    For the changelists of tables with millions of rows: estimate the total
+    instead of counting every row, and do not count the unfiltered table on
+    top of filtered results.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class EntityFilterModelAdmin(admin.ModelAdmin):
     entity_categories = {}
 
     def get_queryset_by_type(self, name):
-        category = EntityCategory.objects.get(name=name)
-        entities_queryset = Entity.objects.filter(category=category)
-        if entities_queryset.exists():
-            return entities_queryset
-        else:
-            return Entity.objects.none()
+        return filter_by_category(Entity.objects.all(), EntityCategory, name)
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        print(db_field.name)
         if db_field.name in self.entity_categories:
             entity_category_name = self.entity_categories[db_field.name]
             kwargs['queryset'] = self.get_queryset_by_type(entity_category_name)
@@ -57,7 +66,7 @@ class AddressInLine(admin.TabularInline):
     autocomplete_fields = ['address']
 
 
-class EntityAdmin(admin.ModelAdmin):
+class EntityAdmin(LargeTableMixin, admin.ModelAdmin):
     fieldsets = [
         (None, {'fields': ['category']}),
         ('Name', {'fields': ['prefix', 'first_name', 'middle_name', 'last_name', 'suffix', 'nickname']}),
@@ -77,16 +86,18 @@ class EntityAdmin(admin.ModelAdmin):
 admin.site.register(Entity, EntityAdmin)
 
 
-class ExternalIdAdmin(EntityFilterModelAdmin):
+class ExternalIdAdmin(LargeTableMixin, EntityFilterModelAdmin):
     entity_categories = {
         'parent_entity': 'government'
     }
 
+    @admin.display(ordering='parent_entity__last_name')
     def reporting_agency(self, obj):
-        return obj.parent_entity.last_name
+        return obj.parent_entity.last_name if obj.parent_entity else ''
 
+    @admin.display(ordering='child_entity__last_name')
     def reported_entity(self, obj):
-        return obj.child_entity.last_name
+        return obj.child_entity.last_name if obj.child_entity else ''
 
     fieldsets = [
         ('Reporting Agency', {'fields': ['parent_entity']}),
@@ -95,6 +106,7 @@ class ExternalIdAdmin(EntityFilterModelAdmin):
     ]
 
     list_display = ('reporting_agency', 'reported_entity', 'number')
+    list_select_related = ('parent_entity', 'child_entity')
 
     autocomplete_fields = ['parent_entity', 'child_entity']
 
@@ -109,10 +121,12 @@ class RelationshipCategoryAdmin(admin.ModelAdmin):
 admin.site.register(RelationshipCategory, RelationshipCategoryAdmin)
 
 
-class RelationshipAdmin(admin.ModelAdmin):
+class RelationshipAdmin(LargeTableMixin, admin.ModelAdmin):
+    @admin.display(ordering='parent_entity__last_name')
     def parent_entity(self, obj):
         return f"{obj.parent_entity.first_name} {obj.parent_entity.last_name}"
 
+    @admin.display(ordering='child_entity__last_name')
     def child_entity(self, obj):
         return f"{obj.child_entity.first_name} {obj.child_entity.last_name}"
 
@@ -123,6 +137,7 @@ class RelationshipAdmin(admin.ModelAdmin):
     ]
 
     list_display = ('category', 'parent_entity', 'child_entity')
+    list_select_related = ('category', 'parent_entity', 'child_entity')
 
     autocomplete_fields = ['parent_entity', 'child_entity']
 
@@ -144,9 +159,11 @@ class OfficeAdmin(EntityFilterModelAdmin):
         'holder_entity': 'individual'
     }
 
+    @admin.display(ordering='government_entity__last_name')
     def government(self, obj):
-        return f"{obj.government_entity.last_name}"
+        return obj.government_entity.last_name if obj.government_entity else ''
 
+    @admin.display(ordering='holder_entity__last_name')
     def office_holder(self, obj):
         holder = ''
 
@@ -157,7 +174,8 @@ class OfficeAdmin(EntityFilterModelAdmin):
 
     fields = ['name', 'government_entity', 'holder_entity']
 
-    list_display = ('name', 'government_entity', 'office_holder')
+    list_display = ('name', 'government', 'office_holder')
+    list_select_related = ('government_entity', 'holder_entity')
 
     search_fields = ['name']
 
@@ -174,6 +192,7 @@ class FormerOfficeHolderAdmin(admin.ModelAdmin):
     ]
 
     list_display = ('office', 'entity')
+    list_select_related = ('office', 'entity')
 
     autocomplete_fields = ['office', 'entity']
 
@@ -181,7 +200,7 @@ class FormerOfficeHolderAdmin(admin.ModelAdmin):
 admin.site.register(FormerOfficeHolder, FormerOfficeHolderAdmin)
 
 
-class CampaignAdmin(EntityFilterModelAdmin):
+class CampaignAdmin(LargeTableMixin, EntityFilterModelAdmin):
     entity_categories = {
         'candidate_entity': 'individual',
         'treasurer_entity': 'individual',
@@ -203,6 +222,7 @@ class CampaignAdmin(EntityFilterModelAdmin):
                     'candidate_entity',
                     'office_sought',
     ]
+    list_select_related = ('committee_entity', 'category', 'candidate_entity', 'office_sought')
 
     search_fields = ['name']
 
@@ -231,6 +251,7 @@ class ElectionAdmin(EntityFilterModelAdmin):
     ]
 
     list_display = ['date', 'government_entity', 'category']
+    list_select_related = ('government_entity', 'category')
 
     search_fields = ['date']
 
@@ -247,7 +268,7 @@ class DocumentCategoryAdmin(admin.ModelAdmin):
 admin.site.register(DocumentCategory, DocumentCategoryAdmin)
 
 
-class DocumentAdmin(EntityFilterModelAdmin):
+class DocumentAdmin(LargeTableMixin, EntityFilterModelAdmin):
     entity_categories = {
         'officer_oath_entity': 'individual'
     }
@@ -261,6 +282,7 @@ class DocumentAdmin(EntityFilterModelAdmin):
     ]
 
     list_display = ['name', 'category', 'date_filed']
+    list_select_related = ('category',)
 
     search_fields = ['name']
 
@@ -290,6 +312,7 @@ class ReportedTotalsAdmin(admin.ModelAdmin):
     ]
 
     list_display = ['document', 'contributions', 'expenditures']
+    list_select_related = ('document',)
 
     autocomplete_fields = ['document']
 
@@ -334,6 +357,7 @@ class ReportedSubtotalsAdmin(admin.ModelAdmin):
         'monetary_political_contributions',
         'expenditures_from_contributions',
     ]
+    list_select_related = ('document',)
 
     autocomplete_fields = ['document']
 
@@ -348,10 +372,7 @@ class TransactionCategoryAdmin(admin.ModelAdmin):
 admin.site.register(TransactionCategory, TransactionCategoryAdmin)
 
 
-class TransactionAdmin(EntityFilterModelAdmin):
-    entity_categories = {
-        'government_entity': 'government',
-    }
+class TransactionAdmin(LargeTableMixin, EntityFilterModelAdmin):
 
     fieldsets = [
         (None, {'fields': ['category']}),
@@ -368,6 +389,7 @@ class TransactionAdmin(EntityFilterModelAdmin):
     ]
 
     list_display = ['recorded_date', 'payer_entity', 'payee_entity', 'amount']
+    list_select_related = ('payer_entity', 'payee_entity')
 
     autocomplete_fields = ['campaign', 'payer_entity', 'payee_entity', 'document']
 
@@ -375,6 +397,13 @@ class TransactionAdmin(EntityFilterModelAdmin):
 admin.site.register(Transaction, TransactionAdmin)
 
 
+class ViolationCategoryAdmin(admin.ModelAdmin):
+    fields = ['name', 'description']
+
+
+admin.site.register(ViolationCategory, ViolationCategoryAdmin)
+
+
 class AddressCategoryAdmin(admin.ModelAdmin):
     fields = ['name']
 
@@ -382,7 +411,7 @@ class AddressCategoryAdmin(admin.ModelAdmin):
 admin.site.register(AddressCategory, AddressCategoryAdmin)
 
 
-class AddressAdmin(admin.ModelAdmin):
+class AddressAdmin(LargeTableMixin, admin.ModelAdmin):
     fieldsets = [
         (None, {'fields': ['category']}),
         ('Street Address', {'fields': [
@@ -412,6 +441,7 @@ class AddressAdmin(admin.ModelAdmin):
         'state_name',
         'zip_code',
     ]
+    list_select_related = ('category',)
 
     search_fields = ['building_number', 'street_name', 'unit_number', 'floor_number', 'zip_code']
 
@@ -436,6 +466,7 @@ class PhoneNumberAdmin(admin.ModelAdmin):
         'number',
         'owner',
     ]
+    list_select_related = ('owner',)
 
     autocomplete_fields = ['owner', 'associated_entities']
 
@@ -455,6 +486,7 @@ class EmailAdmin(admin.ModelAdmin):
         'address',
         'owner',
     ]
+    list_select_related = ('owner',)
 
     autocomplete_fields = ['owner', 'associated_entities']
 
@@ -474,6 +506,7 @@ class WebsiteAdmin(admin.ModelAdmin):
         'address',
         'owner',
     ]
+    list_select_related = ('owner',)
 
     autocomplete_fields = ['owner', 'associated_entities']
 
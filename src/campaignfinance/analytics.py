@@ -0,0 +1,193 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+
+from .categories import get_category_id
+from .models import Entity, Address, Transaction, TransactionCategory, IndustryMonthTotal, PlaceTotal
+from .summaries import add_to_row, move_donor_industry
+
+# Rollups of contributions along the donors' industry and home address, so the
+# analytics pages group a few thousand rollup rows instead of the transactions
+# table. Contributions are the transactions in the 'contribution' category
+# with a payer; a donor's home is the residence added first (lowest pk).
+#
+# Like the campaign summaries (summaries.py) the rollups are kept current by
+# the signal handlers in signals.py: one transaction at a time, and one donor
+# at a time when its industry or home changes. Bulk writes must call
+# rebuild_analytics() (or the management command) afterwards.
+#
+# Industries are rolled up rather than sectors, which are joined in when
+# reading, so moving an industry to another sector needs no rebuild.
+
+CONTRIBUTION = 'contribution'
+
+PLACE_FIELDS = ('state_name', 'county_name', 'zip_code')
+
+
+def get_month(day):
+    return day.replace(day=1)
+
+
+def get_home_places(entity_ids):
+    """{entity id: (state, county, zip code)} of the entities' homes."""
+    residences = (
+        Address.residents.through.objects.filter(entity_id__in=entity_ids)
+        .order_by('entity_id', '-address_id')
+        .values_list('entity_id', *(f'address__{name}' for name in PLACE_FIELDS))
+    )
+    # Ordered by descending address so the lowest one is written last
+    return {entity_id: tuple(place) for entity_id, *place in residences}
+
+
+def get_donors(entity_ids):
+    """{entity id: (industry id, home place)}, what the rollups file an entity's contributions under."""
+    places = get_home_places(entity_ids)
+    return {
+        pk: (industry_id, places.get(pk))
+        for pk, industry_id in Entity.objects.filter(pk__in=entity_ids).values_list('pk', 'industry_id')
+    }
+
+
+def add_month_total(industry_id, month, amount, count):
+    lookup = {'industry_id': industry_id, 'month': month}
+    add_to_row(IndustryMonthTotal, lookup, {'total': amount, 'count': count})
+    if count < 0:
+        IndustryMonthTotal.objects.filter(**lookup, count__lte=0).delete()
+
+
+def add_place_total(place, amount, count):
+    lookup = dict(zip(PLACE_FIELDS, place))
+    add_to_row(PlaceTotal, lookup, {'total': amount, 'count': count})
+    if count < 0:
+        PlaceTotal.objects.filter(**lookup, count__lte=0).delete()
+
+
+def apply_contribution(state, sign):
+    """Adds (sign=1) or removes (sign=-1) one transaction from the rollups, if it is a contribution."""
+    if state.payer_entity_id is None or state.category_id is None:
+        return
+    if state.category_id != get_category_id(TransactionCategory, CONTRIBUTION):
+        return
+    donor = get_donors([state.payer_entity_id]).get(state.payer_entity_id)
+    if donor is None:
+        return
+
+    industry_id, place = donor
+    amount = state.amount * sign
+    if industry_id is not None:
+        add_month_total(industry_id, get_month(state.recorded_date), amount, sign)
+    if place is not None:
+        add_place_total(place, amount, sign)
+
+
+def get_contributions(entity_ids):
+    return Transaction.objects.filter(
+        payer_entity_id__in=entity_ids,
+        category_id=get_category_id(TransactionCategory, CONTRIBUTION),
+    )
+
+
+def move_donors(before, after):
+    """
+    Refiles the contributions of donors whose industry or home changed.
+    before and after are get_donors() results for the same entities, after
+    missing an entity if it is being deleted.
+    """
+    for entity_id, (old_industry_id, old_place) in before.items():
+        new_industry_id, new_place = after.get(entity_id, (None, None))
+
+        if new_industry_id != old_industry_id:
+            move_donor_industry(entity_id, old_industry_id, new_industry_id)
+            months = (
+                get_contributions([entity_id]).annotate(month=TruncMonth('recorded_date'))
+                .values('month').annotate(total=Sum('amount'), count=Count('pk'))
+            )
+            for row in months:
+                if old_industry_id is not None:
+                    add_month_total(old_industry_id, row['month'], -row['total'], -row['count'])
+                if new_industry_id is not None:
+                    add_month_total(new_industry_id, row['month'], row['total'], row['count'])
+
+        if new_place != old_place:
+            totals = get_contributions([entity_id]).aggregate(total=Sum('amount'), count=Count('pk'))
+            if totals['count']:
+                if old_place is not None:
+                    add_place_total(old_place, -totals['total'], -totals['count'])
+                if new_place is not None:
+                    add_place_total(new_place, totals['total'], totals['count'])
+
+
+@transaction.atomic
+def rebuild_analytics(batch_size=2000):
+    """Recomputes the rollups from the transactions table."""
+    IndustryMonthTotal.objects.all().delete()
+    PlaceTotal.objects.all().delete()
+    contributions = Transaction.objects.filter(
+        payer_entity__isnull=False,
+        category_id=get_category_id(TransactionCategory, CONTRIBUTION),
+    )
+
+    months = (
+        contributions.filter(payer_entity__industry__isnull=False)
+        .annotate(month=TruncMonth('recorded_date'))
+        .values('payer_entity__industry_id', 'month')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    IndustryMonthTotal.objects.bulk_create([
+        IndustryMonthTotal(
+            industry_id=row['payer_entity__industry_id'], month=row['month'], total=row['total'], count=row['count'],
+        ) for row in months
+    ], batch_size=batch_size)
+
+    # Joined to every residence of the payer, of which only the home is kept
+    home = Address.residents.through.objects.filter(entity_id=OuterRef('payer_entity_id')).order_by('address_id')
+    places = (
+        contributions.filter(payer_entity__entity_residences=Subquery(home.values('address_id')[:1]))
+        .values(*(f'payer_entity__entity_residences__{name}' for name in PLACE_FIELDS))
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    PlaceTotal.objects.bulk_create([
+        PlaceTotal(
+            **{name: row[f'payer_entity__entity_residences__{name}'] for name in PLACE_FIELDS},
+            total=row['total'],
+            count=row['count'],
+        ) for row in places
+    ], batch_size=batch_size)
+
+    return {'months': IndustryMonthTotal.objects.count(), 'places': PlaceTotal.objects.count()}
+
+
+# Reading
+
+def get_sector_totals(period='year', sector=None):
+    """
+    Contributions by sector and period, 'year' or 'month', as dicts of
+    period, sector_uuid, sector_name (None for industries without a sector),
+    total and count.
+    """
+    trunc = TruncYear if period == 'year' else TruncMonth
+    totals = IndustryMonthTotal.objects.all()
+    if sector is not None:
+        totals = totals.filter(industry__sector=sector)
+    return (
+        totals.annotate(period=trunc('month'))
+        .values('period', sector_uuid=F('industry__sector__uuid'), sector_name=F('industry__sector__name'))
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('period', 'sector_name')
+    )
+
+
+PLACE_GROUPINGS = {
+    'county': ('state_name', 'county_name'),
+    'zip': ('state_name', 'county_name', 'zip_code'),
+}
+
+
+def get_place_totals(by='county', **filters):
+    """Contributions by county or zip code, largest first. filters are PlaceTotal lookups."""
+    return (
+        PlaceTotal.objects.filter(**filters)
+        .values(*PLACE_GROUPINGS[by])
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('-total', *PLACE_GROUPINGS[by])
+    )
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import uuid
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FileField
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views import generic
+
+from .pagination import paginate_keyset
+
+# Read-only JSON API over every model with a uuid, at /api/v1/<model name>/
+# and /api/v1/<model name>/<uuid>/. Rows are read with values(), so no model
+# instances are built, and refer to each other by uuid:
+#
+#   ?fields=uuid,amount,payer_entity    only these fields
+#   ?include=payer_entity,category     the related rows themselves instead of
+#                                      their uuids, one query per relation
+#   ?payer_entity=<uuid>               rows pointing at that row (lists)
+#   ?limit=100&cursor=...              keyset pagination, pk order (lists)
+#
+# Responses carry an ETag, and a matching If-None-Match gets a 304.
+#
+# Files link to the view that serves them, as MEDIA_URL is only reachable
+# through it behind nginx.
+
+# The URL names of the views serving each file field, by its model's label
+FILE_VIEWS = {
+    'campaignfinance.document.uploaded_file': 'campaignfinance:documentfile',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Resource:
+    """How the rows of one model are read and turned into JSON objects."""
+    def __init__(self, model):
+        self.model = model
+        self.name = model._meta.model_name
+        self.fields = {field.name: field for field in model._meta.concrete_fields if not field.primary_key}
+        self.fields.update((field.name, field) for field in model._meta.many_to_many)
+        self.relations = {name for name, field in self.fields.items() if field.is_relation}
+        # Many to many fields are only listed when asked for
+        self.default_fields = [name for name, field in self.fields.items() if not field.many_to_many]
+
+    def parse_list(self, value, allowed, param):
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ApiError(f"Unknown {param} for {self.name}: {', '.join(unknown)}")
+        return names
+
+    def get_fields(self, request):
+        value = request.GET.get('fields')
+        if not value:
+            return list(self.default_fields)
+        names = self.parse_list(value, self.fields, 'fields')
+        return names if 'uuid' in names else ['uuid', *names]
+
+    def get_include(self, request, fields):
+        """The relations to embed, which are added to fields if missing."""
+        names = self.parse_list(request.GET.get('include', ''), self.relations, 'include')
+        fields.extend(name for name in names if name not in fields)
+        return names
+
+    def filter(self, queryset, request):
+        """Filters on ?<foreign key>=<uuid>."""
+        for name, value in request.GET.items():
+            field = self.fields.get(name)
+            if field is None or not field.many_to_one:
+                continue
+            try:
+                queryset = queryset.filter(**{f'{name}__uuid': uuid.UUID(value)})
+            except ValueError:
+                raise ApiError(f"Invalid uuid for {name}: {value}")
+        return queryset
+
+    def get_values(self, queryset, fields, include):
+        """A values() queryset with what serialize() needs for these fields."""
+        lookups = [self.model._meta.pk.attname]
+        for name in fields:
+            field = self.fields[name]
+            if field.many_to_many:
+                continue
+            if field.is_relation:
+                lookups.append(field.attname if name in include else f'{name}__uuid')
+            else:
+                lookups.append(name)
+        return queryset.values(*lookups)
+
+    def serialize(self, rows, fields, include):
+        """Turns get_values() rows into API objects, fetching included and many to many rows per field."""
+        pk_name = self.model._meta.pk.attname
+        pks = [row[pk_name] for row in rows]
+        objects = [{} for _ in rows]
+
+        for name in fields:
+            field = self.fields[name]
+            if field.many_to_many:
+                links = self.get_links(field, pks, name in include)
+                for obj, pk in zip(objects, pks):
+                    obj[name] = links.get(pk, [])
+            elif field.is_relation and name in include:
+                related = get_resource(field.related_model).get_objects({row[field.attname] for row in rows})
+                for obj, row in zip(objects, rows):
+                    obj[name] = related.get(row[field.attname])
+            else:
+                key = f'{name}__uuid' if field.is_relation else name
+                for obj, row in zip(objects, rows):
+                    value = row[key]
+                    if isinstance(field, FileField):
+                        value = self.get_file_url(field, row) if value else None
+                    obj[name] = value
+        return objects
+
+    def get_file_url(self, field, row):
+        # uuid is always among the fields
+        return reverse(FILE_VIEWS[f'{self.model._meta.label_lower}.{field.name}'], args=[row['uuid']])
+
+    def get_objects(self, pks):
+        """{pk: object with the default fields} of the rows with these pks."""
+        pks = [pk for pk in pks if pk is not None]
+        if not pks:
+            return {}
+        rows = list(self.get_values(self.model.objects.filter(pk__in=pks), self.default_fields, []))
+        pk_name = self.model._meta.pk.attname
+        return {row[pk_name]: obj for row, obj in zip(rows, self.serialize(rows, self.default_fields, []))}
+
+    def get_links(self, field, pks, embed):
+        """{pk: [related uuids or objects]} of a many to many field."""
+        through = field.remote_field.through
+        source = field.m2m_column_name()
+        target = field.m2m_reverse_name()
+        links = through.objects.filter(**{f'{source}__in': pks}).order_by(target)
+        if not embed:
+            pairs = links.values_list(source, f'{field.m2m_reverse_field_name()}__uuid')
+            result = {}
+            for pk, related_uuid in pairs:
+                result.setdefault(pk, []).append(related_uuid)
+            return result
+
+        pairs = list(links.values_list(source, target))
+        related = get_resource(field.related_model).get_objects({target_pk for _, target_pk in pairs})
+        result = {}
+        for pk, target_pk in pairs:
+            result.setdefault(pk, []).append(related[target_pk])
+        return result
+
+
+def get_resources():
+    return {
+        model._meta.model_name: model
+        for model in apps.get_app_config('campaignfinance').get_models()
+        if any(field.name == 'uuid' for field in model._meta.concrete_fields)
+    }
+
+
+_resources = {}
+
+
+def get_resource(model):
+    if model not in _resources:
+        _resources[model] = Resource(model)
+    return _resources[model]
+
+
+def json_response(request, data, status=200):
+    """A JSON response with an ETag of its content, or a 304 if the client has it."""
+    content = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    if status != 200:
+        return HttpResponse(content, status=status, content_type='application/json')
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+class ApiView(generic.View):
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return json_response(request, {'error': error.message}, status=error.status)
+
+    def get_resource(self):
+        model = get_resources().get(self.kwargs['resource'])
+        if model is None:
+            raise ApiError(f"Unknown resource: {self.kwargs['resource']}", status=404)
+        return get_resource(model)
+
+
+class ApiRootView(ApiView):
+    def get(self, request, *args, **kwargs):
+        return json_response(request, {
+            name: request.build_absolute_uri(reverse('campaignfinance:apilist', args=[name]))
+            for name in get_resources()
+        })
+
+
+class ApiListView(ApiView):
+    paginate_by = 50
+    max_limit = 500
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.paginate_by))
+        except ValueError:
+            raise ApiError("Invalid limit.")
+        if not 1 <= limit <= self.max_limit:
+            raise ApiError(f"limit must be between 1 and {self.max_limit}.")
+        return limit
+
+    def get_page_url(self, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{query.urlencode()}')
+
+    def get(self, request, *args, **kwargs):
+        resource = self.get_resource()
+        fields = resource.get_fields(request)
+        include = resource.get_include(request, fields)
+        queryset = resource.filter(resource.model.objects.order_by('pk'), request)
+        queryset = resource.get_values(queryset, fields, include)
+
+        try:
+            page = paginate_keyset(queryset, request, self.get_limit(), request.GET.get('cursor'))
+        except Http404:
+            raise ApiError("Invalid cursor.")
+        return json_response(request, {
+            'results': resource.serialize(page.object_list, fields, include),
+            'next': self.get_page_url(page.next_cursor),
+            'previous': self.get_page_url(page.previous_cursor),
+        })
+
+
+class ApiDetailView(ApiView):
+    def get(self, request, *args, **kwargs):
+        resource = self.get_resource()
+        fields = resource.get_fields(request)
+        include = resource.get_include(request, fields)
+        rows = list(resource.get_values(resource.model.objects.filter(uuid=kwargs['uuid']), fields, include))
+        if not rows:
+            raise ApiError(f"No {resource.name} with uuid {kwargs['uuid']}", status=404)
+        return json_response(request, resource.serialize(rows, fields, include)[0])
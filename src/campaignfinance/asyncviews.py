@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import instrumentation
+
+# Async views for the pages that read the most, which fetch the independent
+# sections of a page at the same time instead of one after the other.
+#
+# The ORM is synchronous, so async views make every database call through
+# fetch(). With settings.DATABASE_POOL_SIZE set, the calls run on a pool of
+# that many threads per process. The threads live as long as the process, so
+# their connections are reused for CONN_MAX_AGE seconds and checked before
+# reuse with CONN_HEALTH_CHECKS: a pool of at most DATABASE_POOL_SIZE
+# persistent connections shared by every request the process serves.
+#
+# Without a pool, calls run one after the other in the thread Django runs the
+# request's sync code in, and see its transaction. SQLite, which gains little
+# from concurrent reads, and the tests use that.
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.DATABASE_POOL_SIZE, thread_name_prefix='database-pool')
+    return _pool
+
+
+def call_pooled(func, timings=None):
+    # What Django does when a request starts and finishes: drop connections
+    # past CONN_MAX_AGE, and broken ones
+    close_old_connections()
+    try:
+        with instrumentation.record(timings):
+            return func()
+    finally:
+        close_old_connections()
+
+
+async def fetch(func):
+    """Calls func, which uses the database, from async code."""
+    if not settings.DATABASE_POOL_SIZE:
+        return await sync_to_async(func)()
+    # Pool threads have their own connections, which the request's timings
+    # are not recorded from otherwise
+    timings = instrumentation.get_current()
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), call_pooled, func, timings)
+
+
+async def fetch_all(sections):
+    """{name: result} of sections, {name: function}, fetched at the same time."""
+    results = await asyncio.gather(*(fetch(func) for func in sections.values()))
+    return dict(zip(sections, results))
+
+
+class AsyncDetailMixin:
+    """
+    Serves a detail view asynchronously: the object first, then the sections
+    of get_sections() at the same time, added to the context. Goes before
+    ConditionalDetailMixin, whose get() it replaces.
+    """
+    def get_sections(self):
+        """{context name: function returning it}, functions that can run in any order."""
+        return {}
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await fetch(self.get_object)
+        return await self.aget_conditional_response(request, self.render_sections)
+
+    async def render_sections(self):
+        self.sections = await fetch_all(self.get_sections())
+        response = self.render_to_response(self.get_context_data(object=self.object, **self.sections))
+        # Templates may still follow relations
+        await fetch(response.render)
+        return response
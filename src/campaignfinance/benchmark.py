@@ -0,0 +1,171 @@
+import time
+import tracemalloc
+
+from django.apps import apps
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from . import urls
+from .models import Entity, Transaction
+
+# Benchmarks every URL in urls.py with the test client: the number of
+# queries, the p50 and p95 latency over a number of requests, and the peak
+# memory Python allocated while serving one. Results are saved as a JSON
+# baseline that later runs are compared against (the benchmark_views
+# command), on the same data, so seed with the same synthetic.seed()
+# options and compare runs from the same machine.
+#
+# Detail pages get the object with the lowest pk. synthetic.seed() creates
+# the busiest donors and committees first, so that is the slowest page.
+
+# Latencies below this many milliseconds are noise, not regressions
+NOISE_MS = 2
+
+# Query strings for views that do little without one
+QUERY_STRINGS = {
+    'search': 'q=smith',
+}
+
+# The URL kwargs that are not the object's uuid
+KWARGS = {
+    'resource': Transaction._meta.model_name,
+    'format': 'csv',
+}
+
+
+def get_queryset(pattern):
+    if 'resource' in pattern.pattern.converters:
+        return apps.get_model('campaignfinance', KWARGS['resource']).objects.all()
+    view_class = pattern.callback.view_class
+    if view_class.queryset is not None:
+        return view_class.queryset.all()
+    return view_class.model.objects.all()
+
+
+def get_urls():
+    """{URL name: URL} of every URL in urls.py, None when there is no object to show."""
+    result = {}
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            if name == 'uuid':
+                kwargs['uuid'] = get_queryset(pattern).order_by('pk').values_list('uuid', flat=True).first()
+            else:
+                kwargs[name] = KWARGS[name]
+        if None in kwargs.values():
+            result[pattern.name] = None
+            continue
+        url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+        if pattern.name in QUERY_STRINGS:
+            url = f'{url}?{QUERY_STRINGS[pattern.name]}'
+        result[pattern.name] = url
+    return result
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def get(client, url):
+    response = client.get(url)
+    # Exports stream their rows after the view returns
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def measure(client, url, repeat):
+    # Once to warm up caches and the registry of categories
+    get(client, url)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = get(client, url)
+    # Before the next request resets the query log
+    query_count = len(queries)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get(client, url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Separately, as tracing slows everything down
+    tracemalloc.start()
+    try:
+        get(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': query_count,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def run(repeat=20, names=None, stdout=None):
+    """{URL name: measurements} of every URL, or of the given names."""
+    results = {}
+    # Without the page cache, which would answer everything after the first request
+    with override_settings(PAGE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['testserver']):
+        client = Client()
+        for name, url in get_urls().items():
+            if names and name not in names:
+                continue
+            if url is None:
+                if stdout is not None:
+                    stdout.write(f"{name}: skipped, nothing to show")
+                continue
+            results[name] = measure(client, url, repeat)
+            if stdout is not None:
+                stdout.write(f"{name}: " + format_result(results[name]))
+    return results
+
+
+def format_result(result):
+    return (
+        f"{result['status']} {result['queries']} queries, p50 {result['p50_ms']:.1f}ms, "
+        f"p95 {result['p95_ms']:.1f}ms, peak {result['peak_memory_kb']}KB"
+    )
+
+
+def get_scale():
+    """What the results depend on besides the code: the database and its size."""
+    return {
+        'vendor': connection.vendor,
+        'entities': Entity.objects.count(),
+        'transactions': Transaction.objects.count(),
+    }
+
+
+def find_regressions(results, baseline, threshold=0.25):
+    """
+    Messages for every view worse than in the baseline: any more queries, or
+    a p95 latency or peak memory over `threshold` times higher.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['status'] != before['status']:
+            regressions.append(f"{name}: status {before['status']} -> {result['status']}")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold) + NOISE_MS:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if result['peak_memory_kb'] > before['peak_memory_kb'] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak memory {before['peak_memory_kb']}KB -> {result['peak_memory_kb']}KB"
+            )
+    return regressions
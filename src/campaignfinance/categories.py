@@ -0,0 +1,70 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import (EntityCategory, RelationshipCategory, CampaignCategory, ElectionCategory,
+                     DocumentCategory, TransactionCategory, AddressCategory)
+
+# Process wide registry of the category tables' name to id mappings, so views
+# filter by category id instead of looking the category up on every request.
+#
+# The tables are tiny and almost never change: each is loaded once, on first
+# use, along with its version in the shared cache. Saving or deleting one of
+# its rows gives it a new version (signals.py), and every process reloads it
+# the next time it is used, or only the process that changed it when the
+# cache is not shared (settings.CACHE_SHARED). New categories are also picked
+# up when a name is missing.
+
+CATEGORY_MODELS = [
+    EntityCategory, RelationshipCategory, CampaignCategory, ElectionCategory,
+    DocumentCategory, TransactionCategory, AddressCategory,
+]
+
+# model: (version, {name: id})
+_registry = {}
+
+
+def get_version_key(model):
+    return f'categories:version:{model._meta.model_name}'
+
+
+def set_versions(models):
+    version = time.time_ns()
+    cache.set_many({get_version_key(model): version for model in models}, timeout=None)
+
+
+def get_category_ids(model, reload=False):
+    # Read before the table, so a change made in between reloads it again
+    version = cache.get(get_version_key(model))
+    loaded = _registry.get(model)
+    if loaded is None or reload or loaded[0] != version:
+        loaded = _registry[model] = (version, dict(model.objects.values_list('name', 'pk')))
+    return loaded[1]
+
+
+def get_category_id(model, name):
+    """The id of the category of `model` named `name`, or None if there is none."""
+    ids = get_category_ids(model)
+    if name not in ids:
+        ids = get_category_ids(model, reload=True)
+    return ids.get(name)
+
+
+def filter_by_category(queryset, model, name):
+    """Rows of queryset in the category named name, none if it does not exist."""
+    category_id = get_category_id(model, name)
+    if category_id is None:
+        return queryset.none()
+    return queryset.filter(category_id=category_id)
+
+
+def reset_categories(model=None):
+    """Makes every process reload the categories of model, or of all the models."""
+    models = CATEGORY_MODELS if model is None else [model]
+    set_versions(models)
+    # Again once the change is committed, in case a process reloaded the
+    # table as it was before the change in between
+    transaction.on_commit(lambda: set_versions(models))
+    for changed in models:
+        _registry.pop(changed, None)
@@ -0,0 +1,133 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .asyncviews import fetch
+from .pagecache import ALL_PAGES, get_tag, get_index_tag, get_version_key
+
+# Conditional GET for the pages of the models with an updated_at column.
+#
+# updated_at changes when a row is saved, and also when a row shown on its
+# page changes: saving or deleting a transaction touches its payer, payee,
+# campaign and document (signals.py, and the bulk importers). A detail page
+# is then as new as its object and the related objects it selects, and an
+# index page as new as the newest row of its model and of the related models
+# it selects. Both are known before anything is rendered.
+#
+# Deleting a row leaves nothing to take the max of, so the versions of the
+# page cache tags (pagecache.py), which deletes and bulk writes change, count
+# as changes too. Other processes only see those through a shared cache
+# (settings.CACHE_SHARED): without one, index pages are not conditional.
+
+TIMESTAMP_FIELD = 'updated_at'
+
+
+def is_tracked(model):
+    return any(field.name == TIMESTAMP_FIELD for field in model._meta.concrete_fields)
+
+
+def touch(model, pks):
+    """Marks rows of a tracked model as changed, without sending signals."""
+    pks = {pk for pk in pks if pk is not None}
+    if pks and is_tracked(model):
+        model._base_manager.filter(pk__in=pks).update(**{TIMESTAMP_FIELD: timezone.now()})
+
+
+def touch_related(model, rows):
+    """Touches the tracked rows that rows, dicts of attname: value, point at."""
+    for field in model._meta.concrete_fields:
+        if (field.many_to_one or field.one_to_one) and is_tracked(field.related_model):
+            touch(field.related_model, {row.get(field.attname) for row in rows})
+
+
+def get_etag(last_modified):
+    return f'W/"{int(last_modified.timestamp() * 1000000)}"'
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET requests for an unchanged page with 304 Not Modified before
+    rendering it, and sends ETag and Last-Modified headers otherwise. Use
+    ConditionalDetailMixin or ConditionalListMixin on the views of models
+    with an updated_at column.
+    """
+    def get_related_models(self):
+        """Tracked models reached through the view's single level select_related."""
+        opts = self.model._meta
+        models = []
+        for name in getattr(self, 'select_related', ()):
+            if '__' not in name:
+                related = opts.get_field(name).related_model
+                if is_tracked(related):
+                    models.append(related)
+        return models
+
+    def get_last_modified(self):
+        if getattr(self, 'object', None) is not None:
+            timestamps = [getattr(self.object, TIMESTAMP_FIELD)]
+            tags = [ALL_PAGES, get_tag(self.object)]
+            for name in getattr(self, 'select_related', ()):
+                related = getattr(self.object, name, None) if '__' not in name else None
+                if related is not None and is_tracked(type(related)):
+                    timestamps.append(getattr(related, TIMESTAMP_FIELD))
+        else:
+            if not settings.CACHE_SHARED:
+                return None
+            models = [self.model, *self.get_related_models()]
+            timestamps = [model.objects.aggregate(last_modified=Max(TIMESTAMP_FIELD))['last_modified'] for model in models]
+            tags = [ALL_PAGES, *(get_index_tag(model) for model in models)]
+        versions = cache.get_many([get_version_key(tag) for tag in tags]).values()
+        timestamps.extend(datetime.fromtimestamp(version / 1e9, dt_timezone.utc) for version in versions)
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        return max(timestamps) if timestamps else None
+
+    def get_not_modified(self, request, last_modified):
+        """A 304 response if the client's copy is as new as last_modified, else None."""
+        return get_conditional_response(
+            request, etag=get_etag(last_modified), last_modified=int(last_modified.timestamp()),
+        )
+
+    def set_validators(self, response, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = get_etag(last_modified)
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def get_conditional_response(self, request, render):
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return render()
+        response = self.get_not_modified(request, last_modified)
+        if response is None:
+            response = render()
+        return self.set_validators(response, last_modified)
+
+    async def aget_conditional_response(self, request, render):
+        """get_conditional_response() for async views, where render is a coroutine function."""
+        last_modified = await fetch(self.get_last_modified)
+        if last_modified is None:
+            return await render()
+        response = self.get_not_modified(request, last_modified)
+        if response is None:
+            response = await render()
+        return self.set_validators(response, last_modified)
+
+
+class ConditionalDetailMixin(ConditionalGetMixin):
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return self.get_conditional_response(
+            request, lambda: self.render_to_response(self.get_context_data(object=self.object)),
+        )
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    def get(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request, lambda: super(ConditionalListMixin, self).get(request, *args, **kwargs),
+        )
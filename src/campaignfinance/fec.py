@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.db import transaction
+
+from .fecfiles import (COMMITTEE_COLUMNS, CANDIDATE_COLUMNS, PAC_COMMITTEE_TYPES, clean, split_name, read_records,
+                       byte_ranges, parse_chunk)
+from .importing import Resolver, BulkImporter, insert_rows, get_checkpoint, Throughput
+from .models import Entity, Campaign, TransactionCategory, Transaction
+
+# Federal Election Commission bulk data: the candidate master (cn.txt),
+# committee master (cm.txt) and individual contributions (itcont.txt) files.
+# The masters are small and loaded first; itcont.txt has tens of millions of
+# rows and is parsed by a pool of worker processes, one byte range at a time,
+# while this process resolves and inserts the parsed batches in file order.
+
+
+class FecImporter(BulkImporter):
+    source = 'fec'
+    agency_name = 'federal election commission'
+    document_prefix = 'fec report'
+
+    def __init__(self, stdout, workers=None, chunk_size=16 * 1024 * 1024, **kwargs):
+        super().__init__(stdout, **kwargs)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.contribution = TransactionCategory.objects.get_or_create(name='contribution')[0]
+        self.campaigns = Resolver(self.lookup_campaigns, self.create_campaigns, self.addresses.cache_size)
+        # CAND_ID: election year, from the candidate master loaded this run
+        self.election_years = {}
+
+    # Campaigns: one per committee. Principal campaign committees get theirs,
+    # linked to the candidate, when the committee master is loaded; other
+    # committees get one when their first contribution is imported.
+
+    def lookup_campaigns(self, keys):
+        found = {}
+        for committee_id, pk in Campaign.objects.filter(committee_entity_id__in=keys).order_by('pk').values_list('committee_entity_id', 'pk'):
+            found.setdefault(committee_id, pk)
+        return found
+
+    def create_campaigns(self, new):
+        names = dict(Entity.objects.filter(pk__in=new).values_list('pk', 'last_name'))
+        objs = [
+            Campaign(
+                category=self.candidate if data.get('candidate') else None,
+                name=names.get(committee_id, '')[:300],
+                registration_date=data['date'],
+                candidate_entity_id=data.get('candidate'),
+                committee_entity_id=committee_id,
+            ) for committee_id, data in new.items()
+        ]
+        Campaign.objects.bulk_create(objs)
+        return {committee_id: obj.pk for committee_id, obj in zip(new, objs)}
+
+    def resolve_in_batches(self, resolver, items):
+        items = list(items.items())
+        resolved = {}
+        for start in range(0, len(items), self.batch_size):
+            resolved.update(resolver.resolve(dict(items[start:start + self.batch_size])))
+        return resolved
+
+    @transaction.atomic
+    def import_candidates(self, path):
+        """Loads cn.txt. Candidates are people, identified by their FEC candidate id."""
+        candidates = {}
+        for row in read_records(path, CANDIDATE_COLUMNS):
+            last_name, first_name = split_name(row['CAND_NAME'])
+            candidates[row['CAND_ID']] = {
+                'name': last_name,
+                'first_name': first_name,
+                'category_id': self.individual.pk,
+            }
+            if row['CAND_ELECTION_YR'].isdigit():
+                self.election_years[row['CAND_ID']] = int(row['CAND_ELECTION_YR'])
+        self.resolve_in_batches(self.filers, candidates)
+        self.stdout.write(f"{path.name}: {len(candidates)} candidates")
+        return len(candidates)
+
+    @transaction.atomic
+    def import_committees(self, path):
+        """Loads cm.txt, and a campaign for every committee of a candidate loaded this run."""
+        committees = {}
+        committee_candidates = {}
+        for row in read_records(path, COMMITTEE_COLUMNS):
+            committees[row['CMTE_ID']] = {
+                'name': clean(row['CMTE_NM']),
+                'category_id': self.pac.pk if row['CMTE_TP'] in PAC_COMMITTEE_TYPES else self.committee.pk,
+            }
+            if row['CAND_ID'] in self.election_years:
+                committee_candidates[row['CMTE_ID']] = row['CAND_ID']
+        committee_ids = self.resolve_in_batches(self.filers, committees)
+
+        candidate_ids = self.filers.lookup(list(set(committee_candidates.values())))
+        campaigns = {}
+        for number, candidate in committee_candidates.items():
+            # The files carry no registration date; campaigns start with the
+            # two year election cycle that ends in the candidate's election
+            year = self.election_years[candidate]
+            campaigns[committee_ids[number]] = {
+                'candidate': candidate_ids[candidate],
+                'date': date(year - 1 if year % 2 == 0 else year, 1, 1),
+            }
+        self.resolve_in_batches(self.campaigns, campaigns)
+        self.stdout.write(f"{path.name}: {len(committees)} committees")
+        return len(committees)
+
+    def parse(self, path, ranges):
+        """Yields the (offset, rows) batches of the byte ranges in file order."""
+        if self.workers == 1:
+            for start, end in ranges:
+                yield from parse_chunk(path, start, end, self.batch_size)
+            return
+
+        # Workers only parse, they never touch the database. Spawned rather
+        # than forked so they do not inherit this process's connections.
+        context = multiprocessing.get_context('spawn')
+        ranges = iter(ranges)
+        with ProcessPoolExecutor(self.workers, mp_context=context) as executor:
+            # A couple of chunks in flight per worker keeps them busy while
+            # bounding how many parsed rows wait in memory
+            pending = deque()
+            for start, end in ranges:
+                pending.append(executor.submit(parse_chunk, path, start, end, self.batch_size))
+                if len(pending) >= self.workers * 2:
+                    break
+            while pending:
+                batches = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(executor.submit(parse_chunk, path, *next_range, self.batch_size))
+                yield from batches
+
+    def process_batch(self, rows):
+        filers, addresses, parties = {}, {}, {}
+        for committee, party, occupation, address, *_ in rows:
+            # Committees missing from cm.txt are named by their id
+            filers.setdefault(committee, {'name': committee.lower(), 'category_id': self.committee.pk})
+            if address:
+                addresses[address] = None
+            if party:
+                parties.setdefault(party, {'occupation': occupation, 'address': address})
+
+        self.batch_addresses = self.addresses.resolve(addresses)
+        party_ids = self.parties.resolve(parties)
+        filer_ids = self.filers.resolve(filers)
+
+        campaigns, documents = {}, {}
+        for committee, _, _, _, recorded_date, _, _, report, _ in rows:
+            filer_id = filer_ids[committee]
+            campaign = campaigns.setdefault(filer_id, {'date': recorded_date})
+            # ISO dates compare like dates
+            campaign['date'] = min(campaign['date'], recorded_date)
+            if report:
+                documents.setdefault(report, {'filer': filer_id, 'date': recorded_date})
+        campaign_ids = self.campaigns.resolve(campaigns)
+        document_ids = self.documents.resolve(documents)
+
+        transactions = []
+        for committee, party, _, _, recorded_date, amount, reason, report, number in rows:
+            filer_id = filer_ids[committee]
+            transactions.append({
+                'category_id': self.contribution.pk,
+                'campaign_id': campaign_ids[filer_id],
+                'payer_entity_id': party_ids.get(party),
+                'payee_entity_id': filer_id,
+                'amount': amount,
+                'recorded_date': recorded_date,
+                'reason': reason[:1000],
+                'document_id': document_ids.get(report),
+                'notes': f"FEC SUB_ID {number}",
+            })
+        insert_rows(Transaction, transactions, self.use_copy)
+
+    def import_contributions(self, path, restart=False):
+        """Imports an itcont.txt file. Returns the number of rows imported this run."""
+        checkpoint = get_checkpoint(self.source, path, restart)
+        if checkpoint.completed:
+            self.stdout.write(f"{path.name}: already imported ({checkpoint.rows} rows)")
+            return 0
+        if checkpoint.offset:
+            self.stdout.write(f"{path.name}: resuming after row {checkpoint.rows}")
+
+        throughput = Throughput(self.stdout)
+        ranges = byte_ranges(path, self.chunk_size, checkpoint.offset)
+        for offset, rows in self.parse(path, ranges):
+            self.commit_batch(rows, checkpoint, offset)
+            throughput.add(len(rows), path.name)
+        self.commit_batch([], checkpoint, checkpoint.offset, completed=True)
+
+        throughput.report(path.name)
+        return throughput.rows
@@ -0,0 +1,157 @@
+import os
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# Parsing of the Federal Election Commission bulk data files
+# (https://www.fec.gov/data/browse-data/?tab=bulk-data). The files are pipe
+# delimited, have no header row and are encoded in latin-1.
+#
+# This module runs inside the import worker processes, so it must not import
+# Django or the models: everything here is plain Python on bytes and strings.
+
+ENCODING = 'latin-1'
+
+COMMITTEE_COLUMNS = [
+    'CMTE_ID', 'CMTE_NM', 'TRES_NM', 'CMTE_ST1', 'CMTE_ST2', 'CMTE_CITY', 'CMTE_ST', 'CMTE_ZIP', 'CMTE_DSGN',
+    'CMTE_TP', 'CMTE_PTY_AFFILIATION', 'CMTE_FILING_FREQ', 'ORG_TP', 'CONNECTED_ORG_NM', 'CAND_ID',
+]
+
+CANDIDATE_COLUMNS = [
+    'CAND_ID', 'CAND_NAME', 'CAND_PTY_AFFILIATION', 'CAND_ELECTION_YR', 'CAND_OFFICE_ST', 'CAND_OFFICE',
+    'CAND_OFFICE_DISTRICT', 'CAND_ICI', 'CAND_STATUS', 'CAND_PCC', 'CAND_ST1', 'CAND_ST2', 'CAND_CITY',
+    'CAND_ST', 'CAND_ZIP',
+]
+
+CONTRIBUTION_COLUMNS = [
+    'CMTE_ID', 'AMNDT_IND', 'RPT_TP', 'TRANSACTION_PGI', 'IMAGE_NUM', 'TRANSACTION_TP', 'ENTITY_TP', 'NAME',
+    'CITY', 'STATE', 'ZIP_CODE', 'EMPLOYER', 'OCCUPATION', 'TRANSACTION_DT', 'TRANSACTION_AMT', 'OTHER_ID',
+    'TRAN_ID', 'FILE_NUM', 'MEMO_CD', 'MEMO_TEXT', 'SUB_ID',
+]
+
+# Committee types that are political action committees rather than candidate
+# or party committees
+PAC_COMMITTEE_TYPES = {'N', 'Q', 'O', 'U', 'V', 'W'}
+
+
+def clean(value):
+    return ' '.join(value.split()).lower()
+
+
+def zip5(value):
+    return re.sub(r'\D', '', value)[:5]
+
+
+def parse_date(value):
+    """MMDDYYYY to an ISO date string, or None."""
+    try:
+        return date(int(value[4:8]), int(value[:2]), int(value[2:4])).isoformat() if len(value) == 8 else None
+    except ValueError:
+        return None
+
+
+def parse_amount(value):
+    try:
+        return str(Decimal(value or 0))
+    except InvalidOperation:
+        return '0'
+
+
+def split_name(name):
+    """FEC names of people are "LAST, FIRST MIDDLE"; returns (last name, first names)."""
+    last_name, _, first_name = name.partition(',')
+    return clean(last_name), clean(first_name)
+
+
+def read_records(path, columns):
+    """Yields the rows of a small file (cm.txt, cn.txt) as dicts."""
+    with open(path, encoding=ENCODING, newline='') as file:
+        for line in file:
+            values = line.rstrip('\r\n').split('|')
+            if len(values) == len(columns):
+                yield dict(zip(columns, values))
+
+
+def byte_ranges(path, chunk_size, start=0):
+    """
+    Splits a file into (start, end) byte ranges of roughly chunk_size bytes,
+    each ending just after a newline so no row is cut in two.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_contribution(line):
+    """
+    Turns one itcont.txt line into a (committee id, party key, occupation,
+    address key, date, amount, reason, report id, FEC id) tuple, or None for
+    lines that are not importable. Memo entries (MEMO_CD X) repeat amounts
+    already reported on another line and are skipped.
+
+    Rows cross process boundaries by the million, so they are plain tuples of
+    strings: dates and Decimals cost several times more to pickle.
+    """
+    values = line.decode(ENCODING).rstrip('\r\n').split('|')
+    if len(values) != len(CONTRIBUTION_COLUMNS):
+        return None
+    row = dict(zip(CONTRIBUTION_COLUMNS, values))
+    recorded_date = parse_date(row['TRANSACTION_DT'])
+    if row['MEMO_CD'] == 'X' or not row['CMTE_ID'] or recorded_date is None:
+        return None
+
+    is_individual = row['ENTITY_TP'] in ('IND', '')
+    if is_individual:
+        last_name, first_name = split_name(row['NAME'])
+    else:
+        last_name, first_name = clean(row['NAME']), ''
+    zip_code = zip5(row['ZIP_CODE'])
+    address = ('', clean(row['CITY']), clean(row['STATE']), zip_code)
+
+    return (
+        row['CMTE_ID'],
+        (is_individual, last_name, first_name, zip_code) if last_name else None,
+        clean(row['OCCUPATION']),
+        address if any(address) else None,
+        recorded_date,
+        parse_amount(row['TRANSACTION_AMT']),
+        clean(row['MEMO_TEXT']),
+        # Contributions reported on paper have no electronic filing number
+        row['FILE_NUM'] or row['IMAGE_NUM'],
+        row['SUB_ID'],
+    )
+
+
+def parse_chunk(path, start, end, batch_size):
+    """
+    Parses the itcont.txt lines between two byte offsets. Returns a list of
+    (offset, rows) batches, where offset is where the line after the batch
+    starts, so the importer can checkpoint after inserting each batch.
+    """
+    batches = []
+    rows = []
+    with open(path, 'rb') as file:
+        file.seek(start)
+        offset = start
+        while offset < end:
+            line = file.readline()
+            if not line:
+                break
+            offset += len(line)
+            row = parse_contribution(line)
+            if row is not None:
+                rows.append(row)
+            if len(rows) >= batch_size:
+                batches.append((offset, rows))
+                rows = []
+    batches.append((offset, rows))
+    return batches
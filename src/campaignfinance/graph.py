@@ -0,0 +1,498 @@
+import logging
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+from heapq import nlargest
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, FloatField, Sum
+from django.db.models.functions import Cast
+
+from .models import Relationship, Campaign, Transaction, Address
+
+logger = logging.getLogger(__name__)
+
+# In-memory graph of who is connected to whom, for following money and
+# relationships without a query per hop.
+#
+# Nodes are entities, addresses and campaigns. Edges are stored twice, once
+# at each end, in compressed sparse row arrays: the edges of node n are
+# positions offsets[n] to offsets[n + 1] of the parallel targets, edge_kinds,
+# directions, amounts and counts arrays. direction is 1 at the source end of
+# an edge (the payer of money, the parent of a relationship, the entity
+# living at an address) and -1 at the other end. Money edges aggregate every
+# transaction between a payer and a payee.
+#
+# The arrays are never modified in place. Saves and deletes (see signals.py)
+# add (amount, count) deltas to a small overlay that neighbors() merges in;
+# a count of zero or less hides an edge. Once the overlay grows past a
+# fraction of the arrays, compact() folds it in. Graphs are per process, so
+# changes made elsewhere (imports, other web workers) show up when the graph
+# is rebuilt after settings.GRAPH_MAX_AGE seconds.
+#
+# Only the first graph of a process is built while a request waits for it.
+# Rebuilds and compactions run in a background thread, on a copy, while
+# requests keep using the current graph, which the new one then replaces.
+# Changes made to the current graph while it is compacted are replayed on the
+# copy. Those made while it is rebuilt may or may not be in the rebuilt graph,
+# depending on whether the rebuild read them, and are not replayed: they show
+# up with the next rebuild.
+
+NODE_KINDS = ('entity', 'address', 'campaign')
+ENTITY, ADDRESS, CAMPAIGN = range(len(NODE_KINDS))
+
+EDGE_KINDS = ('money', 'relationship', 'resident', 'owner', 'candidate', 'treasurer', 'committee')
+MONEY, RELATIONSHIP, RESIDENT, OWNER, CANDIDATE, TREASURER, COMMITTEE = range(len(EDGE_KINDS))
+
+# Campaign field of the entity in each campaign role
+CAMPAIGN_ROLES = {
+    CANDIDATE: 'candidate_entity_id',
+    TREASURER: 'treasurer_entity_id',
+    COMMITTEE: 'committee_entity_id',
+}
+
+# The overlay is folded into the arrays once it holds this many edge ends,
+# or a twentieth of the arrays if that is more
+COMPACT_MIN = 10000
+
+# node: ('entity', pk); parent: the node it was reached from
+Hop = namedtuple('Hop', ['node', 'distance', 'parent', 'edge_kind', 'direction', 'amount', 'count'])
+MoneyStep = namedtuple('MoneyStep', ['payer', 'payee', 'amount', 'count'])
+Flow = namedtuple('Flow', ['received', 'given', 'senders', 'recipients'])
+
+
+class EdgeList:
+    """Directed edges collected in parallel arrays until they are laid out by Graph.load()."""
+    def __init__(self):
+        self.sources = array('i')
+        self.targets = array('i')
+        self.kinds = array('b')
+        self.amounts = array('d')
+        self.counts = array('q')
+
+    def add(self, source, target, kind, amount=0.0, count=1):
+        self.sources.append(source)
+        self.targets.append(target)
+        self.kinds.append(kind)
+        self.amounts.append(amount)
+        self.counts.append(count)
+
+    def __len__(self):
+        return len(self.sources)
+
+
+class Graph:
+    def __init__(self):
+        self.node_kinds = array('b')
+        self.node_pks = array('q')
+        # One pk: node map per node kind
+        self.index = tuple({} for _ in NODE_KINDS)
+        self.removed = set()
+        self.load(EdgeList())
+        self.lock = threading.RLock()
+        self.built = time.monotonic()
+        # Changes kept for replay on a copy being compacted, see copy()
+        self.changes = None
+        # The compacted copy that replaced this graph, which gets its changes
+        self.replaced_by = None
+
+    @classmethod
+    def build(cls, chunk_size=10000):
+        """Loads every connection from the database."""
+        graph = cls()
+        node = graph.get_node
+        edges = EdgeList()
+
+        money = (
+            Transaction.objects.filter(payer_entity__isnull=False, payee_entity__isnull=False)
+            .values_list('payer_entity_id', 'payee_entity_id')
+            # Summed as floats by the database, converting a million Decimals costs more than the query
+            .annotate(total=Cast(Sum('amount'), FloatField()), count=Count('pk'))
+            .order_by()
+        )
+        for payer, payee, total, count in money.iterator(chunk_size=chunk_size):
+            edges.add(node(ENTITY, payer, True), node(ENTITY, payee, True), MONEY, total or 0.0, count)
+
+        relationships = (
+            Relationship.objects.filter(parent_entity__isnull=False, child_entity__isnull=False)
+            .values_list('parent_entity_id', 'child_entity_id')
+            .annotate(count=Count('pk'))
+            .order_by()
+        )
+        for parent, child, count in relationships.iterator(chunk_size=chunk_size):
+            edges.add(node(ENTITY, parent, True), node(ENTITY, child, True), RELATIONSHIP, 0.0, count)
+
+        for kind, through in ((RESIDENT, Address.residents.through), (OWNER, Address.owners.through)):
+            for entity, address in through.objects.values_list('entity_id', 'address_id').iterator(chunk_size=chunk_size):
+                edges.add(node(ENTITY, entity, True), node(ADDRESS, address, True), kind)
+
+        roles = Campaign.objects.values_list('pk', *CAMPAIGN_ROLES.values())
+        for pk, *entities in roles.iterator(chunk_size=chunk_size):
+            for kind, entity in zip(CAMPAIGN_ROLES, entities):
+                if entity is not None:
+                    edges.add(node(ENTITY, entity, True), node(CAMPAIGN, pk, True), kind)
+
+        graph.load(edges)
+        return graph
+
+    def load(self, edges):
+        """Lays out both ends of every edge, each node's edges sorted by amount, largest first."""
+        size = len(self.node_pks)
+        offsets = array('q', bytes(8 * (size + 1)))
+        for source in edges.sources:
+            offsets[source + 1] += 1
+        for target in edges.targets:
+            offsets[target + 1] += 1
+        for node in range(size):
+            offsets[node + 1] += offsets[node]
+
+        length = offsets[size]
+        targets = array('i', bytes(4 * length))
+        kinds = array('b', bytes(length))
+        directions = array('b', bytes(length))
+        amounts = array('d', bytes(8 * length))
+        counts = array('q', bytes(8 * length))
+        cursor = array('q', offsets)
+        for source, target, kind, amount, count in zip(edges.sources, edges.targets, edges.kinds, edges.amounts, edges.counts):
+            for node, other, direction in ((source, target, 1), (target, source, -1)):
+                position = cursor[node]
+                cursor[node] += 1
+                targets[position] = other
+                kinds[position] = kind
+                directions[position] = direction
+                amounts[position] = amount
+                counts[position] = count
+
+        # Neighborhoods stop at a limit, so the biggest money comes first
+        for node in range(size):
+            start, end = offsets[node], offsets[node + 1]
+            if end - start > 1:
+                order = sorted(range(start, end), key=amounts.__getitem__, reverse=True)
+                for values in (targets, kinds, directions, amounts, counts):
+                    values[start:end] = array(values.typecode, [values[position] for position in order])
+
+        self.offsets = offsets
+        self.targets = targets
+        self.edge_kinds = kinds
+        self.directions = directions
+        self.amounts = amounts
+        self.counts = counts
+        # node: {(target, edge kind, direction): [amount, count]} deltas
+        self.overlay = {}
+        self.overlay_size = 0
+
+    def get_node(self, kind, pk, create=False):
+        node = self.index[kind].get(pk)
+        if node is None and create:
+            node = len(self.node_pks)
+            self.index[kind][pk] = node
+            self.node_kinds.append(kind)
+            self.node_pks.append(pk)
+        return node
+
+    def get_key(self, node):
+        return NODE_KINDS[self.node_kinds[node]], self.node_pks[node]
+
+    def neighbors(self, node):
+        """Yields (target, edge kind, direction, amount, count) for the live edges of a node."""
+        removed = self.removed
+        overlay = self.overlay.get(node)
+        merged = set()
+        if node + 1 < len(self.offsets):
+            targets, kinds, directions, amounts, counts = (
+                self.targets, self.edge_kinds, self.directions, self.amounts, self.counts,
+            )
+            for position in range(self.offsets[node], self.offsets[node + 1]):
+                target = targets[position]
+                amount, count = amounts[position], counts[position]
+                if overlay:
+                    key = (target, kinds[position], directions[position])
+                    delta = overlay.get(key)
+                    if delta:
+                        amount += delta[0]
+                        count += delta[1]
+                        merged.add(key)
+                if count > 0 and target not in removed:
+                    yield target, kinds[position], directions[position], amount, count
+        if overlay:
+            for key, (amount, count) in overlay.items():
+                if key not in merged and count > 0 and key[0] not in removed:
+                    yield key[0], key[1], key[2], amount, count
+
+    # Incremental updates, called from signal handlers
+
+    def add_edge(self, source, target, kind, amount=0.0, count=1):
+        """Adds to the edge from source to target, both (node kind, pk). Negative values subtract."""
+        with self.lock:
+            if self.replaced_by is not None:
+                return self.replaced_by.add_edge(source, target, kind, amount, count)
+            if self.changes is not None:
+                self.changes.append(('add_edge', (source, target, kind, amount, count)))
+            create = count > 0
+            source_node = self.get_node(*source, create=create)
+            target_node = self.get_node(*target, create=create)
+            if source_node is None or target_node is None:
+                return
+            self.add_delta(source_node, (target_node, kind, 1), amount, count)
+            self.add_delta(target_node, (source_node, kind, -1), amount, count)
+
+    def remove_edge(self, source, target, kind, amount=0.0, count=1):
+        self.add_edge(source, target, kind, -amount, -count)
+
+    def add_delta(self, node, key, amount, count):
+        deltas = self.overlay.setdefault(node, {})
+        delta = deltas.get(key)
+        if delta is None:
+            deltas[key] = [amount, count]
+            self.overlay_size += 1
+        else:
+            delta[0] += amount
+            delta[1] += count
+
+    def remove_node(self, kind, pk):
+        with self.lock:
+            if self.replaced_by is not None:
+                return self.replaced_by.remove_node(kind, pk)
+            if self.changes is not None:
+                self.changes.append(('remove_node', (kind, pk)))
+            node = self.index[kind].pop(pk, None)
+            if node is not None:
+                self.removed.add(node)
+
+    def needs_compaction(self):
+        return self.overlay_size > max(COMPACT_MIN, len(self.targets) // 20)
+
+    def compact(self):
+        """Folds the overlay and removed nodes into the arrays. Node numbers stay the same."""
+        with self.lock:
+            edges = EdgeList()
+            for node in range(len(self.node_pks)):
+                if node in self.removed:
+                    continue
+                for target, kind, direction, amount, count in self.neighbors(node):
+                    if direction == 1:
+                        edges.add(node, target, kind, amount, count)
+            self.load(edges)
+
+    def copy(self):
+        """
+        A copy to compact() without holding up queries on this graph. Changes
+        made to this graph from now on are kept for replace_with().
+        """
+        with self.lock:
+            graph = Graph()
+            graph.node_kinds = array('b', self.node_kinds)
+            graph.node_pks = array('q', self.node_pks)
+            graph.index = tuple(dict(pks) for pks in self.index)
+            graph.removed = set(self.removed)
+            # The arrays are never modified in place, and can be shared
+            graph.offsets, graph.targets, graph.edge_kinds = self.offsets, self.targets, self.edge_kinds
+            graph.directions, graph.amounts, graph.counts = self.directions, self.amounts, self.counts
+            graph.overlay = {node: {key: list(delta) for key, delta in deltas.items()} for node, deltas in self.overlay.items()}
+            graph.overlay_size = self.overlay_size
+            graph.built = self.built
+            self.changes = []
+            return graph
+
+    def replace_with(self, graph):
+        """
+        Replays the changes made since copy() on the copy, which gets the ones
+        made from now on. With None, stops keeping them.
+        """
+        with self.lock:
+            if graph is not None:
+                for name, args in self.changes or ():
+                    getattr(graph, name)(*args)
+            self.changes = None
+            self.replaced_by = graph
+
+    # Queries. Nodes are given and returned as (node kind, pk).
+
+    def neighborhood(self, kind, pk, hops=2, limit=500, edge_kinds=None):
+        """
+        Returns the Hops to everything within `hops` edges of a node, closest
+        first and largest money first at each distance, at most `limit` of them.
+        """
+        with self.lock:
+            start = self.get_node(NODE_KINDS.index(kind), pk)
+            if start is None:
+                return []
+            found = []
+            seen = {start}
+            queue = deque([(start, 0)])
+            while queue:
+                node, distance = queue.popleft()
+                if distance == hops:
+                    continue
+                for target, edge_kind, direction, amount, count in self.neighbors(node):
+                    if target in seen or (edge_kinds is not None and edge_kind not in edge_kinds):
+                        continue
+                    seen.add(target)
+                    found.append(Hop(
+                        self.get_key(target), distance + 1, self.get_key(node),
+                        EDGE_KINDS[edge_kind], direction, round(amount, 2), count,
+                    ))
+                    if len(found) >= limit:
+                        return found
+                    queue.append((target, distance + 1))
+            return found
+
+    def money_path(self, payer_pk, payee_pk, max_hops=6, max_visits=200000):
+        """
+        Returns the shortest chain of MoneySteps from one entity to another,
+        following money in the direction it was paid, or None if there is no
+        chain of at most `max_hops` payments. Searches from both ends at once,
+        always growing the smaller frontier.
+        """
+        with self.lock:
+            source = self.get_node(ENTITY, payer_pk)
+            target = self.get_node(ENTITY, payee_pk)
+            if source is None or target is None:
+                return None
+            if source == target:
+                return []
+
+            # node: (next node towards the start, amount, count)
+            forward = {source: None}
+            backward = {target: None}
+            forward_frontier, backward_frontier = [source], [target]
+            for _ in range(max_hops):
+                if len(forward_frontier) <= len(backward_frontier):
+                    frontier, reached, other, direction = forward_frontier, forward, backward, 1
+                else:
+                    frontier, reached, other, direction = backward_frontier, backward, forward, -1
+                next_frontier = []
+                for node in frontier:
+                    for neighbor, edge_kind, edge_direction, amount, count in self.neighbors(node):
+                        if edge_kind != MONEY or edge_direction != direction or neighbor in reached:
+                            continue
+                        reached[neighbor] = (node, amount, count)
+                        if neighbor in other:
+                            return self.join_path(forward, backward, neighbor)
+                        next_frontier.append(neighbor)
+                if not next_frontier or len(forward) + len(backward) > max_visits:
+                    return None
+                if direction == 1:
+                    forward_frontier = next_frontier
+                else:
+                    backward_frontier = next_frontier
+            return None
+
+    def join_path(self, forward, backward, middle):
+        steps = []
+        node = middle
+        while forward[node] is not None:
+            previous, amount, count = forward[node]
+            steps.append(MoneyStep(self.node_pks[previous], self.node_pks[node], round(amount, 2), count))
+            node = previous
+        steps.reverse()
+        node = middle
+        while backward[node] is not None:
+            following, amount, count = backward[node]
+            steps.append(MoneyStep(self.node_pks[node], self.node_pks[following], round(amount, 2), count))
+            node = following
+        return steps
+
+    def flow(self, pk, limit=10):
+        """Money an entity received and gave, with its largest senders and recipients as (pk, amount, count)."""
+        with self.lock:
+            node = self.get_node(ENTITY, pk)
+            senders, recipients = [], []
+            if node is not None:
+                for target, edge_kind, direction, amount, count in self.neighbors(node):
+                    if edge_kind == MONEY:
+                        (recipients if direction == 1 else senders).append((self.node_pks[target], round(amount, 2), count))
+            return Flow(
+                round(sum(amount for _, amount, _ in senders), 2),
+                round(sum(amount for _, amount, _ in recipients), 2),
+                nlargest(limit, senders, key=lambda sender: sender[1]),
+                nlargest(limit, recipients, key=lambda recipient: recipient[1]),
+            )
+
+
+_graph = None
+_graph_lock = threading.Lock()
+# The thread rebuilding or compacting the graph, if one is
+_refresh = None
+# Changed by reset_graph(), so that a graph refreshed before is not used
+_generation = 0
+
+
+def refresh_graph(graph, generation, rebuild):
+    global _graph, _refresh
+    try:
+        if rebuild:
+            new_graph = Graph.build()
+        else:
+            new_graph = graph.copy()
+            new_graph.compact()
+    except Exception:
+        logger.exception("Refreshing the connections graph failed")
+        new_graph = None
+    finally:
+        # The thread's own connection
+        connection.close()
+
+    with _graph_lock:
+        _refresh = None
+        if generation != _generation:
+            new_graph = None
+        if not rebuild:
+            graph.replace_with(new_graph)
+        if new_graph is not None:
+            _graph = new_graph
+
+
+def start_refresh(rebuild=True):
+    """Rebuilds, or compacts, the process's graph in a background thread, unless one already is."""
+    global _refresh
+    with _graph_lock:
+        if _refresh is None:
+            _refresh = threading.Thread(
+                target=refresh_graph, args=(_graph, _generation, rebuild or _graph is None),
+                name='graph-refresh', daemon=True,
+            )
+            _refresh.start()
+        return _refresh
+
+
+def wait_for_refresh():
+    refresh = _refresh
+    if refresh is not None:
+        refresh.join()
+
+
+def get_graph():
+    """
+    The process's graph, built on first use and rebuilt in the background
+    after settings.GRAPH_MAX_AGE seconds.
+    """
+    global _graph
+    if _graph is None:
+        # A first build may have started in the background, see gunicorn.conf.py
+        wait_for_refresh()
+    with _graph_lock:
+        if _graph is None:
+            _graph = Graph.build()
+            return _graph
+        graph = _graph
+    max_age = getattr(settings, 'GRAPH_MAX_AGE', None)
+    if max_age is not None and time.monotonic() - graph.built > max_age:
+        start_refresh(rebuild=True)
+    elif graph.needs_compaction():
+        start_refresh(rebuild=False)
+    return graph
+
+
+def get_loaded_graph():
+    """The process's graph if it was built, for updates that should not trigger a build."""
+    return _graph
+
+
+def reset_graph():
+    global _graph, _generation
+    with _graph_lock:
+        _graph = None
+        _generation += 1
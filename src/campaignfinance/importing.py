@@ -0,0 +1,356 @@
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.utils import timezone
+
+from . import metrics
+from .conditional import touch_related
+from .models import (EntityCategory, Entity, ExternalId, CampaignCategory, Document, AddressCategory,
+                     Address, ImportCheckpoint)
+
+# Shared pieces of the bulk importers (see tec.py and fec.py). Rows are streamed and
+# processed in batches: each batch resolves the people, addresses and
+# documents it mentions with a few set-based queries, inserts its
+# transactions in one statement and moves the checkpoint, all inside one
+# database transaction, so a crash never loses or repeats a batch.
+
+
+def normalize(value):
+    # Names are stored lower case and the templates capitalize them
+    return ' '.join(value.split()).lower() if value else ''
+
+
+class OffsetLineReader:
+    """
+    Yields decoded lines of a binary file for csv.reader while counting the
+    bytes handed out. csv.reader only pulls the lines of the row it is
+    parsing, so after each row `offset` is exactly where the next row starts.
+    """
+    def __init__(self, file, encoding, offset=0):
+        self.file = file
+        self.encoding = encoding
+        self.offset = offset
+        file.seek(offset)
+
+    def __iter__(self):
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode(self.encoding, errors='replace')
+
+
+def read_header(file, encoding):
+    file.seek(0)
+    line = file.readline()
+    return line, line.decode(encoding, errors='replace')
+
+
+class Resolver:
+    """
+    Maps natural keys to primary keys a batch at a time. Keys seen recently
+    are answered from a bounded LRU cache; the rest are looked up with one
+    query through `lookup(keys)` and whatever is still missing is created
+    with one bulk insert through `create({key: data})`.
+    """
+    def __init__(self, lookup, create, cache_size=200000):
+        self.lookup = lookup
+        self.create = create
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.created = 0
+
+    def resolve(self, items):
+        resolved = {}
+        missing = {}
+        for key, data in items.items():
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                resolved[key] = self.cache[key]
+            else:
+                missing[key] = data
+
+        if missing:
+            found = self.lookup(list(missing))
+            new = {key: data for key, data in missing.items() if key not in found}
+            if new:
+                created = self.create(new)
+                self.created += len(created)
+                found.update(created)
+            resolved.update(found)
+            for key, pk in found.items():
+                self.cache[key] = pk
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return resolved
+
+
+def tune_connection():
+    # SQLite's default 2MB page cache thrashes once the transaction indexes
+    # outgrow it, which costs more than everything else in an import
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size = -262144')
+
+
+def can_copy():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        # psycopg 3 cursors have copy(), psycopg2 ones do not
+        return hasattr(cursor.cursor, 'copy')
+
+
+def get_insert_fields(model):
+    return [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+
+
+def prepare_rows(fields, rows, using=DEFAULT_DB_ALIAS):
+    """Turns dicts of attname: value into database-ready tuples, filling in defaults."""
+    # The `connection` proxy costs a thread-local lookup per use, which adds
+    # up over millions of values
+    db = connections[using]
+    now = timezone.now()
+    auto_now = {
+        field.attname for field in fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    }
+    columns = [(field.attname, field.get_db_prep_save, field.get_default) for field in fields]
+
+    for row in rows:
+        values = []
+        for attname, prep, default in columns:
+            if attname in auto_now:
+                value = now
+            elif attname in row:
+                value = row[attname]
+            else:
+                value = default()
+            # Plain strings and integers are already what the driver wants
+            values.append(value if value is None or type(value) in (str, int) else prep(value, db))
+        yield values
+
+
+def insert_rows(model, rows, use_copy):
+    """
+    Inserts rows given as dicts of attname: value, without building model
+    instances or returning pks. Uses COPY on PostgreSQL and a single
+    executemany() elsewhere, both far cheaper per row than bulk_create().
+    The tracked rows the new ones point at are touched (conditional.py).
+    """
+    fields = get_insert_fields(model)
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+
+    with connection.cursor() as cursor:
+        if use_copy:
+            with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for values in prepare_rows(fields, rows):
+                    copy.write_row(values)
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", prepare_rows(fields, rows))
+    touch_related(model, rows)
+
+
+def create_rows(model, rows, use_copy):
+    """
+    Like insert_rows() but returns the new pks in order, found again through
+    the uuid every model has. Much cheaper than bulk_create() for big batches.
+    """
+    for row in rows:
+        row['uuid'] = uuid.uuid4()
+    insert_rows(model, rows, use_copy)
+    pks = dict(model.objects.filter(uuid__in=[row['uuid'] for row in rows]).values_list('uuid', 'pk'))
+    return [pks[row['uuid']] for row in rows]
+
+
+def get_checkpoint(source, path, restart=False):
+    size = path.stat().st_size
+    checkpoint, created = ImportCheckpoint.objects.get_or_create(source=source, file_name=path.name, file_size=size)
+    if restart and not created:
+        checkpoint.offset = checkpoint.rows = 0
+        checkpoint.completed = False
+        checkpoint.save()
+    return checkpoint
+
+
+class Throughput:
+    def __init__(self, stdout, every=5.0):
+        self.stdout = stdout
+        self.every = every
+        self.start = self.last = time.perf_counter()
+        self.rows = 0
+
+    def add(self, rows, label):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.last >= self.every:
+            self.last = now
+            self.report(label)
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.rows / elapsed if elapsed else 0
+
+    def report(self, label):
+        self.stdout.write(f"{label}: {self.rows} rows, {self.rate():.0f} rows/sec")
+
+
+def split_street(street):
+    match = re.match(r'(\d+\w*)\s+(.*)', street)
+    if match:
+        return match.group(1), match.group(2)
+    return '', street
+
+
+class BulkImporter:
+    """
+    Resolvers shared by the importers. Subclasses set `source`,
+    `agency_name` and `document_prefix` and implement process_batch().
+
+    - addresses: (street, city, state, zip)
+    - parties: (is individual, last name, first name, zip) with
+      {'occupation', 'address'} data; new ones are linked to their address
+    - filers: an agency's filer id, stored as an ExternalId of the agency,
+      with {'name', 'category_id'} and optionally {'first_name'} data
+    - documents: an agency's report id with {'filer', 'date'} data
+    """
+    source = None
+    agency_name = None
+    document_prefix = None
+
+    def __init__(self, stdout, batch_size=5000, cache_size=200000, use_copy=None):
+        self.stdout = stdout
+        self.batch_size = batch_size
+        self.use_copy = can_copy() if use_copy is None else use_copy
+        tune_connection()
+
+        self.individual = EntityCategory.objects.get_or_create(name='individual')[0]
+        self.organization = EntityCategory.objects.get_or_create(name='corporation')[0]
+        self.committee = EntityCategory.objects.get_or_create(name='committee')[0]
+        self.pac = EntityCategory.objects.get_or_create(name='political action committee')[0]
+        self.government = EntityCategory.objects.get_or_create(name='government')[0]
+        self.candidate = CampaignCategory.objects.get_or_create(name='candidate')[0]
+        self.building = AddressCategory.objects.get_or_create(name='building')[0]
+        self.agency = Entity.objects.get_or_create(category=self.government, last_name=self.agency_name)[0]
+
+        self.addresses = Resolver(self.lookup_addresses, self.create_addresses, cache_size)
+        self.parties = Resolver(self.lookup_parties, self.create_parties, cache_size)
+        self.filers = Resolver(self.lookup_filers, self.create_filers, cache_size)
+        self.documents = Resolver(self.lookup_documents, self.create_documents, cache_size)
+        # Addresses resolved for the batch being processed, used to link new entities
+        self.batch_addresses = {}
+
+    def lookup_addresses(self, keys):
+        zip_codes = {key[3] for key in keys}
+        found = {}
+        rows = Address.objects.filter(zip_code__in=zip_codes).values_list(
+            'pk', 'building_number', 'street_name', 'city_name', 'state_name', 'zip_code',
+        )
+        wanted = set(keys)
+        for pk, building_number, street_name, city_name, state_name, zip_code in rows:
+            key = (normalize(f"{building_number} {street_name}"), city_name, state_name, zip_code)
+            if key in wanted:
+                found.setdefault(key, pk)
+        return found
+
+    def create_addresses(self, new):
+        rows = []
+        for key in new:
+            building_number, street_name = split_street(key[0])
+            rows.append({
+                'category_id': self.building.pk,
+                'building_number': building_number,
+                'street_name': street_name,
+                'city_name': key[1],
+                'state_name': key[2],
+                'zip_code': key[3],
+            })
+        return dict(zip(new, create_rows(Address, rows, self.use_copy)))
+
+    def lookup_parties(self, keys):
+        last_names = {key[1] for key in keys}
+        found = {}
+        rows = Entity.objects.filter(last_name__in=last_names).values_list(
+            'pk', 'category_id', 'last_name', 'first_name', 'entity_residences__zip_code',
+        )
+        wanted = set(keys)
+        for pk, category_id, last_name, first_name, zip_code in rows:
+            key = (category_id == self.individual.pk, last_name, first_name, zip_code or '')
+            if key in wanted:
+                found.setdefault(key, pk)
+        return found
+
+    def create_parties(self, new):
+        rows = [
+            {
+                'category_id': self.individual.pk if key[0] else self.organization.pk,
+                'last_name': key[1][:300],
+                'first_name': key[2][:100],
+                'occupation': data['occupation'][:100],
+            } for key, data in new.items()
+        ]
+        pks = create_rows(Entity, rows, self.use_copy)
+
+        residences = []
+        for pk, data in zip(pks, new.values()):
+            address_id = self.batch_addresses.get(data['address'])
+            if address_id is not None:
+                residences.append({'address_id': address_id, 'entity_id': pk})
+        insert_rows(Address.residents.through, residences, self.use_copy)
+        return dict(zip(new, pks))
+
+    def lookup_filers(self, keys):
+        return dict(
+            ExternalId.objects.filter(parent_entity=self.agency, number__in=keys)
+            .values_list('number', 'child_entity_id')
+        )
+
+    def create_filers(self, new):
+        rows = [
+            {
+                'category_id': data['category_id'],
+                'last_name': data['name'][:300],
+                'first_name': data.get('first_name', '')[:100],
+            } for data in new.values()
+        ]
+        pks = create_rows(Entity, rows, self.use_copy)
+        create_rows(ExternalId, [
+            {'parent_entity_id': self.agency.pk, 'child_entity_id': pk, 'number': number}
+            for number, pk in zip(new, pks)
+        ], self.use_copy)
+        return dict(zip(new, pks))
+
+    def lookup_documents(self, keys):
+        names = {f"{self.document_prefix} {key}": key for key in keys}
+        return {names[name]: pk for name, pk in Document.objects.filter(name__in=names).values_list('name', 'pk')}
+
+    def create_documents(self, new):
+        rows = [
+            {
+                'name': f"{self.document_prefix} {key}",
+                'filer_entity_id': data['filer'],
+                'date_filed': data['date'],
+                # The files give no coverage period, so it is left unknown
+            } for key, data in new.items()
+        ]
+        return dict(zip(new, create_rows(Document, rows, self.use_copy)))
+
+    def process_batch(self, rows):
+        raise NotImplementedError
+
+    def commit_batch(self, rows, checkpoint, offset, completed=False):
+        start = time.perf_counter()
+        with transaction.atomic():
+            if rows:
+                self.process_batch(rows)
+            checkpoint.offset = offset
+            checkpoint.rows += len(rows)
+            checkpoint.completed = completed
+            checkpoint.save()
+        if rows:
+            metrics.IMPORT_ROWS.labels(self.source).inc(len(rows))
+            metrics.IMPORT_BATCH_SECONDS.labels(self.source).observe(time.perf_counter() - start)
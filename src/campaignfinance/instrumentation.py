@@ -0,0 +1,189 @@
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Times each request: its queries, through an execute_wrapper on every
+# connection (installed as connections open, signals.py), its template
+# rendering, through the template backend below,
+# and the Python code around them, which is the rest. Responses get the
+# times in a Server-Timing header, which browsers show with the request, and
+# requests slower than settings.SLOW_REQUEST_MS are logged with the queries
+# they ran most often: a query run once per row of a page is an N+1 loop.
+#
+# The timings also go to the request metrics (metrics.py).
+#
+# Connections belong to the thread that opened them, and under ASGI views
+# run in other threads than the middleware. So the wrapper stays on every
+# connection and records into the timings of the request in its context,
+# which asgiref carries into those threads.
+#
+# The cost is a few clock readings and a dict update per query and template,
+# as the SQL is only normalized for slow requests. Outside requests, one
+# context variable lookup per query.
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+# The values in a statement's SQL, which differ between runs of the same
+# statement: numbers and strings, and lists of them or of placeholders
+VALUE = r"%s|\?|\b\d+(?:\.\d+)?\b|'(?:[^']|'')*'"
+VALUES = re.compile(VALUE)
+VALUE_LISTS = re.compile(rf"\((?:{VALUE})(?:\s*,\s*(?:{VALUE}))*\)")
+
+
+def get_fingerprint(sql):
+    """The SQL of a statement without its values, the same for every run of it."""
+    sql = VALUE_LISTS.sub('(...)', sql)
+    return VALUES.sub('?', sql)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.statements = Counter()
+        # Async views run queries on several threads at once
+        self.lock = threading.Lock()
+
+    def add_query(self, sql, elapsed):
+        with self.lock:
+            self.queries += 1
+            self.db_time += elapsed
+            self.statements[sql] += 1
+
+    def get_repeated(self, limit=5):
+        """[(fingerprint, count)] of the statements run more than once, most often first."""
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[get_fingerprint(sql)] += count
+        return [(sql, count) for sql, count in fingerprints.most_common(limit) if count > 1]
+
+
+def get_current():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - start)
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def record(timings):
+    """Records the queries and templates run in this context into timings, if not None."""
+    if timings is None:
+        yield
+        return
+    token = _current.set(timings)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        db_time = timings.db_time
+        try:
+            return super().render(context, request)
+        finally:
+            # Queries the template makes count as database time
+            timings.template_time += time.perf_counter() - start - (timings.db_time - db_time)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with rendering timed."""
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+class InstrumentationMiddleware:
+    """
+    Adds a Server-Timing header to responses and logs slow requests. Goes
+    first in settings.MIDDLEWARE to time the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        with record(timings):
+            response = self.get_response(request)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        with record(timings):
+            response = await self.get_response(request)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.start
+        # Concurrent queries can add up to more than the request took
+        python_time = max(total - timings.db_time - timings.template_time, 0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+            f'tpl;dur={timings.template_time * 1000:.1f}',
+            f'app;dur={python_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        metrics.observe_request(request, response, total, timings)
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(json.dumps({
+                'message': 'slow request',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'view': getattr(request.resolver_match, 'view_name', None),
+                'total_ms': round(total * 1000, 1),
+                'db_ms': round(timings.db_time * 1000, 1),
+                'template_ms': round(timings.template_time * 1000, 1),
+                'python_ms': round(python_time * 1000, 1),
+                'queries': timings.queries,
+                'repeated_queries': [
+                    {'count': count, 'sql': sql} for sql, count in timings.get_repeated()
+                ],
+            }))
+        return response
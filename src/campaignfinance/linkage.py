@@ -0,0 +1,313 @@
+import re
+from collections import defaultdict, namedtuple
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import (Entity, Campaign, Document, Transaction, CampaignDonorTotal, DonorElectionTotal, Address,
+                     PhoneNumber, Email)
+from .analytics import get_donors, move_donors
+from .conditional import touch
+from .graph import reset_graph
+from .pagecache import invalidate_all
+from .search import index_object
+from .summaries import rebuild_campaign_summaries
+from .violations import add_donor_totals
+
+# Offline record linkage for duplicate entities, such as a hand entered
+# "Smith, John A" and an imported "SMITH, JOHN" living at the same address.
+#
+# Scoring every pair of entities is O(n²), so entities are first grouped into
+# blocks that share a cheap key, and only pairs within a block are scored:
+#
+# - normalized last name and zip code of a residence
+# - phonetic (Soundex) last name, first initial and zip code
+# - normalized last and first name, for entities with no known zip code
+# - a phone number or an email address
+#
+# Blocks bigger than MAX_BLOCK_SIZE (a shared office phone, a common name with
+# no zip code) say little about who is who and are skipped.
+
+MAX_BLOCK_SIZE = 100
+DEFAULT_THRESHOLD = 0.7
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'md', 'phd', 'esq'}
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+Record = namedtuple('Record', ['pk', 'category_id', 'last_name', 'first_name', 'middle_initial', 'phonetic'])
+
+Candidate = namedtuple('Candidate', ['score', 'pk', 'other_pk', 'reasons'])
+
+
+def normalize_name(value):
+    return ' '.join(re.sub(r"[^\w\s]|_", ' ', value.lower()).split()) if value else ''
+
+
+def normalize_last_name(value):
+    words = normalize_name(value).split()
+    while len(words) > 1 and words[-1] in NAME_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def split_first_name(first_name, middle_name=''):
+    """Returns (first name, middle initial). "john a" is John with middle initial A."""
+    words = normalize_name(first_name).split()
+    middle = words[1] if len(words) > 1 else normalize_name(middle_name)
+    return (words[0] if words else ''), middle[:1]
+
+
+def soundex(value):
+    """American Soundex code of a name, e.g. Robert and Rupert are both R163."""
+    letters = [letter for letter in value.lower() if 'a' <= letter <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code, vowels do
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def make_record(pk, category_id, first_name, middle_name, last_name):
+    last_name = normalize_last_name(last_name)
+    first_name, middle_initial = split_first_name(first_name, middle_name)
+    return Record(pk, category_id, last_name, first_name, middle_initial, soundex(last_name))
+
+
+class EntityIndex:
+    """
+    The normalized names, addresses, phone numbers and email addresses of a
+    set of entities, loaded with a handful of streaming queries.
+    """
+    def __init__(self, entities=None, chunk_size=10000):
+        if entities is None:
+            entities = Entity.objects.all()
+        self.records = {}
+        for row in entities.values_list('pk', 'category_id', 'first_name', 'middle_name', 'last_name').iterator(chunk_size=chunk_size):
+            record = make_record(*row)
+            if record.last_name:
+                self.records[record.pk] = record
+
+        self.addresses = defaultdict(set)
+        self.zip_codes = defaultdict(set)
+        residences = Address.residents.through.objects.values_list('entity_id', 'address_id', 'address__zip_code')
+        for entity_id, address_id, zip_code in residences.iterator(chunk_size=chunk_size):
+            if entity_id in self.records:
+                self.addresses[entity_id].add(address_id)
+                if zip_code:
+                    self.zip_codes[entity_id].add(zip_code[:5])
+
+        self.phones = defaultdict(set)
+        self.add_contacts(
+            self.phones,
+            PhoneNumber.associated_entities.through.objects.values_list(
+                'entity_id', 'phonenumber__area_code', 'phonenumber__number',
+            ),
+            PhoneNumber.objects.filter(owner__isnull=False).values_list('owner_id', 'area_code', 'number'),
+            chunk_size,
+        )
+        self.emails = defaultdict(set)
+        self.add_contacts(
+            self.emails,
+            Email.associated_entities.through.objects.values_list('entity_id', 'email__address'),
+            Email.objects.filter(owner__isnull=False).values_list('owner_id', 'address'),
+            chunk_size,
+        )
+
+    def add_contacts(self, contacts, associated, owned, chunk_size):
+        for queryset in (associated, owned):
+            for entity_id, *parts in queryset.iterator(chunk_size=chunk_size):
+                value = ''.join(parts).lower().replace(' ', '')
+                if value and entity_id in self.records:
+                    contacts[entity_id].add(value)
+
+    def get_block_keys(self, record):
+        zip_codes = self.zip_codes.get(record.pk, ())
+        for zip_code in zip_codes:
+            yield ('name', record.last_name, zip_code)
+            yield ('phonetic', record.phonetic, record.first_name[:1], zip_code)
+        if not zip_codes:
+            yield ('name', record.last_name, record.first_name)
+        for phone in self.phones.get(record.pk, ()):
+            yield ('phone', phone)
+        for email in self.emails.get(record.pk, ()):
+            yield ('email', email)
+
+    def get_blocks(self):
+        blocks = defaultdict(list)
+        for record in self.records.values():
+            for key in self.get_block_keys(record):
+                blocks[key].append(record.pk)
+        return blocks
+
+    def get_pairs(self, max_block_size=MAX_BLOCK_SIZE):
+        """Yields every pair of entities sharing a block once, lower pk first."""
+        seen = set()
+        for pks in self.get_blocks().values():
+            if len(pks) < 2 or len(pks) > max_block_size:
+                continue
+            for pair in combinations(sorted(set(pks)), 2):
+                if pair not in seen:
+                    seen.add(pair)
+                    yield pair
+
+    def score(self, a, b):
+        """Returns (score, reasons), the score between 0 and 1 and higher for likelier duplicates."""
+        if a.category_id != b.category_id:
+            return 0, []
+        score = 0
+        reasons = []
+
+        if a.last_name == b.last_name:
+            score += 0.4
+            reasons.append('last name')
+        elif a.phonetic == b.phonetic:
+            score += 0.25
+            reasons.append('last name sounds alike')
+
+        if a.first_name and a.first_name == b.first_name:
+            score += 0.3
+            reasons.append('first name')
+        elif a.first_name and b.first_name and (a.first_name.startswith(b.first_name) or b.first_name.startswith(a.first_name)):
+            # An initial or a short form, "j" or "jon" for "jonathan"
+            score += 0.2
+            reasons.append('first name abbreviated')
+        elif not a.first_name or not b.first_name:
+            score += 0.1
+        else:
+            score -= 0.2
+
+        if a.middle_initial and b.middle_initial and a.middle_initial != b.middle_initial:
+            score -= 0.2
+
+        if self.addresses.get(a.pk, set()) & self.addresses.get(b.pk, set()):
+            score += 0.2
+            reasons.append('address')
+        elif self.zip_codes.get(a.pk, set()) & self.zip_codes.get(b.pk, set()):
+            score += 0.1
+            reasons.append('zip code')
+
+        if self.phones.get(a.pk, set()) & self.phones.get(b.pk, set()):
+            score += 0.2
+            reasons.append('phone')
+        if self.emails.get(a.pk, set()) & self.emails.get(b.pk, set()):
+            score += 0.3
+            reasons.append('email')
+
+        return min(round(score, 2), 1), reasons
+
+    def find_candidates(self, threshold=DEFAULT_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+        """Returns the pairs scoring at least `threshold` as Candidates, best first."""
+        candidates = []
+        for pk, other_pk in self.get_pairs(max_block_size):
+            score, reasons = self.score(self.records[pk], self.records[other_pk])
+            if score >= threshold:
+                candidates.append(Candidate(score, pk, other_pk, reasons))
+        candidates.sort(key=lambda candidate: (-candidate.score, candidate.pk, candidate.other_pk))
+        return candidates
+
+
+# Blank fields of the entity kept are filled in from the merged ones
+MERGE_FIELDS = [
+    'first_name', 'middle_name', 'prefix', 'suffix', 'nickname', 'occupation', 'industry_id',
+    'opencorporates_link', 'littlesis_link',
+]
+
+# Rows derived from other tables, rebuilt after a merge instead of re-pointed
+DERIVED_MODELS = {CampaignDonorTotal, DonorElectionTotal}
+
+
+def repoint_relations(winner, loser):
+    for relation in Entity._meta.related_objects:
+        model = relation.related_model
+        if model in DERIVED_MODELS:
+            continue
+        if relation.many_to_many:
+            through = relation.through._base_manager
+            entity_field = relation.field.m2m_reverse_field_name()
+            other_field = relation.field.m2m_field_name()
+            # Links the winner already has would become duplicate rows
+            linked = through.filter(**{entity_field: winner}).values_list(other_field, flat=True)
+            through.filter(**{entity_field: loser, f'{other_field}__in': list(linked)}).delete()
+            through.filter(**{entity_field: loser}).update(**{entity_field: winner})
+        else:
+            name = relation.field.name
+            model._base_manager.filter(**{name: loser}).update(**{name: winner})
+
+
+@transaction.atomic
+def merge_entities(winner, losers):
+    """
+    Merges `losers` into `winner`: every foreign key and many to many link
+    pointing at a loser is moved to the winner, blank fields of the winner are
+    filled in, and the losers are deleted. All of it or none of it happens.
+    """
+    losers = [loser for loser in losers if loser.pk != winner.pk]
+    if not losers:
+        return winner
+    loser_ids = [loser.pk for loser in losers]
+    involved = [winner.pk] + loser_ids
+
+    # Bulk updates skip the signals that keep summaries and search entries
+    # current. Summaries are per committee, so the campaigns to rebuild are
+    # those of the committees the losers gave to or took from.
+    counterparts = set()
+    for payer_id, payee_id in Transaction.objects.filter(
+        Q(payer_entity__in=loser_ids) | Q(payee_entity__in=loser_ids)
+    ).values_list('payer_entity_id', 'payee_entity_id').distinct():
+        counterparts.update((payer_id, payee_id))
+    campaign_ids = list(
+        Campaign.objects.filter(committee_entity__in=counterparts | set(involved)).values_list('pk', flat=True)
+    )
+    document_ids = list(Document.objects.filter(filer_entity__in=loser_ids).values_list('pk', flat=True))
+
+    # The analytics rollups file contributions under the donor's industry and
+    # home, so the losers' are refiled under the winner's before they move.
+    # Saving the winner refiles everything if it takes a loser's industry.
+    donor = get_donors([winner.pk])[winner.pk]
+    move_donors(get_donors(loser_ids), {pk: donor for pk in loser_ids})
+
+    for loser in losers:
+        repoint_relations(winner, loser)
+        for field in MERGE_FIELDS:
+            if not getattr(winner, field) and getattr(loser, field):
+                setattr(winner, field, getattr(loser, field))
+    winner.save()
+
+    for loser in losers:
+        loser.delete()
+
+    # and again if the winner moved into a loser's home
+    home = get_donors([winner.pk])[winner.pk][1]
+    move_donors({winner.pk: (None, donor[1])}, {winner.pk: (None, home)})
+
+    rebuild_campaign_summaries(Campaign.objects.filter(pk__in=campaign_ids))
+    # The losers' donor totals went with them
+    DonorElectionTotal.objects.filter(Q(payer_entity=winner) | Q(payee_entity=winner)).delete()
+    add_donor_totals(Transaction.objects.filter(Q(payer_entity=winner) | Q(payee_entity=winner)))
+    # The counterparts' pages list the moved transactions
+    touch(Entity, counterparts)
+    touch(Document, document_ids)
+    for document in Document.objects.filter(pk__in=document_ids).select_related('filer_entity'):
+        index_object(document)
+    # Too many edges move at once to patch the connections graph
+    transaction.on_commit(reset_graph)
+    # and too many pages to track
+    invalidate_all()
+    return winner
@@ -0,0 +1,96 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from campaignfinance import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every URL and reports its query count, p50 and p95 latency and peak memory. "
+        "Saves the results as a JSON baseline with --output, and fails if any view is worse "
+        "than the --baseline it is compared against."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Seed this many synthetic transactions first, e.g. 10000, 100000 or 1000000.",
+        )
+        parser.add_argument(
+            '--entities',
+            type=int,
+            help="Seed this many entities. Defaults to a tenth of the transactions.",
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=3,
+            help="How much the seeded transactions concentrate on the first donors and committees.",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help="Requests per URL to take the latencies from.",
+        )
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help="URL names to benchmark, such as entitydetail. Defaults to all of them.",
+        )
+        parser.add_argument(
+            '--output',
+            help="Save the results to this JSON file.",
+        )
+        parser.add_argument(
+            '--baseline',
+            help="Compare the results to this JSON file from an earlier run.",
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help="Fraction by which latency or memory may grow before it is a regression.",
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            synthetic.seed(
+                transactions=options['seed'],
+                entities=options['entities'],
+                skew=options['skew'],
+                stdout=self.stdout,
+            )
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        baseline = None
+        scale = benchmark.get_scale()
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline['scale'] != scale:
+                raise CommandError(
+                    f"The baseline was recorded on {baseline['scale']}, not {scale}. "
+                    "Seed the same data to compare against it."
+                )
+
+        results = benchmark.run(options['repeat'], options['names'], stdout=self.stdout)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'scale': scale, 'views': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Saved the results to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmark.find_regressions(results, baseline['views'], options['threshold'])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
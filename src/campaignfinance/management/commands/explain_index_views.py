@@ -0,0 +1,112 @@
+import itertools
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from campaignfinance import synthetic, views
+from campaignfinance.categories import get_category_id
+from campaignfinance.pagination import get_sort_keys, seek
+
+INDEX_VIEWS = [
+    views.EntityIndexView,
+    views.RelationshipIndexView,
+    views.CampaignIndexView,
+    views.OfficeIndexView,
+    views.ElectionIndexView,
+    views.DocumentIndexView,
+    views.TransactionIndexView,
+    views.AddressIndexView,
+    views.PhoneNumberIndexView,
+    views.EmailIndexView,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Explains the first page query of every sort and filter option on the index views, "
+        "and the query of the page after it, and reports whether they scan the whole table. "
+        "Run it before and after "
+        "`migrate campaignfinance 0007` to compare plans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Seed this many synthetic transactions (and a tenth as many entities) first.",
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            synthetic.seed(transactions=options['seed'], stdout=self.stdout)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        factory = RequestFactory()
+        full_scans = 0
+
+        for view_class in INDEX_VIEWS:
+            table = view_class.model._meta.db_table
+            sort_options = list(getattr(view_class, 'sort_by_fields', {None: None}))
+            filter_options = list(getattr(view_class, 'filter_categories', {None: None}))
+
+            for sortby, category in itertools.product(sort_options, filter_options):
+                category_name = getattr(view_class, 'filter_categories', {}).get(category)
+                if category_name is not None:
+                    category_model = view_class.model._meta.get_field('category').related_model
+                    if get_category_id(category_model, category_name) is None:
+                        # The category has not been created in this database
+                        continue
+
+                params = {key: value for key, value in (('sortby', sortby), ('category', category)) if value}
+                view = view_class()
+                view.setup(factory.get('/', params))
+                queryset = view.get_queryset()
+                keys = get_sort_keys(queryset)
+                label = f"{view_class.__name__} sortby={sortby} category={category}"
+                rows = self.explain(seek(queryset, keys)[:view.paginate_by + 1], table, label, None, options)
+                full_scans += rows is None
+
+                # The next page starts after the last row of this one, and
+                # should start its index scan there too
+                if rows is not None and len(rows) > view.paginate_by:
+                    values = [getattr(rows[view.paginate_by - 1], key.attname) for key in keys]
+                    page = seek(queryset, keys, values)[:view.paginate_by + 1]
+                    full_scans += self.explain(page, table, f"{label} after cursor", values, options) is None
+
+        self.stdout.write(f"{full_scans} queries scan and sort a whole table")
+
+    def explain(self, queryset, table, label, values, options):
+        """The rows of the page, or None if its query scans the whole table."""
+        plan = queryset.explain()
+
+        start = time.perf_counter()
+        rows = list(queryset)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        full_scan = self.is_full_scan(plan, table, seeking=values is not None)
+        status = self.style.WARNING('FULL SCAN') if full_scan else self.style.SUCCESS('index')
+        self.stdout.write(f"{label}: {status} {elapsed:.1f}ms")
+        if options['verbosity'] > 1:
+            self.stdout.write(plan)
+        return None if full_scan else rows
+
+    def is_full_scan(self, plan, table, seeking=False):
+        if connection.vendor == 'postgresql':
+            if f"Seq Scan on {table}" in plan:
+                return True
+            # After a cursor, the index scan has to start from a condition
+            # on it rather than read the index from its start
+            return seeking and not re.search(rf"Scan(?: Backward)? using \S+ on {table}\b[^\n]*\n\s*Index Cond", plan)
+        # SQLite: "SCAN table" without "USING INDEX", or a temp b-tree to sort
+        # it. After a cursor, any SCAN reads the index from its start, where
+        # SEARCH would start at the cursor.
+        if seeking and re.search(rf"SCAN {table}\b", plan):
+            return True
+        return bool(re.search(rf"SCAN {table}(?! USING)", plan)) or 'TEMP B-TREE FOR ORDER BY' in plan
@@ -0,0 +1,60 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaignfinance.linkage import DEFAULT_THRESHOLD, MAX_BLOCK_SIZE, EntityIndex
+from campaignfinance.models import Entity
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds entities that are likely duplicates of each other and writes them as CSV, best matches first. "
+        "Review the pairs, then merge them with manage.py merge_entities."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help="CSV file to write. Defaults to standard output.",
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help="Lowest score (0 to 1) of the pairs written.",
+        )
+        parser.add_argument(
+            '--max-block-size',
+            type=int,
+            default=MAX_BLOCK_SIZE,
+            help="Entities sharing a blocking key beyond which the block is skipped.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = EntityIndex()
+        candidates = index.find_candidates(options['threshold'], options['max_block_size'])
+        elapsed = time.perf_counter() - start
+
+        pks = {pk for candidate in candidates for pk in candidate[1:3]}
+        entities = {}
+        pk_list = list(pks)
+        for offset in range(0, len(pk_list), 1000):
+            entities.update(Entity.objects.in_bulk(pk_list[offset:offset + 1000]))
+
+        file = open(options['output'], 'w', newline='') if options['output'] else self.stdout
+        try:
+            writer = csv.writer(file)
+            writer.writerow(['score', 'uuid', 'name', 'other_uuid', 'other_name', 'reasons'])
+            for candidate in candidates:
+                entity, other = entities[candidate.pk], entities[candidate.other_pk]
+                writer.writerow([candidate.score, entity.uuid, entity, other.uuid, other, '; '.join(candidate.reasons)])
+        finally:
+            if options['output']:
+                file.close()
+
+        # Standard output may be the CSV itself
+        self.stderr.write(
+            f"Compared {len(index.records)} entities, found {len(candidates)} candidate pairs in {elapsed:.1f}s"
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaignfinance.pagecache import invalidate_all
+from campaignfinance.violations import flag_violations
+
+
+class Command(BaseCommand):
+    help = (
+        "Flags every contribution that breaks the rules in settings.CONTRIBUTION_RULES, "
+        "replacing the previous violations. Run it after bulk imports or changing the rules."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = flag_violations(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        invalidate_all()
+        for rule, count in counts.items():
+            self.stdout.write(f"{rule}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Flagged the violations in {elapsed:.1f}s"))
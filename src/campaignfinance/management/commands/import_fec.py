@@ -0,0 +1,116 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaignfinance.analytics import rebuild_analytics
+from campaignfinance.fec import FecImporter
+from campaignfinance.pagecache import invalidate_all
+from campaignfinance.violations import flag_violations
+from campaignfinance.search import rebuild_search_index
+from campaignfinance.summaries import rebuild_campaign_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports Federal Election Commission bulk data files: the candidate master (cn.txt), the committee "
+        "master (cm.txt) and individual contributions (itcont.txt). Interrupted contribution imports resume "
+        "after the last committed batch when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--candidates',
+            type=Path,
+            help="Candidate master file, loaded first.",
+        )
+        parser.add_argument(
+            '--committees',
+            type=Path,
+            help="Committee master file, loaded after the candidates.",
+        )
+        parser.add_argument(
+            '--contributions',
+            type=Path,
+            nargs='+',
+            default=[],
+            help="Individual contribution files, loaded last.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help="Processes parsing contribution files. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=16,
+            help="Megabytes of a contribution file handed to a worker at a time.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Rows per database transaction and checkpoint.",
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore saved checkpoints and import the contribution files from the start.",
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help="Insert rows with an executemany INSERT instead of COPY, even on PostgreSQL.",
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help="Do not rebuild the campaign summaries and search index afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        paths = [options['candidates'], options['committees'], *options['contributions']]
+        if not any(paths):
+            raise CommandError("Nothing to import, give --candidates, --committees or --contributions")
+        for path in paths:
+            if path and not path.is_file():
+                raise CommandError(f"{path} does not exist")
+
+        importer = FecImporter(
+            self.stdout,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'] * 1024 * 1024,
+            batch_size=options['batch_size'],
+            use_copy=False if options['no_copy'] else None,
+        )
+
+        changed = 0
+        if options['candidates']:
+            changed += importer.import_candidates(options['candidates'])
+        if options['committees']:
+            changed += importer.import_committees(options['committees'])
+
+        imported = 0
+        if options['contributions']:
+            self.stdout.write(
+                f"Loading transactions with {'COPY' if importer.use_copy else 'executemany INSERT'}, "
+                f"parsing with {importer.workers} workers"
+            )
+        for path in options['contributions']:
+            imported += importer.import_contributions(path, options['restart'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} transactions, created {importer.parties.created} contributors, "
+            f"{importer.filers.created} committees and candidates and {importer.documents.created} reports"
+        ))
+
+        # Bulk inserts skip the signals that maintain these
+        if (changed or imported) and not options['skip_rebuild']:
+            rebuild_campaign_summaries()
+            rebuild_analytics()
+            flag_violations()
+            rebuild_search_index(['entity', 'address', 'document', 'transaction'])
+            self.stdout.write("Rebuilt campaign summaries, analytics, violations and the search index")
+        if changed or imported:
+            invalidate_all()
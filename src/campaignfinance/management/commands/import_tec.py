@@ -0,0 +1,79 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaignfinance.analytics import rebuild_analytics
+from campaignfinance.pagecache import invalidate_all
+from campaignfinance.violations import flag_violations
+from campaignfinance.search import rebuild_search_index
+from campaignfinance.summaries import rebuild_campaign_summaries
+from campaignfinance.tec import InvalidFile, TecImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports contribs_*.csv and expend_*.csv files from the Texas Ethics Commission bulk export. "
+        "Interrupted imports resume after the last committed batch when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Rows per database transaction and checkpoint.",
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore saved checkpoints and import the files from the start.",
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help="Insert rows with an executemany INSERT instead of COPY, even on PostgreSQL.",
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help="Do not rebuild the campaign summaries and search index afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            if not path.is_file():
+                raise CommandError(f"{path} does not exist")
+
+        importer = TecImporter(
+            self.stdout,
+            batch_size=options['batch_size'],
+            use_copy=False if options['no_copy'] else None,
+        )
+        self.stdout.write(f"Loading transactions with {'COPY' if importer.use_copy else 'executemany INSERT'}")
+
+        imported = 0
+        for path in options['paths']:
+            try:
+                imported += importer.import_file(path, options['encoding'], options['restart'])
+            except InvalidFile as error:
+                raise CommandError(f"{path}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} transactions, created {importer.parties.created} contributors and payees, "
+            f"{importer.filers.created} filers and {importer.documents.created} reports"
+        ))
+
+        # Bulk inserts skip the signals that maintain these
+        if imported and not options['skip_rebuild']:
+            rebuild_campaign_summaries()
+            rebuild_analytics()
+            flag_violations()
+            rebuild_search_index(['entity', 'address', 'document', 'transaction'])
+            self.stdout.write("Rebuilt campaign summaries, analytics, violations and the search index")
+        if imported:
+            invalidate_all()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from campaignfinance.linkage import merge_entities
+from campaignfinance.models import Entity
+
+
+class Command(BaseCommand):
+    help = (
+        "Merges duplicate entities into one. Everything that refers to the duplicates is moved to the "
+        "entity kept, in a single transaction, and the duplicates are deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('winner', help="UUID of the entity to keep.")
+        parser.add_argument('losers', nargs='+', help="UUIDs of the duplicates to merge into it.")
+
+    def handle(self, *args, **options):
+        uuids = [options['winner'], *options['losers']]
+        entities = {str(entity.uuid): entity for entity in Entity.objects.filter(uuid__in=uuids)}
+        missing = set(uuids) - set(entities)
+        if missing:
+            raise CommandError(f"Unknown entities: {', '.join(sorted(missing))}")
+
+        winner = entities[options['winner']]
+        losers = [entities[uuid] for uuid in options['losers']]
+        merge_entities(winner, losers)
+        self.stdout.write(self.style.SUCCESS(f"Merged {len(losers)} entities into {winner} ({winner.uuid})"))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaignfinance.analytics import rebuild_analytics
+from campaignfinance.pagecache import invalidate_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the analytics rollups (contributions by industry and month, and by place) "
+        "from the transactions table. Run it after bulk imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = rebuild_analytics(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        invalidate_all()
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the analytics rollups in {elapsed:.1f}s"))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaignfinance.models import Campaign
+from campaignfinance.pagecache import invalidate_all
+from campaignfinance.summaries import rebuild_campaign_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the campaign summaries (totals, top donors and spending by category) "
+        "from the transactions table. Run it after bulk imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'campaigns',
+            nargs='*',
+            help="UUIDs of the campaigns to rebuild. Rebuilds every campaign if none are given.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of campaigns to aggregate per query.",
+        )
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.all()
+        if options['campaigns']:
+            campaigns = campaigns.filter(uuid__in=options['campaigns'])
+            missing = set(options['campaigns']) - {str(pk) for pk in campaigns.values_list('uuid', flat=True)}
+            if missing:
+                raise CommandError(f"Unknown campaigns: {', '.join(sorted(missing))}")
+
+        start = time.perf_counter()
+        count = rebuild_campaign_summaries(campaigns, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} campaign summaries in {elapsed:.1f}s"))
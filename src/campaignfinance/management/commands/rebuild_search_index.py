@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaignfinance.search import SEARCH_MODELS, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Recreates the full-text search entries from the searchable tables. Run it after bulk imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kinds',
+            nargs='*',
+            choices=list(SEARCH_MODELS),
+            help="Kinds of objects to reindex. Reindexes everything if none are given.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = rebuild_search_index(options['kinds'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index in {elapsed:.1f}s"))
@@ -0,0 +1,48 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from campaignfinance.models import Document
+from campaignfinance.reconciliation import reconcile_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the itemized transactions of documents against their reported totals and "
+        "stores the discrepancies. Only documents changed since their last check are "
+        "checked, unless --full is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Check every document.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=Decimal,
+            default=Decimal(0),
+            help="Largest difference, in dollars, that is not a discrepancy.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = reconcile_documents(
+            Document.objects.all() if options['full'] else None,
+            batch_size=options['batch_size'],
+            tolerance=options['tolerance'],
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {counts['documents']} documents, {counts['changed']} with changed "
+                f"discrepancies, in {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,78 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# Metrics for Prometheus, served at /metrics.
+#
+# gunicorn serves requests from several worker processes. With the
+# PROMETHEUS_MULTIPROC_DIR environment variable set, as in the container,
+# every process writes its metrics to files in that directory and /metrics
+# adds up all of them, whichever worker answers it. Processes that run
+# imports write there too. gunicorn.conf.py empties the directory on start.
+#
+# Request metrics are labeled by route, the name of the URL pattern
+# (campaignfinance:entitydetail), and come from the instrumentation
+# middleware (instrumentation.py). The page cache hit ratio is
+# rate(powertracker_page_cache_lookups_total{result="hit"}) over all lookups,
+# and import throughput is rate(powertracker_import_rows_total).
+
+REQUESTS = Counter(
+    'powertracker_requests', "Requests answered, by route, method and status.",
+    ['route', 'method', 'status'],
+)
+REQUEST_SECONDS = Histogram(
+    'powertracker_request_seconds', "Time taken to answer a request, by route.",
+    ['route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_QUERIES = Histogram(
+    'powertracker_request_queries', "Queries made answering a request, by route.",
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'powertracker_request_db_seconds', "Time spent on queries answering a request, by route.",
+    ['route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_LOOKUPS = Counter(
+    'powertracker_page_cache_lookups', "Page cache lookups, by what was looked up (page or fragment) and result.",
+    ['kind', 'result'],
+)
+IMPORT_ROWS = Counter(
+    'powertracker_import_rows', "Rows imported, by source.",
+    ['source'],
+)
+IMPORT_BATCH_SECONDS = Histogram(
+    'powertracker_import_batch_seconds', "Time taken to import a batch of rows, by source.",
+    ['source'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+
+def get_route(request):
+    # Not the path, which would be a new series for every object
+    match = request.resolver_match
+    return match.view_name if match is not None else 'unmatched'
+
+
+def observe_request(request, response, total, timings):
+    route = get_route(request)
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    REQUEST_SECONDS.labels(route).observe(total)
+    REQUEST_QUERIES.labels(route).observe(timings.queries)
+    REQUEST_DB_SECONDS.labels(route).observe(timings.db_time)
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,149 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0006_remove_document_file_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['street_name', 'id'], name='address_street_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['city_name', 'id'], name='address_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['state_name', 'id'], name='address_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['zip_code', 'id'], name='address_zip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['category', 'street_name', 'id'], name='address_cat_street_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['category', 'city_name', 'id'], name='address_cat_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['category', 'state_name', 'id'], name='address_cat_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['category', 'zip_code', 'id'], name='address_cat_zip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assumedname',
+            index=models.Index(fields=['name', 'id'], name='assumed_name_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['name', 'id'], name='campaign_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['registration_date', 'id'], name='campaign_reg_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['category', 'name', 'id'], name='campaign_cat_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['category', 'registration_date', 'id'], name='campaign_cat_reg_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['date_filed', 'id'], name='document_date_filed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['name', 'id'], name='document_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['coverage_start_date', 'id'], name='document_cov_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['coverage_end_date', 'id'], name='document_cov_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='election',
+            index=models.Index(fields=['date', 'id'], name='election_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='election',
+            index=models.Index(fields=['category', 'date', 'id'], name='election_cat_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['last_name', 'id'], name='entity_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['first_name', 'id'], name='entity_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['category', 'last_name', 'id'], name='entity_cat_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['category', 'first_name', 'id'], name='entity_cat_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entity',
+            index=models.Index(fields=['category', 'industry', 'id'], name='entity_cat_industry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='office',
+            index=models.Index(fields=['name', 'id'], name='office_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonenumber',
+            index=models.Index(fields=['area_code', 'id'], name='phone_number_area_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['recorded_date', 'id'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['amount', 'id'], name='transaction_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'recorded_date', 'id'], name='transaction_cat_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'amount', 'id'], name='transaction_cat_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'payer_entity', 'id'], name='transaction_cat_payer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'payee_entity', 'id'], name='transaction_cat_payee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payer_entity', 'recorded_date', 'id'], name='transaction_payer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payee_entity', 'recorded_date', 'id'], name='transaction_payee_date_idx'),
+        ),
+    ]
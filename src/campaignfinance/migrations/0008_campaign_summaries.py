@@ -0,0 +1,62 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0007_sort_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('total_raised', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('contribution_count', models.IntegerField(default=0)),
+                ('expenditure_count', models.IntegerField(default=0)),
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_summary', to='campaignfinance.campaign')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CampaignCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('raised', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('spent', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('raised_count', models.IntegerField(default=0)),
+                ('spent_count', models.IntegerField(default=0)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_category_totals', to='campaignfinance.campaign')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_campaign_totals', to='campaignfinance.transactioncategory')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CampaignDonorTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_donor_totals', to='campaignfinance.campaign')),
+                ('donor_entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entity_donor_totals', to='campaignfinance.entity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['campaign', '-total'], name='donor_total_campaign_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='campaigndonortotal',
+            constraint=models.UniqueConstraint(fields=('campaign', 'donor_entity'), name='donor_total_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='campaigncategorytotal',
+            constraint=models.UniqueConstraint(fields=('campaign', 'category'), name='category_total_unique'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+# The full-text index is not expressible as a Django field in 4.2, so it is
+# created per database vendor. Other backends fall back to icontains lookups.
+
+POSTGRESQL_CREATE = [
+    """
+    ALTER TABLE campaignfinance_searchentry ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX search_entry_vector_idx ON campaignfinance_searchentry USING GIN (search_vector)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS search_entry_vector_idx",
+    "ALTER TABLE campaignfinance_searchentry DROP COLUMN IF EXISTS search_vector",
+]
+
+# External content FTS5 table: the text is stored once, in the search entry
+# table, and the triggers keep the full-text index in step with it
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE campaignfinance_searchentry_fts USING fts5(
+        title, body,
+        content='campaignfinance_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER campaignfinance_searchentry_ai AFTER INSERT ON campaignfinance_searchentry BEGIN
+        INSERT INTO campaignfinance_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER campaignfinance_searchentry_ad AFTER DELETE ON campaignfinance_searchentry BEGIN
+        INSERT INTO campaignfinance_searchentry_fts(campaignfinance_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER campaignfinance_searchentry_au AFTER UPDATE ON campaignfinance_searchentry BEGIN
+        INSERT INTO campaignfinance_searchentry_fts(campaignfinance_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO campaignfinance_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS campaignfinance_searchentry_ai",
+    "DROP TRIGGER IF EXISTS campaignfinance_searchentry_ad",
+    "DROP TRIGGER IF EXISTS campaignfinance_searchentry_au",
+    "DROP TABLE IF EXISTS campaignfinance_searchentry_fts",
+]
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'postgresql': POSTGRESQL_CREATE, 'sqlite': SQLITE_CREATE})
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'postgresql': POSTGRESQL_DROP, 'sqlite': SQLITE_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0008_campaign_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('entity', 'Person or Organization'), ('assumedname', 'Assumed Name'), ('address', 'Address'), ('document', 'Document'), ('transaction', 'Transaction')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('object_uuid', models.UUIDField()),
+                ('title', models.CharField(max_length=1000)),
+                ('body', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_unique'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.2 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0009_search_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('file_name', models.CharField(max_length=300)),
+                ('file_size', models.BigIntegerField()),
+                ('offset', models.BigIntegerField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='importcheckpoint',
+            constraint=models.UniqueConstraint(fields=('source', 'file_name', 'file_size'), name='import_checkpoint_unique'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignIndustryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndustryMonthTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlaceTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('state_name', models.CharField(blank=True, max_length=300)),
+                ('county_name', models.CharField(blank=True, max_length=300)),
+                ('zip_code', models.CharField(blank=True, max_length=300)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='placetotal',
+            constraint=models.UniqueConstraint(fields=('state_name', 'county_name', 'zip_code'), name='place_total_unique'),
+        ),
+        migrations.AddField(
+            model_name='industrymonthtotal',
+            name='industry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='industry_month_totals', to='campaignfinance.industry'),
+        ),
+        migrations.AddField(
+            model_name='campaignindustrytotal',
+            name='campaign',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_industry_totals', to='campaignfinance.campaign'),
+        ),
+        migrations.AddField(
+            model_name='campaignindustrytotal',
+            name='industry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='industry_campaign_totals', to='campaignfinance.industry'),
+        ),
+        migrations.AddConstraint(
+            model_name='industrymonthtotal',
+            constraint=models.UniqueConstraint(fields=('industry', 'month'), name='industry_month_total_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignindustrytotal',
+            index=models.Index(fields=['campaign', '-total'], name='industry_total_campaign_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='campaignindustrytotal',
+            constraint=models.UniqueConstraint(fields=('campaign', 'industry'), name='industry_total_unique'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0012_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Discrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('check_name', models.CharField(max_length=100)),
+                ('reported', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('itemized', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('itemized_count', models.IntegerField(default=0)),
+                ('difference', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='reconciled_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['document', 'category', 'amount'], name='transaction_doc_sums_idx'),
+        ),
+        migrations.AddField(
+            model_name='discrepancy',
+            name='document',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_discrepancies', to='campaignfinance.document'),
+        ),
+        migrations.AddConstraint(
+            model_name='discrepancy',
+            constraint=models.UniqueConstraint(fields=('document', 'check_name'), name='discrepancy_unique'),
+        ),
+    ]
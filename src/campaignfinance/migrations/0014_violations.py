@@ -0,0 +1,39 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0013_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViolationCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('name', models.CharField(max_length=300, unique=True)),
+                ('description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Violation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('detail', models.CharField(blank=True, max_length=1000)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_violations', to='campaignfinance.violationcategory')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_violations', to='campaignfinance.transaction')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='violation',
+            constraint=models.UniqueConstraint(fields=('transaction', 'category'), name='violation_unique'),
+        ),
+    ]
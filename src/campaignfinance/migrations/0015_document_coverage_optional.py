@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-18 22:04
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def clear_imported_coverage(apps, schema_editor):
+    # The importers used to set both coverage dates to the filing date
+    Document = apps.get_model('campaignfinance', 'Document')
+    Document.objects.filter(
+        Q(name__startswith='tec report ') | Q(name__startswith='fec report '),
+        coverage_start_date=F('date_filed'),
+        coverage_end_date=F('date_filed'),
+    ).update(coverage_start_date=None, coverage_end_date=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0014_violations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='coverage_end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='coverage_start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_imported_coverage, migrations.RunPython.noop),
+    ]
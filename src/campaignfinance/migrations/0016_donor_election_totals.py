@@ -0,0 +1,59 @@
+# Generated by Django 4.2.2 on 2026-10-18 22:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+import uuid
+
+
+def add_donor_totals(apps, schema_editor):
+    # What DonorLimitRule.rebuild() computes, from the transactions so far
+    Campaign = apps.get_model('campaignfinance', 'Campaign')
+    Transaction = apps.get_model('campaignfinance', 'Transaction')
+    DonorElectionTotal = apps.get_model('campaignfinance', 'DonorElectionTotal')
+    committees = Campaign.objects.filter(committee_entity__isnull=False).values('committee_entity_id')
+    totals = (
+        Transaction.objects.filter(payer_entity__isnull=False, payee_entity_id__in=committees)
+        .values('payer_entity_id', 'payee_entity_id', 'campaign__election_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    DonorElectionTotal.objects.bulk_create([
+        DonorElectionTotal(
+            payer_entity_id=row['payer_entity_id'], payee_entity_id=row['payee_entity_id'],
+            election_id=row['campaign__election_id'], total=row['total'], count=row['count'],
+        ) for row in totals.iterator()
+    ], batch_size=5000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaignfinance', '0015_document_coverage_optional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorElectionTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('election', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='election_donor_totals', to='campaignfinance.election')),
+                ('payee_entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entity_payee_election_totals', to='campaignfinance.entity')),
+                ('payer_entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entity_payer_election_totals', to='campaignfinance.entity')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='donorelectiontotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('election__isnull', False)), fields=('payer_entity', 'payee_entity', 'election'), name='donor_election_total_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='donorelectiontotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('election__isnull', True)), fields=('payer_entity', 'payee_entity'), name='donor_no_election_total_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payer_entity', 'payee_entity', 'recorded_date', 'id'], name='transaction_donor_date_idx'),
+        ),
+        migrations.RunPython(add_donor_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+class RelatedObjectsMixin:
+    """
+    Applies the view's select_related/prefetch_related declarations in
+    get_queryset() so templates can follow relations without a query per row.
+
+    List every relation the view's template walks, e.g.
+        select_related = ('category', 'payer_entity', 'payee_entity')
+    """
+    select_related = ()
+    prefetch_related = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 
 # ID fields are created automatically
@@ -139,6 +140,23 @@ class Entity(models.Model):
         blank=True,
     )
 
+    # Last change to the row or to the rows shown with it, see conditional.py
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+    )
+
+    class Meta:
+        # Match the sort and filter options of the index views, with the pk
+        # last for keyset pagination
+        indexes = [
+            models.Index(fields=['last_name', 'id'], name='entity_last_name_idx'),
+            models.Index(fields=['first_name', 'id'], name='entity_first_name_idx'),
+            models.Index(fields=['category', 'last_name', 'id'], name='entity_cat_last_name_idx'),
+            models.Index(fields=['category', 'first_name', 'id'], name='entity_cat_first_name_idx'),
+            models.Index(fields=['category', 'industry', 'id'], name='entity_cat_industry_idx'),
+        ]
+
     def __str__(self):
         return f"{self.last_name}, {self.first_name} {self.middle_name} {self.suffix}"
 
@@ -274,6 +292,11 @@ class Office(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='office_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -347,6 +370,12 @@ class Election(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='election_date_idx'),
+            models.Index(fields=['category', 'date', 'id'], name='election_cat_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.date}"
 
@@ -413,6 +442,20 @@ class Campaign(models.Model):
         blank=True,
     )
 
+    # Last change to the row or to the rows shown with it, see conditional.py
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='campaign_name_idx'),
+            models.Index(fields=['registration_date', 'id'], name='campaign_reg_date_idx'),
+            models.Index(fields=['category', 'name', 'id'], name='campaign_cat_name_idx'),
+            models.Index(fields=['category', 'registration_date', 'id'], name='campaign_cat_reg_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -468,8 +511,15 @@ class Document(models.Model):
     )
 
     date_filed = models.DateField()
-    coverage_start_date = models.DateField()
-    coverage_end_date = models.DateField()
+    # Unknown for reports imported from files that only give a filing date
+    coverage_start_date = models.DateField(
+        null=True,
+        blank=True,
+    )
+    coverage_end_date = models.DateField(
+        null=True,
+        blank=True,
+    )
 
     uploaded_file = models.FileField(
         blank=True,
@@ -479,6 +529,28 @@ class Document(models.Model):
         blank=True,
     )
 
+    # Last change to the row or to the rows shown with it, see conditional.py
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+    )
+
+    # When its itemized transactions were last checked against its reported
+    # totals, see reconciliation.py
+    reconciled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_filed', 'id'], name='document_date_filed_idx'),
+            models.Index(fields=['name', 'id'], name='document_name_idx'),
+            models.Index(fields=['coverage_start_date', 'id'], name='document_cov_start_idx'),
+            models.Index(fields=['coverage_end_date', 'id'], name='document_cov_end_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -645,6 +717,57 @@ class ReportedSubtotals(models.Model):
         return f"{self.document}"
 
 
+class Discrepancy(models.Model):
+    # A reported total of a document that its itemized transactions do not
+    # add up to, see reconciliation.py
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='document_discrepancies',
+    )
+
+    # Name of the check, such as 'contributions'
+    check_name = models.CharField(
+        max_length=100,
+    )
+
+    reported = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    itemized = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    itemized_count = models.IntegerField(
+        default=0,
+    )
+
+    difference = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'check_name'], name='discrepancy_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.document} {self.check_name} {self.difference}"
+
+
 class TransactionCategory(models.Model):
     uuid = models.UUIDField(
         default=uuid.uuid4,
@@ -722,10 +845,397 @@ class Transaction(models.Model):
         blank=True,
     )
 
+    # Last change to the row or to the rows shown with it, see conditional.py
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recorded_date', 'id'], name='transaction_date_idx'),
+            models.Index(fields=['amount', 'id'], name='transaction_amount_idx'),
+            models.Index(fields=['category', 'recorded_date', 'id'], name='transaction_cat_date_idx'),
+            models.Index(fields=['category', 'amount', 'id'], name='transaction_cat_amount_idx'),
+            models.Index(fields=['category', 'payer_entity', 'id'], name='transaction_cat_payer_idx'),
+            models.Index(fields=['category', 'payee_entity', 'id'], name='transaction_cat_payee_idx'),
+            models.Index(fields=['payer_entity', 'recorded_date', 'id'], name='transaction_payer_date_idx'),
+            models.Index(fields=['payee_entity', 'recorded_date', 'id'], name='transaction_payee_date_idx'),
+            # A donor's transactions to a committee after a date, see violations.py
+            models.Index(fields=['payer_entity', 'payee_entity', 'recorded_date', 'id'], name='transaction_donor_date_idx'),
+            # Covers the per document sums of reconciliation.py
+            models.Index(fields=['document', 'category', 'amount'], name='transaction_doc_sums_idx'),
+        ]
+
     def __str__(self):
         return f"{self.category} {self.payer_entity} {self.payee_entity} {self.amount}"
 
 
+class ViolationCategory(models.Model):
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    # Name of the rule that flags it, see violations.py
+    name = models.CharField(
+        max_length=300,
+        unique=True,
+    )
+
+    description = models.TextField(
+        blank=True,
+    )
+
+    def __str__(self):
+        return f"{self.name}"
+
+
+class Violation(models.Model):
+    # A transaction flagged by a contribution rule, see violations.py
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    category = models.ForeignKey(
+        ViolationCategory,
+        on_delete=models.CASCADE,
+        related_name='category_violations',
+    )
+
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='transaction_violations',
+    )
+
+    # How much of the transaction is in violation
+    amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    detail = models.CharField(
+        max_length=1000,
+        blank=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction', 'category'], name='violation_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} {self.transaction}"
+
+
+class DonorElectionTotal(models.Model):
+    # Everything a donor gave a committee for an election, or for no
+    # election, that the donor limit counts, see violations.py
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    payer_entity = models.ForeignKey(
+        Entity,
+        on_delete=models.CASCADE,
+        related_name='entity_payer_election_totals',
+    )
+
+    payee_entity = models.ForeignKey(
+        Entity,
+        on_delete=models.CASCADE,
+        related_name='entity_payee_election_totals',
+    )
+
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='election_donor_totals',
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['payer_entity', 'payee_entity', 'election'],
+                condition=models.Q(election__isnull=False),
+                name='donor_election_total_unique',
+            ),
+            # NULLs are distinct in a unique constraint
+            models.UniqueConstraint(
+                fields=['payer_entity', 'payee_entity'],
+                condition=models.Q(election__isnull=True),
+                name='donor_no_election_total_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.payer_entity} {self.payee_entity} {self.election} {self.total}"
+
+
+class CampaignSummary(models.Model):
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    campaign = models.OneToOneField(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='campaign_summary',
+    )
+
+    total_raised = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    total_spent = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    contribution_count = models.IntegerField(
+        default=0,
+    )
+
+    expenditure_count = models.IntegerField(
+        default=0,
+    )
+
+    def __str__(self):
+        return f"{self.campaign}"
+
+
+class CampaignDonorTotal(models.Model):
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='campaign_donor_totals',
+    )
+
+    donor_entity = models.ForeignKey(
+        Entity,
+        on_delete=models.CASCADE,
+        related_name='entity_donor_totals',
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'donor_entity'], name='donor_total_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', '-total'], name='donor_total_campaign_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign} {self.donor_entity} {self.total}"
+
+
+class CampaignCategoryTotal(models.Model):
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='campaign_category_totals',
+    )
+
+    category = models.ForeignKey(
+        TransactionCategory,
+        on_delete=models.CASCADE,
+        related_name='category_campaign_totals',
+    )
+
+    raised = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    spent = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    raised_count = models.IntegerField(
+        default=0,
+    )
+
+    spent_count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'category'], name='category_total_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign} {self.category}"
+
+
+class CampaignIndustryTotal(models.Model):
+    # Money a campaign's committee received, by the donors' industry
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='campaign_industry_totals',
+    )
+
+    industry = models.ForeignKey(
+        Industry,
+        on_delete=models.CASCADE,
+        related_name='industry_campaign_totals',
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'industry'], name='industry_total_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', '-total'], name='industry_total_campaign_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign} {self.industry} {self.total}"
+
+
+class IndustryMonthTotal(models.Model):
+    # Contributions by the donors' industry and the first day of the month
+    # they were made in, see analytics.py
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    industry = models.ForeignKey(
+        Industry,
+        on_delete=models.CASCADE,
+        related_name='industry_month_totals',
+    )
+
+    month = models.DateField()
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['industry', 'month'], name='industry_month_total_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.industry} {self.month} {self.total}"
+
+
+class PlaceTotal(models.Model):
+    # Contributions by the donors' home address, see analytics.py
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    state_name = models.CharField(
+        max_length=300,
+        blank=True,
+    )
+
+    county_name = models.CharField(
+        max_length=300,
+        blank=True,
+    )
+
+    zip_code = models.CharField(
+        max_length=300,
+        blank=True,
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0.00,
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state_name', 'county_name', 'zip_code'], name='place_total_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.county_name} {self.zip_code} {self.total}"
+
+
 class AddressCategory(models.Model):
     uuid = models.UUIDField(
         default=uuid.uuid4,
@@ -818,6 +1328,24 @@ class Address(models.Model):
         blank=True,
     )
 
+    # Last change to the row or to the rows shown with it, see conditional.py
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['street_name', 'id'], name='address_street_idx'),
+            models.Index(fields=['city_name', 'id'], name='address_city_idx'),
+            models.Index(fields=['state_name', 'id'], name='address_state_idx'),
+            models.Index(fields=['zip_code', 'id'], name='address_zip_idx'),
+            models.Index(fields=['category', 'street_name', 'id'], name='address_cat_street_idx'),
+            models.Index(fields=['category', 'city_name', 'id'], name='address_cat_city_idx'),
+            models.Index(fields=['category', 'state_name', 'id'], name='address_cat_state_idx'),
+            models.Index(fields=['category', 'zip_code', 'id'], name='address_cat_zip_idx'),
+        ]
+
     def __str__(self):
         return f"{self.building_number} {self.unit_number} {self.city_name} {self.state_name} {self.zip_code}"
 
@@ -863,6 +1391,11 @@ class PhoneNumber(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['area_code', 'id'], name='phone_number_area_code_idx'),
+        ]
+
     def __str__(self):
         return f"{self.area_code} {self.number}"
 
@@ -959,5 +1492,91 @@ class AssumedName(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='assumed_name_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
+
+
+class SearchEntry(models.Model):
+    # One row per searchable object, maintained by signals (see search.py).
+    # The full-text index itself is database specific and lives outside the
+    # model: a generated tsvector column with a GIN index on PostgreSQL and an
+    # FTS5 table kept in sync by triggers on SQLite (migration 0009).
+    KIND_CHOICES = [
+        ('entity', 'Person or Organization'),
+        ('assumedname', 'Assumed Name'),
+        ('address', 'Address'),
+        ('document', 'Document'),
+        ('transaction', 'Transaction'),
+    ]
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+    )
+
+    object_id = models.BigIntegerField()
+
+    object_uuid = models.UUIDField()
+
+    title = models.CharField(
+        max_length=1000,
+    )
+
+    body = models.TextField(
+        blank=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_entry_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.title}"
+
+    def get_absolute_url(self):
+        return reverse(f'campaignfinance:{self.kind}detail', args=(self.object_uuid,))
+
+
+class ImportCheckpoint(models.Model):
+    # Progress of a bulk import file, saved in the same database transaction
+    # as each batch so an interrupted import resumes right after the last
+    # committed row. Files are identified by name and size.
+    source = models.CharField(
+        max_length=20,
+    )
+
+    file_name = models.CharField(
+        max_length=300,
+    )
+
+    file_size = models.BigIntegerField()
+
+    offset = models.BigIntegerField(
+        default=0,
+    )
+
+    rows = models.BigIntegerField(
+        default=0,
+    )
+
+    completed = models.BooleanField(
+        default=False,
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'file_name', 'file_size'], name='import_checkpoint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.file_name}"
@@ -0,0 +1,184 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+from .asyncviews import fetch
+
+# Cache of whole pages served to anonymous readers, and of fragments of
+# pages, with dependency tracking.
+#
+# Every cached page or fragment depends on tags, such as 'entity:12' for the
+# entity a page shows or 'transaction:index' for the transaction list, and is
+# stored along with the version of each tag when it was rendered. Saving or
+# deleting a row gives new versions to its own tag, its model's index tag and
+# the tags of the rows its foreign keys point at (signals.py), which makes
+# every page depending on them stale without having to know which they are.
+# A hit costs two cache reads: the page and the current versions of its tags.
+#
+# Versions are timestamps, so a page whose tags changed while it was being
+# rendered is not stored, it may show what was there before the change.
+#
+# Pages showing a row they do not depend on, like the name of a transaction's
+# payer on the transaction list, show changes to it once they expire.
+
+# Every page depends on this tag; bulk writes that skip signals give it a new
+# version with invalidate_all()
+ALL_PAGES = 'all'
+
+
+def get_tag(obj, pk=None):
+    """The tag of a model instance, or of a model and a primary key."""
+    return f'{obj._meta.model_name}:{obj.pk if pk is None else pk}'
+
+
+def get_index_tag(model):
+    """The tag of the list pages of a model."""
+    return f'{model._meta.model_name}:index'
+
+
+def get_version_key(tag):
+    return f'pagecache:tag:{tag}'
+
+
+def set_versions(tags):
+    version = time.time_ns()
+    cache.set_many({get_version_key(tag): version for tag in tags}, timeout=None)
+
+
+def invalidate(tags):
+    """Makes the pages and fragments depending on any of the tags stale."""
+    tags = set(tags)
+    if not tags:
+        return
+    set_versions(tags)
+    # Again once the change is committed, in case a page was rendered from
+    # the data as it was before the change in between
+    transaction.on_commit(lambda: set_versions(tags))
+
+
+def invalidate_all():
+    invalidate([ALL_PAGES])
+
+
+def get_cached(key):
+    """Returns the value stored under key if none of its tags changed since, or None."""
+    value = None
+    entry = cache.get(key)
+    if entry is not None:
+        versions, stored_value = entry
+        # Tags never changed have no version, and must still have none
+        stored = {tag_key: version for tag_key, version in versions.items() if version is not None}
+        if cache.get_many(list(versions)) == stored:
+            value = stored_value
+    # pagecache:page:... or pagecache:fragment:...
+    metrics.CACHE_LOOKUPS.labels(key.split(':')[1], 'miss' if value is None else 'hit').inc()
+    return value
+
+
+def set_cached(key, tags, value, started, timeout):
+    """
+    Stores value under key along with the versions of its tags, unless one of
+    them changed after `started`, when the value was being computed.
+    """
+    tag_keys = [get_version_key(tag) for tag in {ALL_PAGES, *tags}]
+    current = cache.get_many(tag_keys)
+    if any(version > started for version in current.values()):
+        return
+    cache.set(key, ({tag_key: current.get(tag_key) for tag_key in tag_keys}, value), timeout)
+
+
+def get_timeout(timeout=None):
+    return settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout
+
+
+def get_or_set_fragment(name, tags, compute, timeout=None):
+    """
+    Returns the cached value of a fragment, or computes and caches it. `name`
+    identifies the fragment and what it shows, e.g. f'campaign-donors:{pk}'.
+    """
+    timeout = get_timeout(timeout)
+    if not timeout:
+        return compute()
+    key = f'pagecache:fragment:{name}'
+    value = get_cached(key)
+    if value is None:
+        started = time.time_ns()
+        value = compute()
+        set_cached(key, tags, value, started, timeout)
+    return value
+
+
+def get_page_key(view, request):
+    # Parameters in any order are the same page
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'pagecache:page:{view.__class__.__name__}:{digest}'
+
+
+class PageCacheMixin:
+    """
+    Caches the responses of a view to anonymous GET requests, keyed by the
+    view, the path and the querystring, until one of get_cache_tags() changes.
+
+    Detail views depend on their object and list views on their model's index
+    tag; views showing more than that add the tags of what else they show.
+    """
+    # Seconds, defaults to settings.PAGE_CACHE_TIMEOUT
+    cache_timeout = None
+
+    def get_cache_tags(self):
+        if getattr(self, 'object', None) is not None:
+            return [get_tag(self.object)]
+        return [get_index_tag(self.model)]
+
+    def is_cacheable(self, response):
+        return (
+            self.request.method == 'GET' and response.status_code == 200
+            and not response.streaming and not response.cookies
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
+        timeout = get_timeout(self.cache_timeout)
+        if not timeout or request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = get_page_key(self, request)
+        response = get_cached(key)
+        if response is not None:
+            return response
+
+        started = time.time_ns()
+        response = super().dispatch(request, *args, **kwargs)
+        if self.is_cacheable(response):
+            if hasattr(response, 'render'):
+                response.render()
+            set_cached(key, self.get_cache_tags(), response, started, timeout)
+        return response
+
+    async def adispatch(self, request, *args, **kwargs):
+        # dispatch() for async views. The cache is read from the event loop,
+        # a hit costs two fast cache reads; anything touching the database
+        # goes through fetch()
+        timeout = get_timeout(self.cache_timeout)
+        if not timeout or request.method not in ('GET', 'HEAD') or await fetch(lambda: request.user.is_authenticated):
+            return await super().dispatch(request, *args, **kwargs)
+
+        key = get_page_key(self, request)
+        response = get_cached(key)
+        if response is not None:
+            return response
+
+        started = time.time_ns()
+        response = await super().dispatch(request, *args, **kwargs)
+        if self.is_cacheable(response):
+            if hasattr(response, 'render'):
+                await fetch(response.render)
+            set_cached(key, self.get_cache_tags(), response, started, timeout)
+        return response
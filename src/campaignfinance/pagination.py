@@ -0,0 +1,279 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.http import Http404
+
+
+# Keyset (seek) pagination for the index views. Instead of OFFSET, each page
+# remembers the sort key and pk of its first and last rows and the next query
+# starts right after them, so page N costs the same as page 1.
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values, direction = payload['v'], payload['d']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+
+    return values, direction
+
+
+class SortKey:
+    """
+    One column of the keyset ordering. NULLs always sort as the largest value
+    (PostgreSQL's default) so that a plain btree index can serve both directions.
+    """
+    def __init__(self, attname, descending, nullable):
+        self.attname = attname
+        self.descending = descending
+        self.nullable = nullable
+
+    def order_expression(self, reverse=False):
+        descending = self.descending != reverse
+        if not self.nullable:
+            return f"-{self.attname}" if descending else self.attname
+        if descending:
+            return F(self.attname).desc(nulls_first=True)
+        return F(self.attname).asc(nulls_last=True)
+
+    def seek(self, value, reverse=False):
+        """Returns (rows strictly after value, rows equal to value)."""
+        descending = self.descending != reverse
+
+        if value is None:
+            equal = Q(**{f"{self.attname}__isnull": True})
+            # NULL is the largest value: nothing comes after it going up,
+            # every non-null row comes after it going down.
+            after = Q(**{f"{self.attname}__isnull": False}) if descending else None
+            return after, equal
+
+        equal = Q(**{self.attname: value})
+        if descending:
+            after = Q(**{f"{self.attname}__lt": value})
+        else:
+            after = Q(**{f"{self.attname}__gt": value})
+            if self.nullable:
+                after |= Q(**{f"{self.attname}__isnull": True})
+        return after, equal
+
+    def bound(self, value, reverse=False):
+        """
+        Rows at or after value, which seek() already implies. Databases only
+        start an index range scan from a condition on the column itself, not
+        from an OR of conditions.
+        """
+        descending = self.descending != reverse
+        if value is None:
+            return None if descending else Q(**{f"{self.attname}__isnull": True})
+        if descending:
+            return Q(**{f"{self.attname}__lte": value})
+        bound = Q(**{f"{self.attname}__gte": value})
+        if self.nullable:
+            bound |= Q(**{f"{self.attname}__isnull": True})
+        return bound
+
+
+def get_sort_keys(queryset):
+    """Builds the keyset columns from a queryset's order_by(), always ending in pk."""
+    opts = queryset.model._meta
+    keys = []
+
+    for name in queryset.query.order_by:
+        if not isinstance(name, str):
+            raise ValueError("Keyset pagination only supports ordering by field names")
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = opts.pk.name
+        field = opts.get_field(name)
+        # Ordering by a foreign key orders by the referenced pk, which is the
+        # local *_id column as long as the related model has no Meta.ordering.
+        keys.append(SortKey(field.attname, descending, field.null))
+        if field.primary_key:
+            return keys
+
+    descending = keys[0].descending if keys else False
+    keys.append(SortKey(opts.pk.attname, descending, False))
+    return keys
+
+
+def seek_filter(keys, values, reverse=False):
+    key, value = keys[0], values[0]
+    after, equal = key.seek(value, reverse)
+
+    if len(keys) > 1:
+        rest = seek_filter(keys[1:], values[1:], reverse)
+        tail = equal & rest
+        return tail if after is None else after | tail
+
+    return after if after is not None else Q(pk__in=[])
+
+
+def seek_range(keys, values, reverse=False):
+    """seek_filter() with the bound on the first column that lets an index start at the cursor."""
+    condition = seek_filter(keys, values, reverse)
+    bound = keys[0].bound(values[0], reverse)
+    return condition if bound is None else bound & condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, request, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.request = request
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _querystring(self, cursor):
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return query.urlencode()
+
+    def next_querystring(self):
+        return self._querystring(self.next_cursor)
+
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor)
+
+
+def seek(queryset, keys, values=None, reverse=False):
+    """Orders the queryset by its keyset and starts it after `values` if given."""
+    if values is not None:
+        queryset = queryset.filter(seek_range(keys, values, reverse))
+    return queryset.order_by(*(key.order_expression(reverse) for key in keys))
+
+
+def paginate_keyset(queryset, request, page_size, cursor=None):
+    keys = get_sort_keys(queryset)
+    values = None
+    reverse = False
+
+    if cursor:
+        try:
+            values, direction = decode_cursor(cursor)
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        if len(values) != len(keys):
+            raise Http404("Invalid page cursor.")
+        reverse = direction == 'prev'
+
+    try:
+        page = seek(queryset, keys, values, reverse)[:page_size + 1]
+    except (ValidationError, ValueError, TypeError):
+        # Values of the wrong type, from a tampered cursor or one made for another ordering
+        raise Http404("Invalid page cursor.")
+    rows = list(page)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if reverse:
+        rows.reverse()
+
+    def row_values(row):
+        # Rows are model instances, or dicts from values()
+        if isinstance(row, dict):
+            return [row[key.attname] for key in keys]
+        return [getattr(row, key.attname) for key in keys]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        # Going forward there is always a page behind a cursor, going back
+        # there is always a page ahead of it.
+        if has_more or (reverse and cursor):
+            next_cursor = encode_cursor(row_values(rows[-1]), 'next')
+        if (has_more and reverse) or (cursor and not reverse):
+            previous_cursor = encode_cursor(row_values(rows[0]), 'prev')
+
+    return KeysetPage(rows, request, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Replaces ListView's offset paginator with keyset pagination over the
+    ordering of get_queryset(). Pages are addressed by an opaque ?cursor=.
+    """
+    paginate_by = 50
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        page = paginate_keyset(queryset, self.request, page_size, cursor)
+        return (None, page, page.object_list, page.has_other_pages())
+
+
+class OffsetPage(KeysetPage):
+    """
+    A numbered page for result lists that cannot be keyset paginated, such
+    as ranked search results. Renders with the same pagination template.
+    """
+    def __init__(self, object_list, request, number, has_next):
+        self.object_list = object_list
+        self.request = request
+        self.number = number
+        self.next_cursor = number + 1 if has_next else None
+        self.previous_cursor = number - 1 if number > 1 else None
+
+    def _querystring(self, number):
+        query = self.request.GET.copy()
+        query['page'] = number
+        return query.urlencode()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of big tables. Counting the rows of a
+    whole table scans all of it on PostgreSQL, whose planner statistics give
+    a close enough total at no cost. Filtered lists are still counted.
+    """
+    # Tables estimated smaller than this are counted exactly
+    estimate_above = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+                        [connection.ops.quote_name(queryset.model._meta.db_table)],
+                    )
+                    row = cursor.fetchone()
+                if row is not None and row[0] > self.estimate_above:
+                    return int(row[0])
+        return super().count
@@ -0,0 +1,128 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .categories import get_category_ids
+from .models import Document, ReportedTotals, ReportedSubtotals, TransactionCategory, Transaction, Discrepancy
+from .pagecache import get_tag, invalidate
+
+# Checks that the itemized transactions of each report add up to the totals
+# on its cover sheet (ReportedTotals and ReportedSubtotals), and stores the
+# totals that do not as Discrepancy rows, shown on documentdetail.html.
+#
+# Documents are checked in batches of pks: one query per reported model
+# reads what was reported, and one aggregate query sums the transactions of
+# the whole batch by document and category.
+#
+# Runs are incremental. A document is checked again once its updated_at is
+# newer than its reconciled_at, and saving or bulk inserting its
+# transactions or reported totals touches it (conditional.py).
+
+CENT = Decimal('0.01')
+
+Check = namedtuple('Check', ['name', 'model', 'field', 'category', 'unitemized'])
+
+CHECKS = [
+    # Reported totals include the unitemized amounts, which have no transactions
+    Check('contributions', ReportedTotals, 'contributions', 'contribution', 'unitemized_contributions'),
+    Check('expenditures', ReportedTotals, 'expenditures', 'expenditure', 'unitemized_expenditures'),
+    Check('loans', ReportedSubtotals, 'loans', 'loan', None),
+]
+
+
+def get_pending_documents():
+    return Document.objects.filter(Q(reconciled_at__isnull=True) | Q(reconciled_at__lt=F('updated_at')))
+
+
+def get_itemized(document_ids):
+    """{(document id, category name): (total, count)} of the documents' transactions."""
+    names = {pk: name for name, pk in get_category_ids(TransactionCategory).items()}
+    category_ids = [pk for pk, name in names.items() if name in {check.category for check in CHECKS}]
+    rows = (
+        Transaction.objects.filter(document_id__in=document_ids, category_id__in=category_ids)
+        .values('document_id', 'category_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    # Rounded like the stored amounts, which SQLite sums as floats
+    return {
+        (row['document_id'], names[row['category_id']]): (row['total'].quantize(CENT), row['count'])
+        for row in rows
+    }
+
+
+def get_reported(document_ids):
+    """{reported model: {document id: row}} of the documents' reported totals."""
+    fields = {}
+    for check in CHECKS:
+        fields.setdefault(check.model, set()).update(name for name in (check.field, check.unitemized) if name)
+    return {
+        model: {row['document_id']: row for row in model.objects.filter(document_id__in=document_ids).values('document_id', *names)}
+        for model, names in fields.items()
+    }
+
+
+def find_discrepancies(document_ids, tolerance=Decimal(0)):
+    reported = get_reported(document_ids)
+    # Documents with nothing reported have nothing to check
+    itemized = get_itemized({document_id for rows in reported.values() for document_id in rows})
+    discrepancies = []
+    for model, rows in reported.items():
+        for check in CHECKS:
+            if check.model is not model:
+                continue
+            for document_id, row in rows.items():
+                itemizable = row[check.field] - (row[check.unitemized] if check.unitemized else 0)
+                total, count = itemized.get((document_id, check.category), (Decimal(0), 0))
+                if abs(itemizable - total) > tolerance:
+                    discrepancies.append(Discrepancy(
+                        document_id=document_id,
+                        check_name=check.name,
+                        reported=itemizable,
+                        itemized=total,
+                        itemized_count=count,
+                        difference=itemizable - total,
+                    ))
+    return discrepancies
+
+
+def get_key(discrepancy):
+    return (discrepancy.document_id, discrepancy.check_name, discrepancy.reported, discrepancy.itemized,
+            discrepancy.itemized_count)
+
+
+@transaction.atomic
+def reconcile_batch(document_ids, tolerance=Decimal(0)):
+    """Checks the documents, and returns the ids of those whose discrepancies changed."""
+    started = timezone.now()
+    found = find_discrepancies(document_ids, tolerance)
+    existing = list(Discrepancy.objects.filter(document_id__in=document_ids))
+    changed = {key[0] for key in {get_key(d) for d in found} ^ {get_key(d) for d in existing}}
+
+    if changed:
+        Discrepancy.objects.filter(document_id__in=changed).delete()
+        Discrepancy.objects.bulk_create([d for d in found if d.document_id in changed])
+        # Their pages changed, so they are touched, and reconciled as of then
+        now = timezone.now()
+        Document.objects.filter(pk__in=changed).update(updated_at=now, reconciled_at=now)
+        invalidate(get_tag(Document, pk) for pk in changed)
+    # Changes made since the batch started are checked next time
+    Document.objects.filter(pk__in=document_ids).exclude(pk__in=changed).update(reconciled_at=started)
+    return changed
+
+
+def reconcile_documents(documents=None, batch_size=1000, tolerance=Decimal(0)):
+    """
+    Checks the given documents (by default those changed since they were
+    last checked) `batch_size` at a time. Returns the number of documents
+    checked and of those whose discrepancies changed.
+    """
+    if documents is None:
+        documents = get_pending_documents()
+    pks = list(documents.order_by('pk').values_list('pk', flat=True))
+    changed = 0
+    for start in range(0, len(pks), batch_size):
+        changed += len(reconcile_batch(pks[start:start + batch_size], tolerance))
+    return {'documents': len(pks), 'changed': changed}
@@ -0,0 +1,185 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Entity, AssumedName, Address, Document, Transaction, SearchEntry
+
+# Site-wide full-text search. Every searchable object has one SearchEntry
+# with a title (weighted highest) and a body. Signals keep the entries
+# current; bulk writes must call rebuild_search_index() afterwards.
+
+FTS_TABLE = 'campaignfinance_searchentry_fts'
+MAX_TERMS = 8
+# Only this many matches are ranked, the first ones the full-text index
+# finds, so a broad query like a city name or a single letter costs the same
+# as a narrow one. Its best matches may be beyond them and go unranked, which
+# the pages SearchView shows (max_pages of 25) would not reach either.
+MAX_CANDIDATES = 1000
+
+
+def join_text(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def entity_text(entity):
+    title = join_text(entity.prefix, entity.first_name, entity.middle_name, entity.last_name, entity.suffix)
+    return title, join_text(entity.nickname, entity.occupation)
+
+
+def assumed_name_text(assumed_name):
+    return assumed_name.name, ''
+
+
+def address_text(address):
+    title = join_text(
+        address.building_number,
+        address.street_name,
+        address.unit_number,
+        address.city_name,
+        address.state_name,
+        address.zip_code,
+    )
+    return title, address.county_name
+
+
+def document_text(document):
+    return document.name, join_text(document.filer_entity)
+
+
+def transaction_text(transaction):
+    # Only the free text reason is searchable, names are found through entities
+    return transaction.reason, ''
+
+
+# kind: (model, text function, select_related for rebuilds)
+SEARCH_MODELS = {
+    'entity': (Entity, entity_text, ()),
+    'assumedname': (AssumedName, assumed_name_text, ()),
+    'address': (Address, address_text, ()),
+    'document': (Document, document_text, ('filer_entity',)),
+    'transaction': (Transaction, transaction_text, ()),
+}
+
+SEARCH_KINDS = {model: kind for kind, (model, _, _) in SEARCH_MODELS.items()}
+
+
+def index_object(instance):
+    kind = SEARCH_KINDS[type(instance)]
+    title, body = SEARCH_MODELS[kind][1](instance)
+    if not title:
+        unindex_object(instance)
+        return
+    SearchEntry.objects.update_or_create(
+        kind=kind,
+        object_id=instance.pk,
+        defaults={'object_uuid': instance.uuid, 'title': title[:1000], 'body': body},
+    )
+
+
+def unindex_object(instance):
+    SearchEntry.objects.filter(kind=SEARCH_KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+@transaction.atomic
+def rebuild_search_index(kinds=None, batch_size=2000):
+    """Recreates the search entries of the given kinds (all of them by default)."""
+    counts = {}
+    for kind in kinds or SEARCH_MODELS:
+        model, text, select_related = SEARCH_MODELS[kind]
+        SearchEntry.objects.filter(kind=kind).delete()
+
+        batch = []
+        counts[kind] = 0
+        for instance in model.objects.select_related(*select_related).order_by('pk').iterator(chunk_size=batch_size):
+            title, body = text(instance)
+            if not title:
+                continue
+            batch.append(SearchEntry(kind=kind, object_id=instance.pk, object_uuid=instance.uuid, title=title[:1000], body=body))
+            if len(batch) >= batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                counts[kind] += len(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+        counts[kind] += len(batch)
+    return counts
+
+
+def get_terms(query):
+    # Only word characters reach the database, so user input can never
+    # change the structure of a tsquery or an FTS5 MATCH expression
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+_fts_available = {}
+
+
+def has_sqlite_fts():
+    name = connection.settings_dict['NAME']
+    if name not in _fts_available:
+        _fts_available[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[name]
+
+
+def search_postgresql(terms, kind, limit, offset):
+    # Every term is a prefix match so results show up while a name is half typed
+    tsquery = ' & '.join(f"{term}:*" for term in terms)
+    kind_filter = 'AND kind = %s' if kind else ''
+    params = [tsquery] + ([kind] if kind else []) + [MAX_CANDIDATES, tsquery, limit, offset]
+    return SearchEntry.objects.raw(f"""
+        SELECT id, kind, object_id, object_uuid, title, body
+        FROM (
+            SELECT id, kind, object_id, object_uuid, title, body, search_vector
+            FROM campaignfinance_searchentry
+            WHERE search_vector @@ to_tsquery('simple', %s) {kind_filter}
+            LIMIT %s
+        ) candidate, to_tsquery('simple', %s) query
+        ORDER BY ts_rank_cd(search_vector, query) DESC, id
+        LIMIT %s OFFSET %s
+    """, params)
+
+
+def search_sqlite(terms, kind, limit, offset):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    kind_filter = 'AND entry.kind = %s' if kind else ''
+    params = [match] + ([kind] if kind else []) + [MAX_CANDIDATES, limit, offset]
+    # bm25() is lower for better matches; titles weigh ten times the body.
+    # CROSS JOIN keeps SQLite from starting at the kind index and probing the
+    # full-text table once per row.
+    return SearchEntry.objects.raw(f"""
+        SELECT id, kind, object_id, object_uuid, title, body
+        FROM (
+            SELECT entry.id, entry.kind, entry.object_id, entry.object_uuid, entry.title, entry.body,
+                bm25({FTS_TABLE}, 10.0, 1.0) AS rank
+            FROM {FTS_TABLE}
+            CROSS JOIN campaignfinance_searchentry entry ON entry.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s {kind_filter}
+            LIMIT %s
+        )
+        ORDER BY rank, id
+        LIMIT %s OFFSET %s
+    """, params)
+
+
+def search_fallback(terms, kind, limit, offset):
+    queryset = SearchEntry.objects.all()
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    if kind:
+        queryset = queryset.filter(kind=kind)
+    return queryset.order_by('title', 'id')[offset:offset + limit]
+
+
+def search(query, kind=None, limit=25, offset=0):
+    """Returns up to `limit` SearchEntry rows matching every word of `query`, best first."""
+    terms = get_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'postgresql':
+        results = search_postgresql(terms, kind, limit, offset)
+    elif connection.vendor == 'sqlite' and has_sqlite_fts():
+        results = search_sqlite(terms, kind, limit, offset)
+    else:
+        results = search_fallback(terms, kind, limit, offset)
+    return list(results)
@@ -0,0 +1,397 @@
+from operator import attrgetter
+
+from django.apps import apps
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .analytics import apply_contribution, get_donors, move_donors
+from .categories import CATEGORY_MODELS, reset_categories
+from .conditional import touch
+from .graph import (ENTITY, ADDRESS, CAMPAIGN, MONEY, RELATIONSHIP, RESIDENT, OWNER, CAMPAIGN_ROLES,
+                    get_loaded_graph)
+from .instrumentation import instrument_connection
+from .models import Entity, Relationship, Campaign, Transaction, Address
+from .pagecache import get_tag, get_index_tag, invalidate
+from .search import SEARCH_MODELS, index_object, unindex_object
+from .summaries import get_transaction_state, apply_transaction, rebuild_campaign_summaries
+from .violations import apply_change, check_transaction, get_limit_state, recheck_later
+
+# Signal handlers are skipped while loading fixtures (raw=True): related rows
+# may not exist yet. Run `manage.py rebuild_campaign_summaries`,
+# `manage.py rebuild_analytics`, `manage.py flag_violations` and
+# `manage.py rebuild_search_index` afterwards.
+#
+# The row a save replaces is read once, before the save, by
+# remember_previous_row() (connected below with the page cache handlers),
+# and every post_save handler compares the instance with it.
+
+
+def get_previous(instance, get_value):
+    """get_value() of the row a save replaced, or None if there was none."""
+    previous = getattr(instance, '_previous_row', None)
+    return None if previous is None else get_value(previous)
+
+
+@receiver(post_save, sender=Transaction)
+def update_summaries_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = get_previous(instance, get_transaction_state)
+    current = get_transaction_state(instance)
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            apply_transaction(previous, -1)
+            apply_contribution(previous, -1)
+        apply_transaction(current, 1)
+        apply_contribution(current, 1)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_summaries_on_delete(sender, instance, **kwargs):
+    state = get_transaction_state(instance)
+    apply_transaction(state, -1)
+    apply_contribution(state, -1)
+
+
+@receiver(post_save, sender=Transaction)
+def check_transaction_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        previous, current = get_previous(instance, get_limit_state), get_limit_state(instance)
+        with transaction.atomic():
+            apply_change(previous, current)
+            check_transaction(instance)
+            recheck_later(previous, current)
+
+
+@receiver(post_delete, sender=Transaction)
+def recheck_later_on_delete(sender, instance, **kwargs):
+    state = get_limit_state(instance)
+    with transaction.atomic():
+        apply_change(state, None)
+        recheck_later(state, None)
+
+
+@receiver(post_save, sender=Campaign)
+def rebuild_summary_on_committee_change(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created or instance.committee_entity_id != get_previous(instance, attrgetter('committee_entity_id')):
+        rebuild_campaign_summaries(Campaign.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Entity)
+def remember_committee_campaigns(sender, instance, **kwargs):
+    # Deleting a committee nulls Campaign.committee_entity with an UPDATE that
+    # sends no signals, so its campaigns are found before the delete
+    instance._summary_campaign_ids = list(
+        Campaign.objects.filter(committee_entity=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Entity)
+def rebuild_committee_campaigns(sender, instance, **kwargs):
+    campaign_ids = getattr(instance, '_summary_campaign_ids', None)
+    if campaign_ids:
+        rebuild_campaign_summaries(Campaign.objects.filter(pk__in=campaign_ids))
+
+
+# Analytics rollups (analytics.py) file contributions under the donor's
+# industry and home address, so changes to either move them.
+
+@receiver(post_save, sender=Entity)
+def move_donor_on_industry_change(sender, instance, raw, created, **kwargs):
+    previous = get_previous(instance, attrgetter('industry_id'))
+    if raw or created or previous == instance.industry_id:
+        return
+    # Its home did not change
+    move_donors({instance.pk: (previous, None)}, {instance.pk: (instance.industry_id, None)})
+
+
+@receiver(pre_delete, sender=Entity)
+def remove_donor(sender, instance, **kwargs):
+    # Deleting the donor nulls Transaction.payer_entity with an UPDATE that
+    # sends no signals, so its contributions are removed first
+    move_donors(get_donors([instance.pk]), {})
+
+
+@receiver(pre_save, sender=Address)
+def remember_resident_donors(sender, instance, raw, **kwargs):
+    instance._analytics_donors = {}
+    if not raw and instance.pk is not None:
+        instance._analytics_donors = get_donors(list(instance.residents.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Address)
+def remember_resident_donors_on_delete(sender, instance, **kwargs):
+    instance._analytics_donors = get_donors(list(instance.residents.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def move_resident_donors(sender, instance, raw=False, **kwargs):
+    before = getattr(instance, '_analytics_donors', {})
+    if not raw and before:
+        move_donors(before, get_donors(list(before)))
+
+
+@receiver(m2m_changed, sender=Address.residents.through)
+def move_donors_on_residence_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse: changed from the entity's side
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        if reverse:
+            entity_ids = [instance.pk]
+        elif pk_set is None:
+            entity_ids = list(instance.residents.values_list('pk', flat=True))
+        else:
+            entity_ids = list(pk_set)
+        instance._analytics_donors = get_donors(entity_ids)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        before = getattr(instance, '_analytics_donors', {})
+        move_donors(before, get_donors(list(before)))
+
+
+def reset_category_registry(sender, **kwargs):
+    reset_categories(sender)
+
+
+for model in CATEGORY_MODELS:
+    post_save.connect(reset_category_registry, sender=model, dispatch_uid=f'categories_save_{model.__name__}')
+    post_delete.connect(reset_category_registry, sender=model, dispatch_uid=f'categories_delete_{model.__name__}')
+
+
+def update_search_entry(sender, instance, raw, **kwargs):
+    if not raw:
+        index_object(instance)
+
+
+def delete_search_entry(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+for model, _, _ in SEARCH_MODELS.values():
+    post_save.connect(update_search_entry, sender=model, dispatch_uid=f'search_save_{model.__name__}')
+    post_delete.connect(delete_search_entry, sender=model, dispatch_uid=f'search_delete_{model.__name__}')
+
+
+# The connections graph (graph.py) is only updated if this process has built
+# one, and only once the change is committed.
+
+
+def update_graph(update):
+    def apply():
+        graph = get_loaded_graph()
+        if graph is not None:
+            update(graph)
+
+    if get_loaded_graph() is not None:
+        transaction.on_commit(apply)
+
+
+def add_money(state, sign):
+    if state is None or state.payer_entity_id is None or state.payee_entity_id is None:
+        return
+    update_graph(lambda graph: graph.add_edge(
+        (ENTITY, state.payer_entity_id), (ENTITY, state.payee_entity_id), MONEY, sign * float(state.amount), sign,
+    ))
+
+
+@receiver(post_save, sender=Transaction)
+def update_graph_on_transaction_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = get_previous(instance, get_transaction_state)
+    current = get_transaction_state(instance)
+    if previous != current:
+        add_money(previous, -1)
+        add_money(current, 1)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_graph_on_transaction_delete(sender, instance, **kwargs):
+    add_money(get_transaction_state(instance), -1)
+
+
+def add_relationship(parent_id, child_id, sign):
+    if parent_id is not None and child_id is not None:
+        update_graph(lambda graph: graph.add_edge((ENTITY, parent_id), (ENTITY, child_id), RELATIONSHIP, count=sign))
+
+
+@receiver(post_save, sender=Relationship)
+def update_graph_on_relationship_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = get_previous(instance, attrgetter('parent_entity_id', 'child_entity_id'))
+    current = (instance.parent_entity_id, instance.child_entity_id)
+    if previous != current:
+        if previous is not None:
+            add_relationship(*previous, -1)
+        add_relationship(*current, 1)
+
+
+@receiver(post_delete, sender=Relationship)
+def update_graph_on_relationship_delete(sender, instance, **kwargs):
+    add_relationship(instance.parent_entity_id, instance.child_entity_id, -1)
+
+
+@receiver(post_save, sender=Campaign)
+def update_graph_on_campaign_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = get_previous(instance, attrgetter(*CAMPAIGN_ROLES.values())) or (None,) * len(CAMPAIGN_ROLES)
+    for kind, field, previous_id in zip(CAMPAIGN_ROLES, CAMPAIGN_ROLES.values(), previous):
+        current_id = getattr(instance, field)
+        if previous_id != current_id:
+            for entity_id, sign in ((previous_id, -1), (current_id, 1)):
+                if entity_id is not None:
+                    update_graph(lambda graph, entity_id=entity_id, sign=sign, kind=kind: graph.add_edge(
+                        (ENTITY, entity_id), (CAMPAIGN, instance.pk), kind, count=sign,
+                    ))
+
+
+def remove_graph_node(kind):
+    def handler(sender, instance, **kwargs):
+        pk = instance.pk
+        update_graph(lambda graph: graph.remove_node(kind, pk))
+    return handler
+
+
+for model, kind in ((Entity, ENTITY), (Address, ADDRESS), (Campaign, CAMPAIGN)):
+    post_delete.connect(remove_graph_node(kind), sender=model, weak=False, dispatch_uid=f'graph_delete_{model.__name__}')
+
+
+def get_address_links(through, instance, reverse, pk_set=None):
+    field, other = ('entity_id', 'address_id') if reverse else ('address_id', 'entity_id')
+    links = through.objects.filter(**{field: instance.pk})
+    if pk_set is not None:
+        links = links.filter(**{f'{other}__in': pk_set})
+    return set(links.values_list(other, flat=True))
+
+
+def update_graph_on_address_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if get_loaded_graph() is None:
+        return
+    # Removing ids that were never linked sends them too, so the links that
+    # really go away are looked up before they do
+    if action == 'pre_remove':
+        instance._graph_unlinked = get_address_links(sender, instance, reverse, pk_set)
+    elif action == 'pre_clear':
+        instance._graph_unlinked = get_address_links(sender, instance, reverse)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        # post_add only sends the ids that were not linked yet
+        sign, pks = (1, pk_set) if action == 'post_add' else (-1, getattr(instance, '_graph_unlinked', ()))
+        kind = RESIDENT if sender is Address.residents.through else OWNER
+        for pk in pks:
+            entity_id, address_id = (instance.pk, pk) if reverse else (pk, instance.pk)
+            update_graph(lambda graph, entity_id=entity_id, address_id=address_id: graph.add_edge(
+                (ENTITY, entity_id), (ADDRESS, address_id), kind, count=sign,
+            ))
+
+
+for through in (Address.residents.through, Address.owners.through):
+    m2m_changed.connect(update_graph_on_address_change, sender=through, dispatch_uid=f'graph_{through.__name__}')
+
+
+# Cached pages (pagecache.py) and conditional GETs (conditional.py) depending
+# on a changed row: its own, its model's list pages, and those of the rows its
+# foreign keys point at, both before and after the change. The rows pointed at
+# with an updated_at column are touched.
+
+# Summaries, rollups, discrepancies and violations are derived from
+# transactions, and rebuilt thousands of rows at a time: the pages showing
+# them depend on the transactions, and rebuild_batch() and reconcile_batch()
+# touch the campaigns and documents once
+PAGE_CACHE_EXCLUDED = {
+    'searchentry', 'importcheckpoint', 'campaignsummary', 'campaigndonortotal', 'campaigncategorytotal',
+    'campaignindustrytotal', 'industrymonthtotal', 'placetotal', 'discrepancy', 'violation', 'donorelectiontotal',
+}
+
+
+def get_related_rows(instance, *values):
+    """{model: pks} of the rows pointed at by any of values, dicts of attname: value."""
+    rows = {}
+    for field in instance._meta.concrete_fields:
+        if field.is_relation:
+            for value in values:
+                if value.get(field.attname) is not None:
+                    rows.setdefault(field.related_model, set()).add(value[field.attname])
+    return rows
+
+
+def get_relation_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields if field.is_relation}
+
+
+def related_changed(instance, model, related):
+    invalidate({
+        get_tag(instance), get_index_tag(model),
+        *(get_tag(related_model, pk) for related_model, pks in related.items() for pk in pks),
+    })
+    for related_model, pks in related.items():
+        touch(related_model, pks)
+
+
+def remember_previous_row(sender, instance, raw, **kwargs):
+    instance._previous_row = None
+    if not raw and instance.pk is not None:
+        instance._previous_row = sender._base_manager.filter(pk=instance.pk).first()
+
+
+def related_changed_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = get_previous(instance, get_relation_values) or {}
+    related_changed(instance, sender, get_related_rows(instance, previous, get_relation_values(instance)))
+
+
+def related_changed_on_delete(sender, instance, **kwargs):
+    related_changed(instance, sender, get_related_rows(instance, get_relation_values(instance)))
+
+
+def related_changed_on_m2m_change(sender, instance, action, model, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The rows unlinked are not sent, so they are looked up first
+        links = {field.related_model: field.attname for field in sender._meta.concrete_fields if field.is_relation}
+        instance._unlinked = set(
+            sender.objects.filter(**{links[type(instance)]: instance.pk}).values_list(links[model], flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        pks = pk_set if action != 'post_clear' else getattr(instance, '_unlinked', ())
+        # The instance itself is not saved
+        touch(type(instance), [instance.pk])
+        related_changed(instance, type(instance), {model: set(pks)})
+
+
+for model in apps.get_app_config('campaignfinance').get_models():
+    if model._meta.model_name in PAGE_CACHE_EXCLUDED:
+        continue
+    uid = model.__name__
+    pre_save.connect(remember_previous_row, sender=model, dispatch_uid=f'previous_row_{uid}')
+    post_save.connect(related_changed_on_save, sender=model, dispatch_uid=f'pagecache_save_{uid}')
+    post_delete.connect(related_changed_on_delete, sender=model, dispatch_uid=f'pagecache_delete_{uid}')
+    for field in model._meta.local_many_to_many:
+        through = field.remote_field.through
+        m2m_changed.connect(related_changed_on_m2m_change, sender=through, dispatch_uid=f'pagecache_{through.__name__}')
+
+
+# Under ASGI the sync code of every request runs in a thread of its own, which
+# ends with the request: its connections could never be reused, so they are
+# closed instead of waiting for garbage collection. The connection pool's
+# threads (asyncviews.py) keep theirs. The container serves WSGI, where
+# request threads and their connections persist.
+
+@receiver(request_finished, sender=ASGIHandler)
+def close_request_connections(sender, **kwargs):
+    connections.close_all()
+
+
+# Queries are timed for the request they run in (instrumentation.py), on
+# whichever thread's connection they run
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
@@ -0,0 +1,53 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static files as collectstatic writes them outside DEBUG: named after a hash
+# of their content (style.css as style.1a2b3c4d5e6f.css), so nginx can tell
+# browsers to keep them forever, with compressed copies next to them that
+# nginx serves as they are (gzip_static) instead of compressing every
+# response. Brotli copies are written too when the brotli package is
+# installed, for servers that have brotli_static.
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.map', '.xml', '.ico')
+
+# Files smaller than a packet gain nothing from being compressed
+MIN_SIZE = 1024
+
+
+def get_compressed(content):
+    """{extension: compressed content} of the compressed copies worth keeping."""
+    copies = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies['.br'] = brotli.compress(content)
+    return {extension: data for extension, data in copies.items() if len(data) < len(content) * 0.9}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if isinstance(hashed_name, str):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in sorted(hashed_names):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSED_EXTENSIONS):
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < MIN_SIZE:
+            return
+        for extension, data in get_compressed(content).items():
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(data))
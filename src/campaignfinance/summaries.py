@@ -0,0 +1,226 @@
+from collections import defaultdict, namedtuple
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .conditional import touch
+from .models import (Entity, Campaign, CampaignSummary, CampaignDonorTotal, CampaignCategoryTotal,
+                     CampaignIndustryTotal, Transaction)
+
+# Precomputed money totals for the campaign pages. A transaction belongs to
+# every campaign whose committee is its payee (money raised) or its payer
+# (money spent), the same rows campaigndetail.html used to list in full.
+# Money raised is also totalled by donor and by the donors' industry.
+#
+# The summaries are kept current one transaction at a time by the signal
+# handlers in signals.py. bulk_create() and QuerySet.update() skip those
+# signals, so anything that writes transactions in bulk must call
+# rebuild_campaign_summaries() (or the management command) afterwards.
+
+
+TransactionState = namedtuple(
+    'TransactionState', ['payer_entity_id', 'payee_entity_id', 'category_id', 'amount', 'recorded_date'],
+)
+
+
+def get_transaction_state(instance):
+    # Amounts and dates set in code may still be floats or strings until the
+    # row is reloaded
+    recorded_date = instance.recorded_date
+    if isinstance(recorded_date, str):
+        recorded_date = date.fromisoformat(recorded_date)
+    return TransactionState(
+        instance.payer_entity_id,
+        instance.payee_entity_id,
+        instance.category_id,
+        Decimal(str(instance.amount or 0)),
+        recorded_date,
+    )
+
+
+def add_to_row(model, lookup, deltas):
+    """Adds deltas to the row matching lookup, creating the row if there is none."""
+    updated = model.objects.filter(**lookup).update(**{name: F(name) + delta for name, delta in deltas.items()})
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**lookup).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def apply_transaction(state, sign):
+    """Adds (sign=1) or removes (sign=-1) one transaction from the campaign summaries."""
+    committees = {state.payer_entity_id, state.payee_entity_id} - {None}
+    if not committees:
+        return
+
+    amount = state.amount * sign
+    campaigns = Campaign.objects.filter(committee_entity_id__in=committees).values_list('pk', 'committee_entity_id')
+    # The donor's industry, looked up once if needed
+    industry_id = unknown = object()
+
+    for campaign_id, committee_id in campaigns:
+        if committee_id == state.payee_entity_id:
+            add_to_row(CampaignSummary, {'campaign_id': campaign_id}, {
+                'total_raised': amount,
+                'contribution_count': sign,
+            })
+            if state.payer_entity_id is not None:
+                lookup = {'campaign_id': campaign_id, 'donor_entity_id': state.payer_entity_id}
+                add_to_row(CampaignDonorTotal, lookup, {'total': amount, 'count': sign})
+                if sign < 0:
+                    CampaignDonorTotal.objects.filter(**lookup, count__lte=0).delete()
+                if industry_id is unknown:
+                    industry_id = Entity.objects.filter(pk=state.payer_entity_id).values_list('industry_id', flat=True).first()
+                if industry_id is not None:
+                    add_industry_total(campaign_id, industry_id, amount, sign)
+            if state.category_id is not None:
+                lookup = {'campaign_id': campaign_id, 'category_id': state.category_id}
+                add_to_row(CampaignCategoryTotal, lookup, {'raised': amount, 'raised_count': sign})
+
+        if committee_id == state.payer_entity_id:
+            add_to_row(CampaignSummary, {'campaign_id': campaign_id}, {
+                'total_spent': amount,
+                'expenditure_count': sign,
+            })
+            if state.category_id is not None:
+                lookup = {'campaign_id': campaign_id, 'category_id': state.category_id}
+                add_to_row(CampaignCategoryTotal, lookup, {'spent': amount, 'spent_count': sign})
+
+        if sign < 0 and state.category_id is not None:
+            CampaignCategoryTotal.objects.filter(
+                campaign_id=campaign_id,
+                category_id=state.category_id,
+                raised_count__lte=0,
+                spent_count__lte=0,
+            ).delete()
+
+
+def add_industry_total(campaign_id, industry_id, amount, count):
+    lookup = {'campaign_id': campaign_id, 'industry_id': industry_id}
+    add_to_row(CampaignIndustryTotal, lookup, {'total': amount, 'count': count})
+    if count < 0:
+        CampaignIndustryTotal.objects.filter(**lookup, count__lte=0).delete()
+
+
+def move_donor_industry(entity_id, old_industry_id, new_industry_id):
+    """Moves what a donor gave between industries, when its industry changes or it is deleted (None)."""
+    for campaign_id, total, count in CampaignDonorTotal.objects.filter(donor_entity_id=entity_id).values_list(
+        'campaign_id', 'total', 'count',
+    ):
+        if old_industry_id is not None:
+            add_industry_total(campaign_id, old_industry_id, -total, -count)
+        if new_industry_id is not None:
+            add_industry_total(campaign_id, new_industry_id, total, count)
+
+
+def rebuild_batch(campaigns, batch_size):
+    campaign_ids = [pk for pk, _ in campaigns]
+    by_committee = defaultdict(list)
+    for pk, committee_id in campaigns:
+        if committee_id is not None:
+            by_committee[committee_id].append(pk)
+
+    CampaignSummary.objects.filter(campaign_id__in=campaign_ids).delete()
+    CampaignDonorTotal.objects.filter(campaign_id__in=campaign_ids).delete()
+    CampaignCategoryTotal.objects.filter(campaign_id__in=campaign_ids).delete()
+    CampaignIndustryTotal.objects.filter(campaign_id__in=campaign_ids).delete()
+    touch(Campaign, campaign_ids)
+
+    summaries = {
+        pk: CampaignSummary(campaign_id=pk, total_raised=Decimal(0), total_spent=Decimal(0))
+        for pk in campaign_ids
+    }
+    category_totals = {}
+
+    def category_total(campaign_id, category_id):
+        key = (campaign_id, category_id)
+        if key not in category_totals:
+            category_totals[key] = CampaignCategoryTotal(campaign_id=campaign_id, category_id=category_id)
+        return category_totals[key]
+
+    raised = (
+        Transaction.objects.filter(payee_entity_id__in=by_committee)
+        .values('payee_entity_id', 'category_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    for row in raised:
+        for campaign_id in by_committee[row['payee_entity_id']]:
+            summaries[campaign_id].total_raised += row['total']
+            summaries[campaign_id].contribution_count += row['count']
+            if row['category_id'] is not None:
+                total = category_total(campaign_id, row['category_id'])
+                total.raised, total.raised_count = row['total'], row['count']
+
+    spent = (
+        Transaction.objects.filter(payer_entity_id__in=by_committee)
+        .values('payer_entity_id', 'category_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    for row in spent:
+        for campaign_id in by_committee[row['payer_entity_id']]:
+            summaries[campaign_id].total_spent += row['total']
+            summaries[campaign_id].expenditure_count += row['count']
+            if row['category_id'] is not None:
+                total = category_total(campaign_id, row['category_id'])
+                total.spent, total.spent_count = row['total'], row['count']
+
+    CampaignSummary.objects.bulk_create(summaries.values(), batch_size=batch_size)
+    CampaignCategoryTotal.objects.bulk_create(category_totals.values(), batch_size=batch_size)
+
+    donors = (
+        Transaction.objects.filter(payee_entity_id__in=by_committee, payer_entity__isnull=False)
+        .values('payee_entity_id', 'payer_entity_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+        .iterator()
+    )
+    batch = []
+    for row in donors:
+        for campaign_id in by_committee[row['payee_entity_id']]:
+            batch.append(CampaignDonorTotal(
+                campaign_id=campaign_id,
+                donor_entity_id=row['payer_entity_id'],
+                total=row['total'],
+                count=row['count'],
+            ))
+        if len(batch) >= batch_size:
+            CampaignDonorTotal.objects.bulk_create(batch)
+            batch = []
+    CampaignDonorTotal.objects.bulk_create(batch)
+
+    # Summed up from the donor totals just written, which are far fewer rows
+    # than the transactions
+    industries = (
+        CampaignDonorTotal.objects.filter(campaign_id__in=campaign_ids, donor_entity__industry__isnull=False)
+        .values('campaign_id', 'donor_entity__industry_id')
+        .annotate(industry_total=Sum('total'), industry_count=Sum('count'))
+    )
+    CampaignIndustryTotal.objects.bulk_create([
+        CampaignIndustryTotal(
+            campaign_id=row['campaign_id'],
+            industry_id=row['donor_entity__industry_id'],
+            total=row['industry_total'],
+            count=row['industry_count'],
+        ) for row in industries
+    ], batch_size=batch_size)
+
+
+@transaction.atomic
+def rebuild_campaign_summaries(campaigns=None, batch_size=500):
+    """
+    Recomputes the summaries of the given campaigns (all of them by default)
+    from the transactions table, `batch_size` campaigns at a time.
+    """
+    if campaigns is None:
+        campaigns = Campaign.objects.all()
+    rows = list(campaigns.order_by('pk').values_list('pk', 'committee_entity_id'))
+
+    for start in range(0, len(rows), batch_size):
+        rebuild_batch(rows[start:start + batch_size], batch_size)
+
+    return len(rows)
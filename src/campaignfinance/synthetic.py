@@ -0,0 +1,289 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import (EntityCategory, Entity, ExternalId, IndustrySector, Industry, RelationshipCategory,
+                    Relationship, Office, FormerOfficeHolder, CampaignCategory, Campaign, ElectionCategory,
+                    Election, DocumentCategory, Document, ReportedTotals, ReportedSubtotals,
+                    TransactionCategory, Transaction, AddressCategory, Address, PhoneNumber, Email,
+                    Website, AssumedName)
+from .analytics import rebuild_analytics
+from .pagecache import invalidate_all
+from .reconciliation import CENT, reconcile_documents
+from .search import rebuild_search_index
+from .summaries import rebuild_campaign_summaries
+from .violations import flag_violations
+
+# Synthetic data for benchmarking. Everything is created with bulk_create in
+# batches so a million rows can be seeded in a few minutes, and all randomness
+# comes from one seeded generator so runs are repeatable.
+#
+# Every kind of row a page shows is seeded, so the benchmark has an object
+# for every detail view. Every tenth report gets a small file, written to the
+# default storage (MEDIA_ROOT).
+
+LAST_NAMES = ['smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis',
+              'rodriguez', 'martinez', 'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson',
+              'thomas', 'taylor', 'moore', 'jackson', 'martin', 'lee', 'perez', 'thompson']
+FIRST_NAMES = ['james', 'mary', 'robert', 'patricia', 'john', 'jennifer', 'michael', 'linda',
+               'david', 'elizabeth', 'william', 'barbara', 'richard', 'susan', 'joseph', 'jessica']
+STREET_NAMES = ['main street', 'oak avenue', 'pecan street', 'beauregard avenue', 'sherwood way',
+                'knickerbocker road', 'chadbourne street', 'college hills boulevard']
+REASONS = ['yard signs', 'radio advertising', 'campaign mailers', 'event catering', 'office rent',
+           'consulting fees', 'printing', 'filing fee', 'website hosting', 'block walking supplies']
+SECTORS = {
+    'agribusiness': ['crop production', 'livestock', 'agricultural services'],
+    'energy': ['oil and gas', 'electric utilities', 'wind and solar'],
+    'finance': ['commercial banks', 'insurance', 'real estate'],
+    'health': ['hospitals', 'physicians', 'pharmaceuticals'],
+    'construction': ['home builders', 'general contractors', 'engineering'],
+    'lawyers and lobbyists': ['attorneys', 'lobbyists'],
+}
+CITIES = [('san angelo', 'tom green', '769'), ('abilene', 'taylor', '796'),
+          ('lubbock', 'lubbock', '794'), ('midland', 'midland', '797'), ('austin', 'travis', '787')]
+AREA_CODES = ['325', '432', '512', '806']
+
+DOCUMENT_FILE = b'%PDF-1.4\n% synthetic report\n%%EOF\n'
+
+START_DATE = date(2015, 1, 1)
+DAYS = 365 * 8
+
+
+def get_category(model, name):
+    return model.objects.get_or_create(name=name)[0]
+
+
+def skewed_index(rng, size, skew=3):
+    # Power law picks: with skew=3 the first 1% of rows get about a fifth of
+    # the picks, like big donors and busy committees do in real filings
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+def bulk_create(model, objs, batch_size):
+    created = []
+    for start in range(0, len(objs), batch_size):
+        created.extend(model.objects.bulk_create(objs[start:start + batch_size]))
+    return created
+
+
+@transaction.atomic
+def seed(transactions=10000, entities=None, batch_size=5000, random_seed=0, skew=3, stdout=None):
+    """
+    Seeds roughly `entities` donors, one committee with a campaign and an
+    office per 100 entities, their reports with what those reported, and
+    `transactions` contributions and expenditures between them.
+    Higher `skew` concentrates the transactions on fewer donors and
+    committees, with the busiest ones created first.
+    """
+    rng = random.Random(random_seed)
+    entities = entities or max(transactions // 10, 10)
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    individual = get_category(EntityCategory, 'individual')
+    committee = get_category(EntityCategory, 'committee')
+    government = get_category(EntityCategory, 'government')
+    family = get_category(RelationshipCategory, 'family')
+    building = get_category(AddressCategory, 'building')
+    candidate = get_category(CampaignCategory, 'candidate')
+    general = get_category(ElectionCategory, 'general')
+    report = get_category(DocumentCategory, 'campaign finance report')
+    contribution = get_category(TransactionCategory, 'contribution')
+    expenditure = get_category(TransactionCategory, 'expenditure')
+
+    industries = []
+    for sector_name, industry_names in SECTORS.items():
+        sector = get_category(IndustrySector, sector_name)
+        industries.extend(Industry.objects.get_or_create(name=name, defaults={'sector': sector})[0] for name in industry_names)
+
+    # Most individual donors give no employer or industry
+    donors = bulk_create(Entity, [
+        Entity(
+            category=individual,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            occupation='synthetic',
+            industry=rng.choice(industries) if rng.random() < 0.4 else None,
+        ) for _ in range(entities)
+    ], batch_size)
+    log(f"Created {len(donors)} donors")
+
+    addresses = []
+    for _ in range(max(entities // 2, 1)):
+        city, county, zip_prefix = rng.choice(CITIES)
+        addresses.append(Address(
+            category=building,
+            building_number=str(rng.randint(1, 9999)),
+            street_name=rng.choice(STREET_NAMES),
+            city_name=city,
+            state_name='texas',
+            county_name=county,
+            zip_code=f"{zip_prefix}{rng.randint(0, 99):02d}",
+        ))
+    addresses = bulk_create(Address, addresses, batch_size)
+    Residence = Address.residents.through
+    bulk_create(Residence, [
+        Residence(address_id=addresses[i % len(addresses)].pk, entity_id=donor.pk)
+        for i, donor in enumerate(donors)
+    ], batch_size)
+    log(f"Created {len(addresses)} addresses")
+
+    # Contact details for every fifth donor
+    contacts = donors[::5]
+    phone_numbers = bulk_create(PhoneNumber, [
+        PhoneNumber(area_code=rng.choice(AREA_CODES), number=f"{rng.randint(0, 9999999):07d}", owner=donor)
+        for donor in contacts
+    ], batch_size)
+    emails = bulk_create(Email, [
+        Email(address=f"{donor.first_name}.{donor.last_name}.{donor.pk}@example.com", owner=donor)
+        for donor in contacts
+    ], batch_size)
+    for model, rows in ((PhoneNumber, phone_numbers), (Email, emails)):
+        Through = model.associated_entities.through
+        bulk_create(Through, [
+            Through(**{f'{model._meta.model_name}_id': row.pk, 'entity_id': row.owner_id}) for row in rows
+        ], batch_size)
+    relationships = bulk_create(Relationship, [
+        Relationship(category=family, parent_entity=donor, child_entity=rng.choice(donors))
+        for donor in donors[::10]
+    ], batch_size)
+    log(f"Created {len(phone_numbers)} phone numbers, {len(emails)} emails and {len(relationships)} relationships")
+
+    committees = bulk_create(Entity, [
+        Entity(category=committee, last_name=f"committee {i}") for i in range(max(entities // 100, 1))
+    ], batch_size)
+    state = Entity.objects.get_or_create(category=government, last_name='state of texas')[0]
+    # Filer ids, as the importers store them (importing.py)
+    bulk_create(ExternalId, [
+        ExternalId(parent_entity=state, child_entity=committee_entity, number=f"{i:08d}")
+        for i, committee_entity in enumerate(committees)
+    ], batch_size)
+    websites = bulk_create(Website, [
+        Website(address=f"https://committee{i}.example.com", owner=committee_entity)
+        for i, committee_entity in enumerate(committees)
+    ], batch_size)
+    assumed_names = bulk_create(AssumedName, [
+        AssumedName(name=f"friends of committee {i}") for i in range(len(committees))
+    ], batch_size)
+    for model, rows in ((Website, websites), (AssumedName, assumed_names)):
+        Through = model.associated_entities.through
+        bulk_create(Through, [
+            Through(**{f'{model._meta.model_name}_id': row.pk, 'entity_id': committee_entity.pk})
+            for row, committee_entity in zip(rows, committees)
+        ], batch_size)
+
+    elections = bulk_create(Election, [
+        Election(category=general, government_entity=state, date=START_DATE + timedelta(days=365 * year + 310))
+        for year in range(DAYS // 365)
+    ], batch_size)
+    # An office per campaign, held by someone who once lost it
+    offices = bulk_create(Office, [
+        Office(government_entity=state, name=f"district {i} representative", holder_entity=rng.choice(donors))
+        for i in range(len(committees))
+    ], batch_size)
+    bulk_create(FormerOfficeHolder, [
+        FormerOfficeHolder(office=office, entity=rng.choice(donors)) for office in offices
+    ], batch_size)
+    campaigns = bulk_create(Campaign, [
+        Campaign(
+            category=candidate,
+            name=f"campaign {i}",
+            registration_date=START_DATE + timedelta(days=rng.randrange(DAYS)),
+            election=rng.choice(elections),
+            committee_entity=committee_entity,
+            candidate_entity=rng.choice(donors),
+            office_sought=offices[i],
+        ) for i, committee_entity in enumerate(committees)
+    ], batch_size)
+    documents = bulk_create(Document, [
+        Document(
+            category=report,
+            name=f"report {i}",
+            filer_entity=committees[i % len(committees)],
+            date_filed=START_DATE + timedelta(days=rng.randrange(DAYS)),
+            coverage_start_date=START_DATE,
+            coverage_end_date=START_DATE + timedelta(days=DAYS),
+            uploaded_file=(
+                default_storage.save(f"synthetic/report {i}.pdf", ContentFile(DOCUMENT_FILE)) if i % 10 == 0 else ''
+            ),
+        ) for i in range(len(committees) * 4)
+    ], batch_size)
+    log(f"Created {len(committees)} committees, {len(campaigns)} campaigns and {len(documents)} documents")
+
+    created = 0
+    while created < transactions:
+        batch = []
+        for _ in range(min(batch_size, transactions - created)):
+            index = skewed_index(rng, len(committees), skew)
+            campaign = campaigns[index]
+            # Roughly one in five rows is the committee spending money
+            if rng.random() < 0.2:
+                category, payer, payee = expenditure, committees[index], rng.choice(donors)
+                reason = rng.choice(REASONS)
+            else:
+                category, payer, payee = contribution, donors[skewed_index(rng, len(donors), skew)], committees[index]
+                reason = ''
+            batch.append(Transaction(
+                category=category,
+                campaign=campaign,
+                payer_entity=payer,
+                payee_entity=payee,
+                amount=Decimal(rng.randint(100, 500000)) / 100,
+                recorded_date=START_DATE + timedelta(days=rng.randrange(DAYS)),
+                reason=reason,
+                document=documents[index + len(committees) * rng.randrange(4)],
+            ))
+        Transaction.objects.bulk_create(batch)
+        created += len(batch)
+        log(f"Created {created} transactions")
+
+    # What the reports say they add up to, a few of them wrongly
+    itemized = {
+        (row['document_id'], row['category_id']): row['total'].quantize(CENT)
+        for row in Transaction.objects.filter(document__in=documents)
+        .values('document_id', 'category_id').annotate(total=Sum('amount'))
+    }
+    totals, subtotals = [], []
+    for document in documents:
+        unitemized = Decimal(rng.randint(0, 100000)) / 100
+        contributions = itemized.get((document.pk, contribution.pk), 0) + unitemized
+        if rng.random() < 0.05:
+            contributions += Decimal(rng.randint(100, 100000)) / 100
+        totals.append(ReportedTotals(
+            document=document,
+            unitemized_contributions=unitemized,
+            contributions=contributions,
+            expenditures=itemized.get((document.pk, expenditure.pk), 0),
+        ))
+        subtotals.append(ReportedSubtotals(document=document, monetary_political_contributions=contributions))
+    bulk_create(ReportedTotals, totals, batch_size)
+    bulk_create(ReportedSubtotals, subtotals, batch_size)
+
+    # bulk_create skips the signals that keep the summaries current
+    rebuild_campaign_summaries(Campaign.objects.filter(pk__in=[campaign.pk for campaign in campaigns]))
+    log(f"Rebuilt {len(campaigns)} campaign summaries")
+    rebuild_analytics()
+    log("Rebuilt the analytics rollups")
+    flag_violations()
+    log("Flagged the violations")
+    reconcile_documents()
+    log("Reconciled the documents")
+    rebuild_search_index()
+    log("Rebuilt the search index")
+    invalidate_all()
+
+    return {
+        'entities': len(donors) + len(committees),
+        'addresses': len(addresses),
+        'campaigns': len(campaigns),
+        'offices': len(offices),
+        'documents': len(documents),
+        'transactions': created,
+    }
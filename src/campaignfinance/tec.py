@@ -0,0 +1,220 @@
+import csv
+import re
+from datetime import date
+from functools import lru_cache
+from decimal import Decimal, InvalidOperation
+
+from .importing import (normalize, Resolver, BulkImporter, OffsetLineReader, read_header, insert_rows,
+                        get_checkpoint, Throughput)
+from .models import Campaign, TransactionCategory, Transaction
+
+# Texas Ethics Commission bulk export (TEC_CF_CSV.zip). The contribs_*.csv
+# and expend_*.csv files share one layout apart from the column prefixes
+# below; the file type is detected from its header.
+
+RECORD_TYPES = {
+    'contribution': {
+        'id': 'contributionInfoId',
+        'date': 'contributionDt',
+        'amount': 'contributionAmount',
+        'reason': 'contributionDescr',
+        'party': 'contributor',
+        'filer_is_payer': False,
+    },
+    'expenditure': {
+        'id': 'expendInfoId',
+        'date': 'expendDt',
+        'amount': 'expendAmount',
+        'reason': 'expendDescr',
+        'party': 'payee',
+        'filer_is_payer': True,
+    },
+}
+
+CANDIDATE_FILER_TYPES = {'COH', 'JCOH'}
+PAC_FILER_TYPES = {'GPAC', 'SPAC', 'MPAC'}
+
+
+class InvalidFile(Exception):
+    pass
+
+
+def get_record_type(header):
+    for record_type, spec in RECORD_TYPES.items():
+        if spec['id'] in header:
+            return record_type
+    raise InvalidFile("Not a TEC contribution or expenditure file")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    # A report repeats the same few dates, and strptime is slow
+    try:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8])) if len(value) == 8 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_amount(value):
+    try:
+        return Decimal(value.strip() or 0)
+    except (AttributeError, InvalidOperation):
+        return Decimal(0)
+
+
+def address_key(row, prefix):
+    key = (
+        normalize(row.get(f'{prefix}StreetAddr1')),
+        normalize(row.get(f'{prefix}StreetCity')),
+        normalize(row.get(f'{prefix}StreetStateCd')),
+        re.sub(r'\D', '', row.get(f'{prefix}StreetPostalCode') or '')[:5],
+    )
+    return key if any(key) else None
+
+
+def party_key(row, prefix):
+    """(is individual, last name, first name, zip) identifies a contributor or payee."""
+    is_individual = row.get(f'{prefix}PersentTypeCd') == 'INDIVIDUAL'
+    if is_individual:
+        last_name = normalize(row.get(f'{prefix}NameLast'))
+        first_name = normalize(row.get(f'{prefix}NameFirst'))
+    else:
+        last_name = normalize(row.get(f'{prefix}NameOrganization'))
+        first_name = ''
+    if not last_name:
+        return None
+    zip_code = re.sub(r'\D', '', row.get(f'{prefix}StreetPostalCode') or '')[:5]
+    return (is_individual, last_name, first_name, zip_code)
+
+
+class TecImporter(BulkImporter):
+    source = 'tec'
+    agency_name = 'texas ethics commission'
+    document_prefix = 'tec report'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.transaction_categories = {
+            record_type: TransactionCategory.objects.get_or_create(name=record_type)[0]
+            for record_type in RECORD_TYPES
+        }
+        self.campaigns = Resolver(self.lookup_campaigns, self.create_campaigns, self.addresses.cache_size)
+        # Set per file by import_file()
+        self.spec = self.category = None
+
+    # Campaigns: one per filing committee
+
+    def lookup_campaigns(self, keys):
+        found = {}
+        for committee_id, pk in Campaign.objects.filter(committee_entity_id__in=keys).order_by('pk').values_list('committee_entity_id', 'pk'):
+            found.setdefault(committee_id, pk)
+        return found
+
+    def create_campaigns(self, new):
+        objs = [
+            Campaign(
+                category=self.candidate if data['type'] in CANDIDATE_FILER_TYPES else None,
+                name=data['name'][:300],
+                registration_date=data['date'],
+                committee_entity_id=committee_id,
+            ) for committee_id, data in new.items()
+        ]
+        Campaign.objects.bulk_create(objs)
+        return {committee_id: obj.pk for committee_id, obj in zip(new, objs)}
+
+    def process_batch(self, rows):
+        spec, category = self.spec, self.category
+        party = spec['party']
+        filers, addresses, parties = {}, {}, {}
+        for row in rows:
+            row['_date'] = parse_date(row.get(spec['date'])) or parse_date(row.get('receivedDt'))
+            filer_type = row.get('filerTypeCd')
+            filers[row['filerIdent']] = {
+                'name': normalize(row.get('filerName')),
+                'type': filer_type,
+                'category_id': self.pac.pk if filer_type in PAC_FILER_TYPES else self.committee.pk,
+            }
+            row['_address'] = address_key(row, party)
+            if row['_address']:
+                addresses[row['_address']] = None
+            row['_party'] = party_key(row, party)
+            if row['_party']:
+                parties.setdefault(row['_party'], {
+                    'occupation': normalize(row.get(f'{party}Occupation')),
+                    'address': row['_address'],
+                })
+
+        self.batch_addresses = self.addresses.resolve(addresses)
+        party_ids = self.parties.resolve(parties)
+        filer_ids = self.filers.resolve(filers)
+
+        campaigns, documents = {}, {}
+        for row in rows:
+            filer_id = filer_ids[row['filerIdent']]
+            campaign = campaigns.setdefault(filer_id, {**filers[row['filerIdent']], 'date': row['_date']})
+            campaign['date'] = min(campaign['date'], row['_date'])
+            documents.setdefault(row['reportInfoIdent'], {
+                'filer': filer_id,
+                'date': parse_date(row.get('receivedDt')) or row['_date'],
+            })
+        campaign_ids = self.campaigns.resolve(campaigns)
+        document_ids = self.documents.resolve(documents)
+
+        transactions = []
+        for row in rows:
+            filer_id = filer_ids[row['filerIdent']]
+            party_id = party_ids.get(row['_party'])
+            payer_id, payee_id = (filer_id, party_id) if spec['filer_is_payer'] else (party_id, filer_id)
+            transactions.append({
+                'category_id': category.pk,
+                'campaign_id': campaign_ids[filer_id],
+                'payer_entity_id': payer_id,
+                'payee_entity_id': payee_id,
+                'amount': parse_amount(row.get(spec['amount'])),
+                'recorded_date': row['_date'],
+                'reason': normalize(row.get(spec['reason']))[:1000],
+                'document_id': document_ids[row['reportInfoIdent']],
+                'notes': f"TEC {spec['id']} {row.get(spec['id'], '')}",
+            })
+        insert_rows(Transaction, transactions, self.use_copy)
+
+    def import_file(self, path, encoding='utf-8', restart=False):
+        """Imports one contribs or expend CSV file. Returns the number of rows imported this run."""
+        checkpoint = get_checkpoint(self.source, path, restart)
+        if checkpoint.completed:
+            self.stdout.write(f"{path.name}: already imported ({checkpoint.rows} rows)")
+            return 0
+
+        throughput = Throughput(self.stdout)
+        with open(path, 'rb') as file:
+            header_line, header = read_header(file, encoding)
+            fieldnames = next(csv.reader([header]))
+            record_type = get_record_type(fieldnames)
+            self.spec = spec = RECORD_TYPES[record_type]
+            self.category = self.transaction_categories[record_type]
+
+            lines = OffsetLineReader(file, encoding, checkpoint.offset or len(header_line))
+            if checkpoint.offset:
+                self.stdout.write(f"{path.name}: resuming after row {checkpoint.rows}")
+            reader = csv.DictReader(lines, fieldnames=fieldnames)
+
+            batch = []
+            for row in reader:
+                if self.is_importable(row, spec):
+                    batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.commit_batch(batch, checkpoint, lines.offset)
+                    throughput.add(len(batch), path.name)
+                    batch = []
+
+            self.commit_batch(batch, checkpoint, lines.offset, completed=True)
+            throughput.add(len(batch), path.name)
+
+        throughput.report(path.name)
+        return throughput.rows
+
+    def is_importable(self, row, spec):
+        # Rows flagged info only are not reportable activity
+        if row.get('infoOnlyFlag') == 'Y' or not row.get('filerIdent') or not row.get('reportInfoIdent'):
+            return False
+        return bool(parse_date(row.get(spec['date'])) or parse_date(row.get('receivedDt')))
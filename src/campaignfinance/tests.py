@@ -1,10 +1,27 @@
-from datetime import datetime
-
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.db import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
 from django.urls import reverse
+from django.templatetags.static import static
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from prometheus_client import REGISTRY
 
 # Models from campaign finance
 from .models import (EntityCategory, Entity, ExternalId, IndustrySector, Industry,
@@ -13,11 +30,28 @@ from .models import (EntityCategory, Entity, ExternalId, IndustrySector, Industr
                     DocumentCategory, Document, ReportedTotals,
                     ReportedSubtotals, TransactionCategory, Transaction,
                     AddressCategory, Address, PhoneNumber, Email, Website,
-                    AssumedName)
+                    AssumedName, CampaignSummary, CampaignDonorTotal, CampaignCategoryTotal,
+                    CampaignIndustryTotal, IndustryMonthTotal, PlaceTotal, Discrepancy, Violation, DonorElectionTotal,
+                    SearchEntry, ImportCheckpoint)
+from . import (analytics, api, asyncviews, benchmark, categories, exports, fec, fecfiles, graph, importing, instrumentation,
+               linkage, pagecache, pagination, reconciliation, search, synthetic, tec, views, violations)
+from .summaries import rebuild_campaign_summaries
 
 # Add easy urls like /spending and /giving that go to transaction
 # fields with relevant arguments to only show relavent transactions
 
+# Views are tested against what they render, PageCacheTests turns the page
+# cache back on
+page_cache_off = override_settings(PAGE_CACHE_TIMEOUT=0)
+
+
+def setUpModule():
+    page_cache_off.enable()
+
+
+def tearDownModule():
+    page_cache_off.disable()
+
 
 # Testing Industry & Sectors
 class IndustryModelTests(TestCase):
@@ -2141,3 +2175,2165 @@ class WebsiteDetailViewTests(TestCase):
         self.assertTemplateUsed(response, 'campaignfinance/websitedetail.html')
         self.assertContains(response, 'https://example.com')
         self.assertContains(response, 'entity1')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        entity_category = EntityCategory.objects.create(name='individual')
+        transaction_category = TransactionCategory.objects.create(name='contribution')
+        cls.entities = [
+            Entity.objects.create(category=entity_category, last_name=f'entity{i}') for i in range(3)
+        ]
+        amounts = [5, 1, 5, 3, 5, 2, 4]
+        for i, amount in enumerate(amounts):
+            Transaction.objects.create(
+                category=transaction_category,
+                # Leave a couple of payers empty so NULL sort keys are paged too
+                payer_entity=cls.entities[i % 3] if i % 4 else None,
+                payee_entity=cls.entities[(i + 1) % 3],
+                recorded_date=f'2023-01-0{(i % 3) + 1}',
+                amount=amount,
+            )
+
+    def walk_pages(self, params):
+        seen = []
+        pages = []
+        response = self.client.get(reverse('campaignfinance:transactionindex'), params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            page = list(response.context['transaction_list'])
+            pages.append(page)
+            seen.extend(page)
+            page_obj = response.context['page_obj']
+            if not page_obj.has_next():
+                break
+            response = self.client.get(reverse('campaignfinance:transactionindex') + '?' + page_obj.next_querystring())
+
+        # Walk back from the last page and make sure every page comes back unchanged
+        for expected in reversed(pages[:-1]):
+            page_obj = response.context['page_obj']
+            self.assertTrue(page_obj.has_previous())
+            response = self.client.get(reverse('campaignfinance:transactionindex') + '?' + page_obj.previous_querystring())
+            self.assertEqual(list(response.context['transaction_list']), expected)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+        return seen
+
+    def test_every_sort_option_pages_through_all_rows(self):
+        with mock.patch.object(views.TransactionIndexView, 'paginate_by', 2):
+            for sortby in views.TransactionIndexView.sort_by_fields:
+                seen = self.walk_pages({'sortby': sortby})
+                self.assertEqual(len(seen), Transaction.objects.count(), sortby)
+                self.assertEqual(len({transaction.pk for transaction in seen}), len(seen), sortby)
+
+    def test_pages_keep_sort_order(self):
+        with mock.patch.object(views.TransactionIndexView, 'paginate_by', 3):
+            seen = self.walk_pages({'sortby': 'amount'})
+        self.assertEqual(
+            [(transaction.amount, transaction.pk) for transaction in seen],
+            sorted((transaction.amount, transaction.pk) for transaction in Transaction.objects.all())
+        )
+
+    def test_next_link_keeps_filters(self):
+        with mock.patch.object(views.TransactionIndexView, 'paginate_by', 2):
+            response = self.client.get(reverse('campaignfinance:transactionindex'), {'sortby': 'amount'})
+        self.assertContains(response, 'rel="next"')
+        self.assertIn('sortby=amount', response.context['page_obj'].next_querystring())
+
+    def test_invalid_cursor_404(self):
+        response = self.client.get(reverse('campaignfinance:transactionindex'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_wrong_types_404(self):
+        url = reverse('campaignfinance:transactionindex')
+        for values in (['notadate', 1], ['2020-01-01', 'x'], [{'a': 1}, 1]):
+            with self.subTest(values):
+                cursor = pagination.encode_cursor(values, 'next')
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+        cursor = pagination.encode_cursor([{'a': 1}], 'next')
+        response = self.client.get(reverse('campaignfinance:apilist', args=['transaction']), {'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+
+
+class IndexViewQueryCountTests(TestCase):
+    """
+    Every index view should issue the same number of queries no matter how
+    many rows it renders. Each factory creates one more fully linked row.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.entity_category = EntityCategory.objects.create(name='individual')
+        cls.sector = IndustrySector.objects.create(name='sector1')
+
+    def make_entity(self, n):
+        industry = Industry.objects.create(name=f'industry{n}', sector=self.sector)
+        return Entity.objects.create(category=self.entity_category, industry=industry, last_name=f'entity{n}')
+
+    def make_document(self, n):
+        category, _ = DocumentCategory.objects.get_or_create(name='report')
+        return Document.objects.create(
+            category=category,
+            filer_entity=self.make_entity(n),
+            name=f'document{n}',
+            date_filed='2023-01-01',
+            coverage_start_date='2023-01-01',
+            coverage_end_date='2023-01-01',
+        )
+
+    def make_office(self, n):
+        return Office.objects.create(
+            name=f'office{n}',
+            government_entity=self.make_entity(f'g{n}'),
+            holder_entity=self.make_entity(f'h{n}'),
+        )
+
+    def factories(self):
+        return {
+            'entityindex': self.make_entity,
+            'industryindex': lambda n: Industry.objects.create(name=f'industry{n}', sector=self.sector),
+            'externalidindex': lambda n: ExternalId.objects.create(
+                parent_entity=self.make_entity(f'p{n}'),
+                child_entity=self.make_entity(f'c{n}'),
+                number=str(n),
+            ),
+            'relationshipindex': lambda n: Relationship.objects.create(
+                category=RelationshipCategory.objects.get_or_create(name='family')[0],
+                parent_entity=self.make_entity(f'p{n}'),
+                child_entity=self.make_entity(f'c{n}'),
+            ),
+            'campaignindex': lambda n: Campaign.objects.create(
+                category=CampaignCategory.objects.get_or_create(name='candidate')[0],
+                name=f'campaign{n}',
+                registration_date='2023-01-01',
+                office_sought=self.make_office(n),
+            ),
+            'officeindex': self.make_office,
+            'formerofficeholderindex': lambda n: FormerOfficeHolder.objects.create(
+                office=self.make_office(n),
+                entity=self.make_entity(f'f{n}'),
+            ),
+            'electionindex': lambda n: Election.objects.create(
+                category=ElectionCategory.objects.get_or_create(name='general')[0],
+                government_entity=self.make_entity(n),
+                date='2023-01-01',
+            ),
+            'documentindex': self.make_document,
+            'reportedtotalsindex': lambda n: ReportedTotals.objects.create(document=self.make_document(n)),
+            'reportedsubtotalsindex': lambda n: ReportedSubtotals.objects.create(document=self.make_document(n)),
+            'transactionindex': lambda n: Transaction.objects.create(
+                category=TransactionCategory.objects.get_or_create(name='contribution')[0],
+                payer_entity=self.make_entity(f'p{n}'),
+                payee_entity=self.make_entity(f'r{n}'),
+                recorded_date='2023-01-01',
+                amount=1,
+            ),
+            'addressindex': lambda n: Address.objects.create(
+                category=AddressCategory.objects.get_or_create(name='building')[0],
+                street_name=f'street{n}',
+                zip_code='76901',
+            ),
+            'phonenumberindex': lambda n: PhoneNumber.objects.create(area_code='325', number='5550000', owner=self.make_entity(n)),
+            'emailindex': lambda n: Email.objects.create(address=f'{n}@example.com', owner=self.make_entity(n)),
+        }
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for url_name, factory in self.factories().items():
+            with self.subTest(url_name):
+                url = reverse(f'campaignfinance:{url_name}')
+                factory(f'{url_name}0')
+                baseline = self.count_queries(url)
+                for n in range(1, 6):
+                    factory(f'{url_name}{n}')
+                self.assertEqual(self.count_queries(url), baseline)
+
+
+class ExplainIndexViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        individual = EntityCategory.objects.create(name='individual')
+        Entity.objects.bulk_create([Entity(category=individual, last_name=f'entity{n}') for n in range(60)])
+
+    def test_skips_missing_categories(self):
+        stdout = mock.MagicMock()
+        call_command('explain_index_views', stdout=stdout)
+        output = ''.join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertIn('EntityIndexView sortby=last name category=person:', output)
+        # No other entity category exists here
+        self.assertNotIn('category=company', output)
+        self.assertIn('queries scan and sort a whole table', output)
+
+    def test_pages_after_a_cursor_seek(self):
+        stdout = mock.MagicMock()
+        call_command('explain_index_views', stdout=stdout)
+        output = ''.join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertRegex(output, r'EntityIndexView sortby=last name category=select after cursor: \S*index')
+
+    def test_bound_starts_the_index_scan(self):
+        queryset = Entity.objects.order_by('last_name')
+        keys = pagination.get_sort_keys(queryset)
+        plan = pagination.seek(queryset, keys, ['entity5', 1])[:51].explain()
+        self.assertNotRegex(plan, r'SCAN campaignfinance_entity\b')
+
+
+class EntityDetailQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.family = RelationshipCategory.objects.create(name='family')
+        cls.building = AddressCategory.objects.create(name='building')
+        cls.entity = Entity.objects.create(category=cls.individual, last_name='entity1')
+
+    def add_related_rows(self, n):
+        other = Entity.objects.create(category=self.individual, last_name=f'other{n}')
+        Transaction.objects.create(category=self.contribution, payer_entity=self.entity, payee_entity=other, recorded_date='2023-01-01', amount=1)
+        Transaction.objects.create(category=self.contribution, payer_entity=other, payee_entity=self.entity, recorded_date='2023-01-01', amount=1)
+        office = Office.objects.create(name=f'office{n}', government_entity=other, holder_entity=self.entity)
+        Campaign.objects.create(name=f'campaign{n}', registration_date='2023-01-01', candidate_entity=self.entity, office_sought=office)
+        FormerOfficeHolder.objects.create(office=office, entity=self.entity)
+        Relationship.objects.create(category=self.family, parent_entity=self.entity, child_entity=other)
+        Relationship.objects.create(category=self.family, parent_entity=other, child_entity=self.entity)
+        Address.objects.create(category=self.building, zip_code='76901').residents.add(self.entity)
+        Address.objects.create(category=self.building, zip_code='76902').owners.add(self.entity)
+        Email.objects.create(address=f'{n}@example.com', owner=self.entity)
+        PhoneNumber.objects.create(area_code='325', number='5550000', owner=self.entity)
+        Website.objects.create(address=f'https://{n}.example.com', owner=self.entity)
+        ExternalId.objects.create(parent_entity=other, child_entity=self.entity, number=str(n))
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('campaignfinance:entitydetail', args=(self.entity.uuid,)))
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_does_not_grow_with_related_rows(self):
+        self.add_related_rows(0)
+        baseline = self.count_queries()
+        for n in range(1, 6):
+            self.add_related_rows(n)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_transactions_are_capped_with_see_all_link(self):
+        other = Entity.objects.create(category=self.individual, last_name='other')
+        for _ in range(views.EntityDetailView.transaction_limit + 1):
+            Transaction.objects.create(category=self.contribution, payer_entity=self.entity, payee_entity=other, recorded_date='2023-01-01', amount=1)
+        response = self.client.get(reverse('campaignfinance:entitydetail', args=(self.entity.uuid,)))
+        self.assertEqual(len(response.context['payer_transactions']), views.EntityDetailView.transaction_limit)
+        self.assertTrue(response.context['payer_transactions_truncated'])
+        self.assertFalse(response.context['payee_transactions_truncated'])
+        self.assertContains(response, f"?payer={self.entity.uuid}&sortby=select")
+
+    def test_see_all_link_filters_transactions(self):
+        other = Entity.objects.create(category=self.individual, last_name='other')
+        paid = Transaction.objects.create(category=self.contribution, payer_entity=self.entity, payee_entity=other, recorded_date='2023-01-01', amount=1)
+        Transaction.objects.create(category=self.contribution, payer_entity=other, payee_entity=self.entity, recorded_date='2023-01-01', amount=1)
+        response = self.client.get(reverse('campaignfinance:transactionindex'), {'payer': self.entity.uuid})
+        self.assertQuerysetEqual(response.context['transaction_list'], [paid])
+
+
+class CampaignSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.expenditure = TransactionCategory.objects.create(name='expenditure')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.donor1 = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.donor2 = Entity.objects.create(category=cls.individual, last_name='donor2')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+
+    def give(self, donor, amount):
+        return Transaction.objects.create(category=self.contribution, payer_entity=donor, payee_entity=self.committee, recorded_date='2023-01-01', amount=amount)
+
+    def spend(self, amount):
+        return Transaction.objects.create(category=self.expenditure, payer_entity=self.committee, payee_entity=self.donor2, recorded_date='2023-01-01', amount=amount)
+
+    def snapshot(self):
+        summary = CampaignSummary.objects.get(campaign=self.campaign)
+        return (
+            (summary.total_raised, summary.total_spent, summary.contribution_count, summary.expenditure_count),
+            sorted(CampaignDonorTotal.objects.filter(campaign=self.campaign).values_list('donor_entity__last_name', 'total', 'count')),
+            sorted(CampaignCategoryTotal.objects.filter(campaign=self.campaign).values_list('category__name', 'raised', 'spent', 'raised_count', 'spent_count')),
+        )
+
+    def test_saves_update_totals(self):
+        self.give(self.donor1, 10)
+        self.give(self.donor1, '2.50')
+        self.give(self.donor2, 5)
+        self.spend(7.25)
+        totals, donors, categories = self.snapshot()
+        self.assertEqual(totals, (Decimal('17.50'), Decimal('7.25'), 3, 1))
+        self.assertEqual(donors, [('donor1', Decimal('12.50'), 2), ('donor2', Decimal('5.00'), 1)])
+        self.assertEqual(categories, [
+            ('contribution', Decimal('17.50'), Decimal('0.00'), 3, 0),
+            ('expenditure', Decimal('0.00'), Decimal('7.25'), 0, 1),
+        ])
+
+    def test_edits_and_deletes_are_reversed(self):
+        gift = self.give(self.donor1, 10)
+        self.give(self.donor2, 5)
+        gift.payer_entity = self.donor2
+        gift.amount = 20
+        gift.save()
+        totals, donors, _ = self.snapshot()
+        self.assertEqual(totals, (Decimal('25.00'), Decimal('0.00'), 2, 0))
+        self.assertEqual(donors, [('donor2', Decimal('25.00'), 2)])
+
+        gift.payee_entity = self.donor1
+        gift.save()
+        gift.delete()
+        self.give(self.donor1, 1).delete()
+        totals, donors, categories = self.snapshot()
+        self.assertEqual(totals, (Decimal('5.00'), Decimal('0.00'), 1, 0))
+        self.assertEqual(donors, [('donor2', Decimal('5.00'), 1)])
+        self.assertEqual(categories, [('contribution', Decimal('5.00'), Decimal('0.00'), 1, 0)])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.give(self.donor1, 10)
+        self.give(self.donor2, 3.75).delete()
+        self.give(self.donor2, 5)
+        self.spend(7.25)
+        Transaction.objects.create(payer_entity=None, payee_entity=self.committee, recorded_date='2023-01-01', amount=1)
+        incremental = self.snapshot()
+        rebuild_campaign_summaries()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_edit_reads_the_previous_row_once(self):
+        gift = self.give(self.donor1, 10)
+        gift.amount = 20
+        with CaptureQueriesContext(connection) as context:
+            gift.save()
+        queries = [query['sql'] for query in context.captured_queries]
+        update = next(n for n, sql in enumerate(queries) if sql.startswith(f'UPDATE "{Transaction._meta.db_table}"'))
+        self.assertEqual(update, 1)
+        totals, donors, _ = self.snapshot()
+        self.assertEqual(totals, (Decimal('20.00'), Decimal('0.00'), 1, 0))
+
+    def test_committee_change_rebuilds_summary(self):
+        self.give(self.donor1, 10)
+        self.campaign.committee_entity = self.donor1
+        self.campaign.save()
+        totals, donors, _ = self.snapshot()
+        self.assertEqual(totals, (Decimal('0.00'), Decimal('10.00'), 0, 1))
+        self.assertEqual(donors, [])
+
+    def test_campaign_page_query_count_is_constant(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('campaignfinance:campaigndetail', args=(self.campaign.uuid,)))
+            self.assertEqual(response.status_code, 200)
+            return len(context)
+
+        self.give(self.donor1, 10)
+        baseline = count_queries()
+        for n in range(views.CampaignDetailView.transaction_limit + 1):
+            donor = Entity.objects.create(category=self.individual, last_name=f'donor{n + 3}')
+            self.give(donor, n + 1)
+            self.spend(1)
+        self.assertEqual(count_queries(), baseline)
+
+        response = self.client.get(reverse('campaignfinance:campaigndetail', args=(self.campaign.uuid,)))
+        self.assertEqual(len(response.context['top_donors']), views.CampaignDetailView.donor_limit)
+        self.assertEqual(response.context['top_donors'][0].donor_entity.last_name, 'donor28')
+        self.assertTrue(response.context['contributions_truncated'])
+        self.assertContains(response, f"?payee={self.committee.uuid}&sortby=select")
+        self.assertContains(response, f"?payer={self.committee.uuid}&sortby=select")
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.entity = Entity.objects.create(category=cls.individual, first_name='Jane', last_name='Garza', occupation='rancher')
+        cls.rancher = Entity.objects.create(category=cls.individual, first_name='Bob', last_name='Rancher')
+        cls.address = Address.objects.create(building_number='12', street_name='Chadbourne Street', city_name='San Angelo', zip_code='76903')
+        cls.assumed_name = AssumedName.objects.create(name='Garza Ranch Supply')
+        cls.transaction = Transaction.objects.create(payer_entity=cls.entity, recorded_date='2023-01-01', reason='Yard signs for Garza')
+
+    def get_results(self, query, **params):
+        response = self.client.get(reverse('campaignfinance:search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(result.kind, result.object_uuid) for result in response.context['result_list']]
+
+    def test_finds_every_searchable_kind(self):
+        results = self.get_results('garza')
+        self.assertCountEqual(results, [
+            ('entity', self.entity.uuid),
+            ('assumedname', self.assumed_name.uuid),
+            ('transaction', self.transaction.uuid),
+        ])
+        self.assertEqual(self.get_results('chadbourne angelo'), [('address', self.address.uuid)])
+
+    def test_prefix_terms_and_kind_filter(self):
+        self.assertEqual(self.get_results('gar ranch', kind='assumedname'), [('assumedname', self.assumed_name.uuid)])
+        self.assertEqual(self.get_results('nothing matches this'), [])
+        self.assertEqual(self.get_results('"yard"); signs* --'), [('transaction', self.transaction.uuid)])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.get_results('rancher', kind='entity'), [
+            ('entity', self.rancher.uuid),
+            ('entity', self.entity.uuid),
+        ])
+
+    def test_ranked_before_the_page_is_cut(self):
+        Entity.objects.bulk_create([
+            Entity(category=self.individual, last_name=f'Body{n}', occupation='rancher') for n in range(30)
+        ])
+        search.rebuild_search_index(['entity'])
+        results = self.get_results('rancher', kind='entity')
+        self.assertEqual(len(results), 25)
+        self.assertEqual(results[0], ('entity', self.rancher.uuid))
+
+    def test_broad_queries_rank_a_bounded_set(self):
+        Entity.objects.bulk_create([
+            Entity(category=self.individual, last_name=f'Rancher{n}') for n in range(30)
+        ])
+        search.rebuild_search_index(['entity'])
+        with mock.patch.object(search, 'MAX_CANDIDATES', 10):
+            self.assertEqual(len(search.search('rancher', limit=25)), 10)
+            self.assertEqual(search.search('rancher', offset=10), [])
+
+    def test_entries_follow_saves_and_deletes(self):
+        self.entity.last_name = 'Villarreal'
+        self.entity.save()
+        self.assertEqual(self.get_results('villarreal'), [('entity', self.entity.uuid)])
+        self.assertNotIn(('entity', self.entity.uuid), self.get_results('garza'))
+
+        self.transaction.reason = ''
+        self.transaction.save()
+        self.assumed_name.delete()
+        self.assertEqual(self.get_results('garza'), [])
+
+    def test_rebuild_matches_signals(self):
+        entries = sorted(SearchEntry.objects.values_list('kind', 'object_id', 'title', 'body'))
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.get_results('garza'), [])
+        search.rebuild_search_index()
+        self.assertEqual(sorted(SearchEntry.objects.values_list('kind', 'object_id', 'title', 'body')), entries)
+        self.assertEqual(len(self.get_results('garza')), 3)
+
+    def test_fallback_without_full_text_index(self):
+        with mock.patch.object(search, 'has_sqlite_fts', return_value=False):
+            self.assertEqual(self.get_results('chadbourne angelo'), [('address', self.address.uuid)])
+
+    def test_pagination(self):
+        for n in range(3):
+            Entity.objects.create(category=self.individual, last_name=f'Garza{n}')
+        with mock.patch.object(views.SearchView, 'paginate_by', 2):
+            response = self.client.get(reverse('campaignfinance:search'), {'q': 'garza', 'kind': 'entity'})
+            self.assertEqual(len(response.context['result_list']), 2)
+            self.assertContains(response, 'page=2')
+            response = self.client.get(reverse('campaignfinance:search'), {'q': 'garza', 'kind': 'entity', 'page': 2})
+            self.assertEqual(len(response.context['result_list']), 2)
+            self.assertTrue(response.context['page_obj'].has_previous())
+            self.assertFalse(response.context['page_obj'].has_next())
+        response = self.client.get(reverse('campaignfinance:search'), {'q': 'garza', 'page': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+
+TEC_CONTRIBUTION_COLUMNS = [
+    'recordType', 'formTypeCd', 'reportInfoIdent', 'receivedDt', 'infoOnlyFlag', 'filerIdent',
+    'filerTypeCd', 'filerName', 'contributionInfoId', 'contributionDt', 'contributionAmount',
+    'contributionDescr', 'contributorPersentTypeCd', 'contributorNameOrganization', 'contributorNameLast',
+    'contributorNameFirst', 'contributorStreetAddr1', 'contributorStreetCity', 'contributorStreetStateCd',
+    'contributorStreetPostalCode', 'contributorOccupation',
+]
+
+
+class TecImportTests(TestCase):
+    def write_file(self, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'contribs_01.csv'
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=TEC_CONTRIBUTION_COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+        return path
+
+    def contribution(self, n, **fields):
+        row = {
+            'recordType': 'RCPT',
+            'reportInfoIdent': '100',
+            'receivedDt': '20230115',
+            'infoOnlyFlag': 'N',
+            'filerIdent': '00012345',
+            'filerTypeCd': 'COH',
+            'filerName': 'Friends of Jane Garza',
+            'contributionInfoId': str(n),
+            'contributionDt': '20230110',
+            'contributionAmount': '25.00',
+            'contributionDescr': '',
+            'contributorPersentTypeCd': 'INDIVIDUAL',
+            'contributorNameLast': 'SMITH',
+            'contributorNameFirst': 'JOHN',
+            'contributorStreetAddr1': '12 Main St',
+            'contributorStreetCity': 'San Angelo',
+            'contributorStreetStateCd': 'TX',
+            'contributorStreetPostalCode': '76901-1234',
+            'contributorOccupation': 'Rancher',
+        }
+        row.update(fields)
+        return row
+
+    def import_file(self, path, *args):
+        call_command('import_tec', str(path), '--batch-size', '2', *args, stdout=mock.MagicMock())
+
+    def test_import_counts_rows(self):
+        before = REGISTRY.get_sample_value('powertracker_import_rows_total', {'source': 'tec'}) or 0
+        self.import_file(self.write_file([self.contribution(n) for n in range(3)]))
+        self.assertEqual(REGISTRY.get_sample_value('powertracker_import_rows_total', {'source': 'tec'}), before + 3)
+
+    def test_import_leaves_coverage_unknown(self):
+        self.import_file(self.write_file([self.contribution(1)]))
+        document = Document.objects.get(name='tec report 100')
+        self.assertEqual(document.date_filed, date(2023, 1, 15))
+        self.assertIsNone(document.coverage_start_date)
+        self.assertFalse(Violation.objects.filter(category__name='outside_coverage').exists())
+
+    def test_import_resolves_and_deduplicates(self):
+        path = self.write_file([
+            self.contribution(1),
+            self.contribution(2, contributionAmount='75.50', contributorNameLast='Smith '),
+            self.contribution(3, contributorPersentTypeCd='ENTITY', contributorNameOrganization='Acme Feed Co'),
+            self.contribution(4, reportInfoIdent='101', contributionDescr='In-kind   catering'),
+            self.contribution(5, infoOnlyFlag='Y'),
+        ])
+        self.import_file(path)
+
+        self.assertEqual(Transaction.objects.count(), 4)
+        smith = Entity.objects.get(last_name='smith', first_name='john')
+        self.assertEqual(smith.occupation, 'rancher')
+        self.assertEqual(list(smith.entity_residences.values_list('street_name', 'zip_code')), [('main st', '76901')])
+        self.assertEqual(smith.entity_payer_transactions.count(), 3)
+
+        filer = ExternalId.objects.get(number='00012345').child_entity
+        campaign = Campaign.objects.get(committee_entity=filer)
+        self.assertEqual(campaign.category.name, 'candidate')
+        self.assertEqual(Document.objects.filter(filer_entity=filer).count(), 2)
+        self.assertTrue(Transaction.objects.filter(reason='in-kind catering', document__name='tec report 101').exists())
+
+        self.assertEqual(campaign.campaign_summary.total_raised, Decimal('150.50'))
+        self.assertEqual(campaign.campaign_donor_totals.get(donor_entity=smith).count, 3)
+        self.assertEqual(SearchEntry.objects.filter(kind='entity', object_id=smith.pk).count(), 1)
+
+    def test_rerun_does_not_duplicate(self):
+        path = self.write_file([self.contribution(n) for n in range(5)])
+        self.import_file(path)
+        self.import_file(path)
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assertEqual(Entity.objects.filter(last_name='smith').count(), 1)
+        self.import_file(path, '--restart')
+        self.assertEqual(Transaction.objects.count(), 10)
+        self.assertEqual(Entity.objects.filter(last_name='smith').count(), 1)
+
+    def test_resumes_after_crash(self):
+        path = self.write_file([self.contribution(n, contributionAmount=str(n)) for n in range(1, 8)])
+        original = tec.TecImporter.process_batch
+        calls = []
+
+        def crash_on_third_batch(importer, *args):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError('crash')
+            return original(importer, *args)
+
+        with mock.patch.object(tec.TecImporter, 'process_batch', crash_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_file(path)
+
+        checkpoint = ImportCheckpoint.objects.get(file_name='contribs_01.csv')
+        self.assertEqual((checkpoint.rows, checkpoint.completed), (4, False))
+        self.assertEqual(Transaction.objects.count(), 4)
+
+        self.import_file(path)
+        self.assertEqual(sorted(Transaction.objects.values_list('amount', flat=True)), [Decimal(n) for n in range(1, 8)])
+        self.assertTrue(ImportCheckpoint.objects.get(file_name='contribs_01.csv').completed)
+
+
+class FecImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_file(self, name, rows):
+        path = self.directory / name
+        with open(path, 'w', encoding='latin-1', newline='') as file:
+            for row in rows:
+                file.write('|'.join(row) + '\n')
+        return path
+
+    def contribution(self, n, **fields):
+        row = dict.fromkeys(fecfiles.CONTRIBUTION_COLUMNS, '')
+        row.update({
+            'CMTE_ID': 'C00000001',
+            'IMAGE_NUM': '202301159000000001',
+            'ENTITY_TP': 'IND',
+            'NAME': 'SMITH, JOHN A',
+            'CITY': 'SAN ANGELO',
+            'STATE': 'TX',
+            'ZIP_CODE': '769011234',
+            'OCCUPATION': 'RANCHER',
+            'TRANSACTION_DT': '01102023',
+            'TRANSACTION_AMT': '25',
+            'FILE_NUM': '1600001',
+            'SUB_ID': str(n),
+        })
+        row.update(fields)
+        return [row[column] for column in fecfiles.CONTRIBUTION_COLUMNS]
+
+    def write_masters(self):
+        candidate = dict.fromkeys(fecfiles.CANDIDATE_COLUMNS, '')
+        candidate.update({'CAND_ID': 'H4TX00001', 'CAND_NAME': 'GARZA, JANE', 'CAND_ELECTION_YR': '2024'})
+        committees = []
+        for committee_id, name, committee_type, candidate_id in [
+            ('C00000001', 'GARZA FOR CONGRESS', 'H', 'H4TX00001'),
+            ('C00000002', 'FEED DEALERS PAC', 'Q', ''),
+        ]:
+            committee = dict.fromkeys(fecfiles.COMMITTEE_COLUMNS, '')
+            committee.update({'CMTE_ID': committee_id, 'CMTE_NM': name, 'CMTE_TP': committee_type, 'CAND_ID': candidate_id})
+            committees.append([committee[column] for column in fecfiles.COMMITTEE_COLUMNS])
+        return (
+            self.write_file('cn.txt', [[candidate[column] for column in fecfiles.CANDIDATE_COLUMNS]]),
+            self.write_file('cm.txt', committees),
+        )
+
+    def test_import_resolves_and_deduplicates(self):
+        candidates, committees = self.write_masters()
+        contributions = self.write_file('itcont.txt', [
+            self.contribution(1),
+            self.contribution(2, TRANSACTION_AMT='75', NAME='SMITH,  JOHN A'),
+            self.contribution(3, ENTITY_TP='ORG', NAME='ACME FEED CO', CMTE_ID='C00000002'),
+            self.contribution(4, MEMO_CD='X'),
+            self.contribution(5, CMTE_ID='C00000009', FILE_NUM='', MEMO_TEXT='EARMARKED'),
+        ])
+        call_command(
+            'import_fec', '--candidates', str(candidates), '--committees', str(committees),
+            '--contributions', str(contributions), '--workers', '1', '--batch-size', '2', stdout=mock.MagicMock(),
+        )
+
+        self.assertEqual(Transaction.objects.count(), 4)
+        smith = Entity.objects.get(last_name='smith', first_name='john a')
+        self.assertEqual(smith.occupation, 'rancher')
+        self.assertEqual(list(smith.entity_residences.values_list('city_name', 'zip_code')), [('san angelo', '76901')])
+
+        garza = ExternalId.objects.get(number='H4TX00001').child_entity
+        self.assertEqual((garza.last_name, garza.first_name), ('garza', 'jane'))
+        committee = ExternalId.objects.get(number='C00000001').child_entity
+        campaign = Campaign.objects.get(committee_entity=committee)
+        self.assertEqual((campaign.candidate_entity, campaign.category.name), (garza, 'candidate'))
+        self.assertEqual(campaign.registration_date, datetime(2023, 1, 1).date())
+        self.assertEqual(campaign.campaign_summary.total_raised, Decimal('100'))
+
+        self.assertEqual(ExternalId.objects.get(number='C00000002').child_entity.category.name, 'political action committee')
+        self.assertEqual(Document.objects.get(name='fec report 1600001').filer_entity, committee)
+        self.assertTrue(Transaction.objects.filter(
+            reason='earmarked', document__name='fec report 202301159000000001', notes='FEC SUB_ID 5',
+        ).exists())
+
+    def test_byte_ranges_end_on_line_breaks(self):
+        path = self.write_file('itcont.txt', [self.contribution(n) for n in range(10)])
+        ranges = fecfiles.byte_ranges(path, 100)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], path.stat().st_size)
+        with open(path, 'rb') as file:
+            data = file.read()
+        for start, end in ranges:
+            self.assertEqual(data[end - 1:end], b'\n')
+        rows = [row for start, end in ranges for _, batch in fecfiles.parse_chunk(path, start, end, 3) for row in batch]
+        self.assertEqual([row[-1] for row in rows], [str(n) for n in range(10)])
+
+    def test_parallel_import_matches_serial_and_resumes(self):
+        path = self.write_file('itcont.txt', [self.contribution(n, TRANSACTION_AMT=str(n)) for n in range(1, 41)])
+        importer = fec.FecImporter(mock.MagicMock(), workers=2, chunk_size=500, batch_size=4)
+        original = fec.FecImporter.process_batch
+        calls = []
+
+        def crash_on_fifth_batch(importer, rows):
+            calls.append(1)
+            if len(calls) == 5:
+                raise RuntimeError('crash')
+            return original(importer, rows)
+
+        with mock.patch.object(fec.FecImporter, 'process_batch', crash_on_fifth_batch):
+            with self.assertRaises(RuntimeError):
+                importer.import_contributions(path)
+        self.assertFalse(ImportCheckpoint.objects.get(source='fec').completed)
+
+        imported_before = Transaction.objects.count()
+        imported = fec.FecImporter(mock.MagicMock(), workers=2, chunk_size=500, batch_size=4).import_contributions(path)
+        self.assertEqual(imported_before + imported, 40)
+        self.assertEqual(sorted(Transaction.objects.values_list('amount', flat=True)), [Decimal(n) for n in range(1, 41)])
+        self.assertEqual(Entity.objects.filter(last_name='smith').count(), 1)
+        self.assertTrue(ImportCheckpoint.objects.get(source='fec').completed)
+
+
+class LinkageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.corporation = EntityCategory.objects.create(name='corporation')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.home = Address.objects.create(street_name='main st', building_number='12', zip_code='76901')
+        cls.other_home = Address.objects.create(street_name='oak st', building_number='4', zip_code='76901')
+
+        cls.john = cls.person('smith', 'john a', cls.home)
+        cls.john_duplicate = cls.person('SMITH', 'John', cls.home)
+        cls.jon = cls.person('smith jr.', 'j', cls.other_home)
+        cls.jane = cls.person('smith', 'jane', cls.home)
+        cls.acme = Entity.objects.create(category=cls.corporation, last_name='smith')
+        cls.home.residents.add(cls.acme)
+
+    @classmethod
+    def person(cls, last_name, first_name, address):
+        entity = Entity.objects.create(category=cls.individual, last_name=last_name, first_name=first_name)
+        address.residents.add(entity)
+        return entity
+
+    def test_normalization(self):
+        self.assertEqual(linkage.soundex('Robert'), linkage.soundex('Rupert'))
+        self.assertEqual(linkage.soundex('Ashcraft'), 'A261')
+        self.assertEqual(linkage.soundex('Tymczak'), 'T522')
+        self.assertEqual(linkage.soundex('Lee'), 'L000')
+        self.assertEqual(linkage.normalize_last_name("O'Brien, Jr."), 'o brien')
+        self.assertEqual(linkage.split_first_name('JOHN  A.'), ('john', 'a'))
+        self.assertEqual(linkage.split_first_name('John', 'Allen'), ('john', 'a'))
+
+    def test_finds_duplicates_within_blocks(self):
+        candidates = linkage.EntityIndex().find_candidates()
+        pairs = {(candidate.pk, candidate.other_pk): candidate for candidate in candidates}
+        best = pairs[(self.john.pk, self.john_duplicate.pk)]
+        self.assertEqual(candidates[0], best)
+        self.assertEqual(best.reasons, ['last name', 'first name', 'address'])
+        # Same zip code, different street and an initial
+        self.assertIn((self.john.pk, self.jon.pk), pairs)
+        # Jane is not John, and a company is never a person
+        self.assertNotIn((self.john.pk, self.jane.pk), pairs)
+        self.assertFalse([pair for pair in pairs if self.acme.pk in pair])
+
+    def test_shared_email_links_different_names(self):
+        other = Entity.objects.create(category=self.individual, last_name='smyth', first_name='john')
+        email = Email.objects.create(address='jsmith@example.com')
+        email.associated_entities.add(self.john, other)
+        index = linkage.EntityIndex()
+        score, reasons = index.score(index.records[self.john.pk], index.records[other.pk])
+        self.assertEqual(reasons, ['last name sounds alike', 'first name', 'email'])
+        self.assertIn((self.john.pk, other.pk), set(index.get_pairs()))
+
+    def test_oversized_blocks_are_skipped(self):
+        index = linkage.EntityIndex()
+        self.assertTrue(list(index.get_pairs()))
+        self.assertEqual(list(index.get_pairs(max_block_size=1)), [])
+
+    def test_merge_repoints_everything(self):
+        committee = Entity.objects.create(category=self.individual, last_name='committee1')
+        campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=committee)
+        for donor, amount in [(self.john, 10), (self.john_duplicate, 5), (self.john_duplicate, 1)]:
+            Transaction.objects.create(
+                category=self.contribution, payer_entity=donor, payee_entity=committee,
+                recorded_date='2023-01-01', amount=amount,
+            )
+        self.other_home.residents.add(self.john_duplicate)
+        phone = PhoneNumber.objects.create(area_code='325', number='5550100', owner=self.john_duplicate)
+        phone.associated_entities.add(self.john_duplicate)
+        Relationship.objects.create(parent_entity=self.john_duplicate, child_entity=self.jane)
+        self.john_duplicate.occupation = 'rancher'
+        self.john_duplicate.save()
+
+        call_command('merge_entities', str(self.john.uuid), str(self.john_duplicate.uuid), stdout=mock.MagicMock())
+
+        self.assertFalse(Entity.objects.filter(pk=self.john_duplicate.pk).exists())
+        john = Entity.objects.get(pk=self.john.pk)
+        self.assertEqual(john.occupation, 'rancher')
+        self.assertEqual(john.entity_payer_transactions.count(), 3)
+        self.assertEqual(sorted(john.entity_residences.values_list('pk', flat=True)), sorted([self.home.pk, self.other_home.pk]))
+        self.assertEqual(list(john.entity_phone_numbers.all()), [phone])
+        self.assertEqual(PhoneNumber.objects.get().owner, john)
+        self.assertEqual(Relationship.objects.get().parent_entity, john)
+        self.assertEqual(
+            list(campaign.campaign_donor_totals.values_list('donor_entity', 'total', 'count')),
+            [(john.pk, Decimal('16.00'), 3)],
+        )
+        self.assertFalse(SearchEntry.objects.filter(kind='entity', object_id=self.john_duplicate.pk).exists())
+
+    def test_merge_is_atomic(self):
+        duplicate_pk = self.john_duplicate.pk
+        with mock.patch.object(linkage, 'rebuild_campaign_summaries', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                linkage.merge_entities(self.john, [self.john_duplicate])
+        self.assertTrue(Entity.objects.filter(pk=duplicate_pk).exists())
+        self.assertEqual(self.home.residents.count(), 4)
+
+    def test_find_duplicate_entities_command(self):
+        stdout = mock.MagicMock()
+        output = Path(tempfile.mkdtemp()) / 'candidates.csv'
+        self.addCleanup(output.unlink)
+        call_command('find_duplicate_entities', '--output', str(output), stdout=stdout, stderr=mock.MagicMock())
+        with open(output) as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual((rows[0]['uuid'], rows[0]['other_uuid']), (str(self.john.uuid), str(self.john_duplicate.uuid)))
+
+
+class GraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.pac = Entity.objects.create(category=cls.individual, last_name='pac1')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.spouse = Entity.objects.create(category=cls.individual, last_name='spouse1')
+        cls.home = Address.objects.create(street_name='main st', zip_code='76901')
+        cls.home.residents.add(cls.donor, cls.spouse)
+        Relationship.objects.create(parent_entity=cls.donor, child_entity=cls.spouse)
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+        cls.give(cls.donor, cls.pac, 100)
+        cls.give(cls.donor, cls.pac, 50)
+        cls.give(cls.pac, cls.committee, 120)
+
+    @classmethod
+    def give(cls, payer, payee, amount):
+        return Transaction.objects.create(
+            category=cls.contribution, payer_entity=payer, payee_entity=payee, recorded_date='2023-01-01', amount=amount,
+        )
+
+    def setUp(self):
+        graph.reset_graph()
+        self.addCleanup(graph.reset_graph)
+
+    def test_neighborhood(self):
+        hops = graph.get_graph().neighborhood('entity', self.donor.pk, hops=1)
+        self.assertEqual(
+            {(hop.node, hop.edge_kind, hop.direction, hop.amount, hop.count) for hop in hops},
+            {
+                (('entity', self.pac.pk), 'money', 1, 150.0, 2),
+                (('entity', self.spouse.pk), 'relationship', 1, 0.0, 1),
+                (('address', self.home.pk), 'resident', 1, 0.0, 1),
+            },
+        )
+        # Largest money first
+        self.assertEqual(hops[0].node, ('entity', self.pac.pk))
+
+        hops = graph.get_graph().neighborhood('entity', self.donor.pk, hops=3)
+        distances = {hop.node: (hop.distance, hop.parent) for hop in hops}
+        self.assertEqual(distances[('entity', self.committee.pk)], (2, ('entity', self.pac.pk)))
+        self.assertEqual(distances[('campaign', self.campaign.pk)], (3, ('entity', self.committee.pk)))
+        self.assertEqual(len(graph.get_graph().neighborhood('entity', self.donor.pk, hops=3, limit=2)), 2)
+        self.assertEqual(graph.get_graph().neighborhood('entity', 0), [])
+
+    def test_money_path_and_flow(self):
+        money_graph = graph.get_graph()
+        self.assertEqual(money_graph.money_path(self.donor.pk, self.committee.pk), [
+            graph.MoneyStep(self.donor.pk, self.pac.pk, 150.0, 2),
+            graph.MoneyStep(self.pac.pk, self.committee.pk, 120.0, 1),
+        ])
+        # Money only flows one way, and relationships are not money
+        self.assertIsNone(money_graph.money_path(self.committee.pk, self.donor.pk))
+        self.assertIsNone(money_graph.money_path(self.donor.pk, self.spouse.pk))
+        self.assertIsNone(money_graph.money_path(self.donor.pk, self.committee.pk, max_hops=1))
+
+        flow = money_graph.flow(self.pac.pk)
+        self.assertEqual((flow.received, flow.given), (150.0, 120.0))
+        self.assertEqual(flow.senders, [(self.donor.pk, 150.0, 2)])
+        self.assertEqual(flow.recipients, [(self.committee.pk, 120.0, 1)])
+
+    def test_changes_update_the_loaded_graph(self):
+        money_graph = graph.get_graph()
+        with self.captureOnCommitCallbacks(execute=True):
+            gift = self.give(self.spouse, self.committee, 30)
+        self.assertEqual(money_graph.flow(self.committee.pk).received, 150.0)
+        self.assertEqual(len(money_graph.money_path(self.spouse.pk, self.committee.pk)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gift.amount = 45
+            gift.save()
+        self.assertEqual(money_graph.flow(self.committee.pk).received, 165.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gift.delete()
+            Relationship.objects.all().delete()
+            # Removing an address that was never linked changes nothing
+            self.committee.entity_residences.remove(self.home)
+            self.home.residents.remove(self.spouse)
+        self.assertIsNone(money_graph.money_path(self.spouse.pk, self.committee.pk))
+        self.assertEqual(money_graph.neighborhood('entity', self.spouse.pk), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spouse.entity_residences.add(self.home)
+            self.campaign.candidate_entity = self.spouse
+            self.campaign.save()
+        self.assertEqual(
+            {hop.node for hop in money_graph.neighborhood('entity', self.spouse.pk, hops=1)},
+            {('address', self.home.pk), ('campaign', self.campaign.pk)},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pac.delete()
+        self.assertIsNone(money_graph.money_path(self.donor.pk, self.committee.pk))
+        self.assertIs(graph.get_graph(), money_graph)
+
+    def test_compaction_keeps_connections(self):
+        money_graph = graph.get_graph()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.give(self.spouse, self.committee, 30)
+            self.home.residents.remove(self.donor)
+        before = sorted(money_graph.neighborhood('entity', self.donor.pk, hops=4))
+        self.assertTrue(money_graph.overlay)
+        money_graph.compact()
+        self.assertEqual(money_graph.overlay, {})
+        self.assertEqual(sorted(money_graph.neighborhood('entity', self.donor.pk, hops=4)), before)
+
+    def test_compaction_runs_in_the_background(self):
+        money_graph = graph.get_graph()
+        with mock.patch.object(graph, 'COMPACT_MIN', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.give(self.spouse, self.committee, 30)
+            # The current graph is served while a copy is compacted
+            self.assertIs(graph.get_graph(), money_graph)
+            graph.wait_for_refresh()
+        compacted = graph.get_loaded_graph()
+        self.assertIsNot(compacted, money_graph)
+        self.assertEqual(compacted.overlay, {})
+        self.assertEqual(compacted.flow(self.committee.pk).received, 150.0)
+
+    def test_changes_made_while_compacting_are_kept(self):
+        money_graph = graph.get_graph()
+        copy = money_graph.copy()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.give(self.spouse, self.committee, 30)
+        copy.compact()
+        money_graph.replace_with(copy)
+        self.assertEqual(copy.flow(self.committee.pk).received, 150.0)
+        # and the ones made after it replaced the graph
+        with self.captureOnCommitCallbacks(execute=True):
+            self.give(self.spouse, self.committee, 5)
+        self.assertEqual(copy.flow(self.committee.pk).received, 155.0)
+
+    @override_settings(GRAPH_MAX_AGE=0)
+    def test_stale_graph_is_rebuilt_in_the_background(self):
+        money_graph = graph.get_graph()
+        rebuilt = graph.Graph()
+        with mock.patch.object(graph.Graph, 'build', return_value=rebuilt):
+            self.assertIs(graph.get_graph(), money_graph)
+            graph.wait_for_refresh()
+        self.assertIs(graph.get_loaded_graph(), rebuilt)
+
+    def test_connections_view(self):
+        url = reverse('campaignfinance:entityconnections', args=[self.donor.uuid])
+        graph.get_graph()
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'to': self.committee.uuid})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([step[:2] for step in response.context['path']], [(self.donor, self.pac), (self.pac, self.committee)])
+        self.assertEqual(response.context['given'], 150.0)
+        self.assertContains(response, 'committee1')
+        self.assertEqual(self.client.get(url, {'hops': 9}).status_code, 404)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=600)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.bystander = Entity.objects.create(category=cls.individual, last_name='bystander1')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            self.get(url)
+
+    def assertRendered(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        self.assertTrue(queries.captured_queries)
+
+    def give(self, amount):
+        return Transaction.objects.create(
+            category=self.contribution, payer_entity=self.donor, payee_entity=self.committee,
+            campaign=self.campaign, recorded_date='2023-01-01', amount=amount,
+        )
+
+    def test_pages_are_cached(self):
+        url = reverse('campaignfinance:entitydetail', args=[self.donor.uuid])
+        self.get(url)
+        self.assertCached(url)
+
+    def test_querystring_order_does_not_matter(self):
+        url = reverse('campaignfinance:entityindex')
+        self.get(url + '?category=person&sortby=first+name')
+        self.assertCached(url + '?sortby=first+name&category=person')
+
+    def test_transaction_invalidates_the_pages_it_touches(self):
+        urls = {
+            'payer': reverse('campaignfinance:entitydetail', args=[self.donor.uuid]),
+            'payee': reverse('campaignfinance:entitydetail', args=[self.committee.uuid]),
+            'campaign': reverse('campaignfinance:campaigndetail', args=[self.campaign.uuid]),
+            'index': reverse('campaignfinance:transactionindex'),
+        }
+        untouched = [
+            reverse('campaignfinance:entitydetail', args=[self.bystander.uuid]),
+            reverse('campaignfinance:entityindex'),
+        ]
+        for url in [*urls.values(), *untouched]:
+            self.get(url)
+
+        self.give(1234)
+
+        for name, url in urls.items():
+            with self.subTest(name):
+                self.assertIn('1234', self.get(url))
+        for url in untouched:
+            self.assertCached(url)
+
+    def test_page_rendered_before_a_change_is_not_stored(self):
+        url = reverse('campaignfinance:entitydetail', args=[self.donor.uuid])
+        self.donor.save()
+        # As if rendering started before the save
+        with mock.patch('time.time_ns', return_value=0):
+            self.get(url)
+        self.assertRendered(url)
+        self.assertCached(url)
+
+    def test_many_to_many_change_invalidates_both_sides(self):
+        address = Address.objects.create(street_name='main st', zip_code='76901')
+        entity_url = reverse('campaignfinance:entitydetail', args=[self.donor.uuid])
+        address_url = reverse('campaignfinance:addressdetail', args=[address.uuid])
+        self.get(entity_url)
+        self.get(address_url)
+
+        address.residents.add(self.donor)
+
+        self.assertIn('main st', self.get(entity_url))
+        self.assertIn('donor1', self.get(address_url))
+
+        self.get(entity_url)
+        address.residents.clear()
+        self.assertNotIn('main st', self.get(entity_url))
+
+    def test_invalidate_all(self):
+        url = reverse('campaignfinance:entitydetail', args=[self.bystander.uuid])
+        self.get(url)
+        pagecache.invalidate_all()
+        self.assertRendered(url)
+
+    def test_signed_in_readers_skip_the_page_cache(self):
+        user = User.objects.create_user('reader')
+        self.client.force_login(user)
+        url = reverse('campaignfinance:entityindex')
+        self.get(url)
+        self.assertRendered(url)
+
+    def test_fragments(self):
+        compute = mock.Mock(return_value=['donor1'])
+        tags = [pagecache.get_tag(self.campaign)]
+        self.assertEqual(pagecache.get_or_set_fragment('donors', tags, compute), ['donor1'])
+        self.assertEqual(pagecache.get_or_set_fragment('donors', tags, compute), ['donor1'])
+        self.assertEqual(compute.call_count, 1)
+
+        self.campaign.save()
+        pagecache.get_or_set_fragment('donors', tags, compute)
+        self.assertEqual(compute.call_count, 2)
+
+
+class CategoryRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.corporation = EntityCategory.objects.create(name='corporation')
+        cls.person = Entity.objects.create(category=cls.individual, last_name='person1')
+        cls.company = Entity.objects.create(category=cls.corporation, last_name='company1')
+
+    def setUp(self):
+        categories.reset_categories()
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(categories.get_category_id(EntityCategory, 'individual'), self.individual.pk)
+            self.assertEqual(categories.get_category_id(EntityCategory, 'corporation'), self.corporation.pk)
+
+    def test_index_filters_by_cached_id(self):
+        url = reverse('campaignfinance:entityindex') + '?category=person'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(list(response.context['entity_list']), [self.person])
+        self.assertFalse(any(' FROM "campaignfinance_entitycategory"' in query['sql'] for query in queries.captured_queries))
+
+    def test_saving_a_category_resets_its_model(self):
+        categories.get_category_id(EntityCategory, 'individual')
+        self.individual.name = 'person'
+        self.individual.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(categories.get_category_id(EntityCategory, 'person'), self.individual.pk)
+        self.assertIsNone(categories.get_category_id(EntityCategory, 'individual'))
+
+    def test_other_processes_reload_changed_categories(self):
+        categories.get_category_id(EntityCategory, 'individual')
+        # As loaded by a process that did not save the category
+        loaded = categories._registry[EntityCategory]
+        self.individual.name = 'person'
+        self.individual.save()
+        categories._registry[EntityCategory] = loaded
+        self.assertIsNone(categories.get_category_id(EntityCategory, 'individual'))
+        with self.assertNumQueries(0):
+            self.assertEqual(categories.get_category_id(EntityCategory, 'person'), self.individual.pk)
+
+    def test_missing_category_filters_out_everything(self):
+        queryset = categories.filter_by_category(Entity.objects.all(), EntityCategory, 'government')
+        self.assertQuerysetEqual(queryset, [])
+        government = EntityCategory.objects.create(name='government')
+        agency = Entity.objects.create(category=government, last_name='agency1')
+        queryset = categories.filter_by_category(Entity.objects.all(), EntityCategory, 'government')
+        self.assertQuerysetEqual(queryset, [agency])
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@localhost', 'password')
+        cls.government = EntityCategory.objects.create(name='government')
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.document_category = DocumentCategory.objects.create(name='report')
+        cls.address_category = AddressCategory.objects.create(name='building')
+        cls.relationship_category = RelationshipCategory.objects.create(name='spouse')
+        cls.campaign_category = CampaignCategory.objects.create(name='candidate')
+        cls.election_category = ElectionCategory.objects.create(name='general')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def entity(self, category=None):
+        return Entity.objects.create(category=category or self.individual, last_name='entity')
+
+    def create(self, model):
+        """Creates a row of model with its own related rows."""
+        if model is Entity:
+            return self.entity()
+        if model is ExternalId:
+            return ExternalId.objects.create(parent_entity=self.entity(self.government), child_entity=self.entity(), number='1')
+        if model is Relationship:
+            return Relationship.objects.create(category=self.relationship_category, parent_entity=self.entity(), child_entity=self.entity())
+        if model is Office:
+            return Office.objects.create(name='mayor', government_entity=self.entity(self.government), holder_entity=self.entity())
+        if model is FormerOfficeHolder:
+            return FormerOfficeHolder.objects.create(office=self.create(Office), entity=self.entity())
+        if model is Campaign:
+            return Campaign.objects.create(
+                category=self.campaign_category, name='campaign', registration_date='2023-01-01',
+                candidate_entity=self.entity(), committee_entity=self.entity(), office_sought=self.create(Office),
+            )
+        if model is Election:
+            return Election.objects.create(category=self.election_category, government_entity=self.entity(self.government), date='2023-11-07')
+        if model is Document:
+            return Document.objects.create(
+                category=self.document_category, name='report', filer_entity=self.entity(),
+                date_filed='2023-01-15', coverage_start_date='2022-07-01', coverage_end_date='2022-12-31',
+            )
+        if model is ReportedTotals:
+            return ReportedTotals.objects.create(document=self.create(Document))
+        if model is ReportedSubtotals:
+            return ReportedSubtotals.objects.create(document=self.create(Document))
+        if model is Transaction:
+            return Transaction.objects.create(
+                category=self.contribution, payer_entity=self.entity(), payee_entity=self.entity(),
+                amount=1, recorded_date='2023-01-01',
+            )
+        if model is Address:
+            return Address.objects.create(category=self.address_category, street_name='main st')
+        if model is PhoneNumber:
+            return PhoneNumber.objects.create(area_code='325', number='5550100', owner=self.entity())
+        if model is Email:
+            owner = self.entity()
+            return Email.objects.create(address=f'entity{owner.pk}@example.com', owner=owner)
+        if model is Website:
+            owner = self.entity()
+            return Website.objects.create(address=f'https://example.com/{owner.pk}', owner=owner)
+        raise AssertionError(model)
+
+    def count_queries(self, model):
+        url = reverse(f'admin:campaignfinance_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        models = [
+            Entity, ExternalId, Relationship, Office, FormerOfficeHolder, Campaign, Election, Document,
+            ReportedTotals, ReportedSubtotals, Transaction, Address, PhoneNumber, Email, Website,
+        ]
+        for model in models:
+            with self.subTest(model=model.__name__):
+                self.create(model)
+                one_row = self.count_queries(model)
+                for _ in range(4):
+                    self.create(model)
+                self.assertEqual(self.count_queries(model), one_row)
+
+    def test_estimated_count_only_for_unfiltered_postgresql_tables(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(connection, 'cursor') as cursor:
+            cursor.return_value.__enter__.return_value.fetchone.return_value = (2500000.0,)
+            paginator = pagination.EstimatedCountPaginator(Transaction.objects.order_by('pk'), 100)
+            self.assertEqual(paginator.count, 2500000)
+        self.create(Transaction)
+        paginator = pagination.EstimatedCountPaginator(Transaction.objects.filter(amount__gt=0).order_by('pk'), 100)
+        self.assertEqual(paginator.count, 1)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.corporation = EntityCategory.objects.create(name='corporation')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.expenditure = TransactionCategory.objects.create(name='expenditure')
+        cls.donor = Entity.objects.create(category=cls.individual, first_name='jane', last_name='donor, jr')
+        cls.committee = Entity.objects.create(category=cls.corporation, last_name='committee1')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+        cls.first = Transaction.objects.create(
+            category=cls.contribution, campaign=cls.campaign, payer_entity=cls.donor, payee_entity=cls.committee,
+            amount=Decimal('100.50'), recorded_date='2023-01-10', reason='"general" fund',
+        )
+        cls.second = Transaction.objects.create(
+            category=cls.contribution, payer_entity=cls.donor, payee_entity=cls.committee,
+            amount=Decimal('25.00'), recorded_date='2023-03-01',
+        )
+        cls.third = Transaction.objects.create(
+            category=cls.expenditure, campaign=cls.campaign, payer_entity=cls.committee, payee_entity=cls.donor,
+            amount=Decimal('10.00'), recorded_date='2023-02-01',
+        )
+
+    def export(self, name, export_format, query=''):
+        response = self.client.get(reverse(f'campaignfinance:{name}', args=[export_format]) + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    async def test_streamed_lazily_under_asgi(self):
+        written = []
+
+        def csv_lines(columns, rows, chunk_size):
+            for chunk in exports.csv_lines(columns, rows, chunk_size):
+                written.append(chunk)
+                yield chunk
+
+        with mock.patch.dict(exports.EXPORT_WRITERS, {'csv': csv_lines}), \
+                mock.patch.object(views.TransactionExportView, 'chunk_size', 1):
+            response = await self.async_client.get(reverse('campaignfinance:transactionexport', args=['csv']))
+            self.assertTrue(response.is_async)
+            self.assertEqual(written, [])
+            content = response.streaming_content
+            first = await anext(content)
+            self.assertEqual(len(written), 1)
+            rest = [chunk async for chunk in content]
+        self.assertEqual(first, written[0].encode())
+        self.assertEqual(len(rest), len(written) - 1)
+        # The header and a row per chunk, then what is left of the last one
+        self.assertEqual(len(list(csv.reader(b''.join([first, *rest]).decode().splitlines()))), 4)
+
+    def test_transaction_csv(self):
+        rows = list(csv.DictReader(self.export('transactionexport', 'csv').splitlines()))
+        self.assertEqual([row['uuid'] for row in rows], [str(self.first.uuid), str(self.third.uuid), str(self.second.uuid)])
+        self.assertEqual(rows[0]['reason'], '"general" fund')
+        self.assertEqual(rows[0]['payer_last_name'], 'donor, jr')
+        self.assertEqual(rows[0]['amount'], '100.50')
+        self.assertEqual(rows[0]['campaign_uuid'], str(self.campaign.uuid))
+        self.assertEqual(rows[1]['category'], 'expenditure')
+
+    def test_transaction_ndjson_filters(self):
+        query = f'?category=contribution&campaign={self.campaign.uuid}&start=2023-01-01&end=2023-12-31'
+        lines = self.export('transactionexport', 'ndjson', query).splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['uuid'], str(self.first.uuid))
+        self.assertEqual(row['recorded_date'], '2023-01-10')
+        self.assertEqual(row['amount'], '100.50')
+
+        lines = self.export('transactionexport', 'ndjson', '?start=2023-02-01&end=2023-02-28').splitlines()
+        self.assertEqual([json.loads(line)['uuid'] for line in lines], [str(self.third.uuid)])
+
+    def test_index_shares_the_filters(self):
+        response = self.client.get(reverse('campaignfinance:transactionindex') + '?start=2023-02-01&end=2023-02-28')
+        self.assertEqual(list(response.context['transaction_list']), [self.third])
+        response = self.client.get(reverse('campaignfinance:transactionindex') + '?start=02/01/2023')
+        self.assertEqual(response.status_code, 404)
+
+    def test_entity_export(self):
+        rows = list(csv.DictReader(self.export('entityexport', 'csv', '?category=company').splitlines()))
+        self.assertEqual([row['last_name'] for row in rows], ['committee1'])
+        self.assertEqual(rows[0]['category'], 'corporation')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('campaignfinance:transactionexport', args=['xlsx']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_rows_are_written_in_chunks(self):
+        with mock.patch.object(views.TransactionExportView, 'chunk_size', 2):
+            response = self.client.get(reverse('campaignfinance:transactionexport', args=['ndjson']))
+            chunks = list(response.streaming_content)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 1])
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.donor = Entity.objects.create(category=cls.individual, first_name='jane', last_name='donor1')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.transactions = [
+            Transaction.objects.create(
+                category=cls.contribution, payer_entity=cls.donor, payee_entity=cls.committee,
+                amount=Decimal(amount), recorded_date='2023-01-01',
+            ) for amount in ('10.00', '20.00', '30.00')
+        ]
+        cls.home = Address.objects.create(street_name='main st', zip_code='76901')
+        cls.home.residents.add(cls.donor, cls.committee)
+
+    def get(self, url, status=200, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status)
+        return response.json() if status != 304 else None
+
+    def test_root_lists_resources(self):
+        resources = self.get(reverse('campaignfinance:apiroot'))
+        self.assertIn('transaction', resources)
+        self.assertIn('campaigndonortotal', resources)
+        self.assertNotIn('searchentry', resources)
+        for name, url in resources.items():
+            with self.subTest(name):
+                self.get(url + '?include=' + ','.join(sorted(api.get_resource(api.get_resources()[name]).relations)))
+
+    def test_detail(self):
+        url = reverse('campaignfinance:apidetail', args=['transaction', self.transactions[0].uuid])
+        obj = self.get(url)
+        self.assertEqual(obj['uuid'], str(self.transactions[0].uuid))
+        self.assertEqual(obj['amount'], '10.00')
+        self.assertEqual(obj['payer_entity'], str(self.donor.uuid))
+        self.assertNotIn('id', obj)
+        self.get(reverse('campaignfinance:apidetail', args=['transaction', self.donor.uuid]), status=404)
+        self.get(reverse('campaignfinance:apidetail', args=['nothing', self.donor.uuid]), status=404)
+
+    def test_sparse_fields_and_include(self):
+        url = reverse('campaignfinance:apilist', args=['transaction']) + '?fields=amount&include=payer_entity'
+        with self.assertNumQueries(2):
+            results = self.get(url)['results']
+        self.assertEqual(set(results[0]), {'uuid', 'amount', 'payer_entity'})
+        self.assertEqual(results[0]['payer_entity']['first_name'], 'jane')
+        self.assertEqual(results[0]['payer_entity']['category'], str(self.individual.uuid))
+
+        self.get(reverse('campaignfinance:apilist', args=['transaction']) + '?fields=secret', status=400)
+        self.get(reverse('campaignfinance:apilist', args=['transaction']) + '?include=amount', status=400)
+
+    def test_many_to_many(self):
+        url = reverse('campaignfinance:apidetail', args=['address', self.home.uuid])
+        self.assertNotIn('residents', self.get(url))
+        obj = self.get(url + '?fields=residents')
+        self.assertEqual(set(obj['residents']), {str(self.donor.uuid), str(self.committee.uuid)})
+        obj = self.get(url + '?include=residents')
+        self.assertEqual({resident['last_name'] for resident in obj['residents']}, {'donor1', 'committee1'})
+
+    def test_cursor_pagination(self):
+        url = reverse('campaignfinance:apilist', args=['transaction']) + '?fields=amount&limit=2'
+        page = self.get(url)
+        self.assertEqual([row['amount'] for row in page['results']], ['10.00', '20.00'])
+        self.assertIsNone(page['previous'])
+        page = self.get(page['next'])
+        self.assertEqual([row['amount'] for row in page['results']], ['30.00'])
+        self.assertIsNone(page['next'])
+        page = self.get(page['previous'])
+        self.assertEqual([row['amount'] for row in page['results']], ['10.00', '20.00'])
+
+        self.get(url + '&cursor=garbage', status=400)
+        self.get(url.replace('limit=2', 'limit=5000'), status=400)
+
+    def test_filter_by_related_uuid(self):
+        url = reverse('campaignfinance:apilist', args=['transaction'])
+        self.assertEqual(len(self.get(f'{url}?payer_entity={self.donor.uuid}')['results']), 3)
+        self.assertEqual(self.get(f'{url}?payer_entity={self.committee.uuid}')['results'], [])
+        self.get(f'{url}?payer_entity=nope', status=400)
+
+    def test_etag(self):
+        url = reverse('campaignfinance:apidetail', args=['entity', self.donor.uuid])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.get(url, status=304, HTTP_IF_NONE_MATCH=etag)
+
+        self.donor.first_name = 'janet'
+        self.donor.save()
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag)['first_name'], 'janet')
+
+
+# Tag versions are shared by the processes serving the pages
+@override_settings(CACHE_SHARED=True)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.bystander = Entity.objects.create(category=cls.individual, last_name='bystander1')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        return response['ETag']
+
+    def give(self, amount):
+        return Transaction.objects.create(
+            category=self.contribution, payer_entity=self.donor, payee_entity=self.committee,
+            campaign=self.campaign, recorded_date='2023-01-01', amount=amount,
+        )
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for url in [
+            reverse('campaignfinance:entitydetail', args=[self.donor.uuid]),
+            reverse('campaignfinance:campaigndetail', args=[self.campaign.uuid]),
+            reverse('campaignfinance:entityindex'),
+        ]:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=self.get_etag(url))
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.templates, [])
+
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_transaction_changes_the_pages_it_shows_on(self):
+        urls = [
+            reverse('campaignfinance:entitydetail', args=[self.donor.uuid]),
+            reverse('campaignfinance:entitydetail', args=[self.committee.uuid]),
+            reverse('campaignfinance:campaigndetail', args=[self.campaign.uuid]),
+            reverse('campaignfinance:transactionindex'),
+        ]
+        bystander = reverse('campaignfinance:entitydetail', args=[self.bystander.uuid])
+        etags = {url: self.get_etag(url) for url in [*urls, bystander]}
+
+        transaction = self.give(100)
+        for url in urls:
+            self.assertNotEqual(self.get_etag(url), etags[url], url)
+        self.assertEqual(self.get_etag(bystander), etags[bystander])
+
+        etags = {url: self.get_etag(url) for url in urls}
+        transaction.delete()
+        for url in urls:
+            self.assertNotEqual(self.get_etag(url), etags[url], url)
+
+    def test_deleting_a_row_changes_its_index(self):
+        url = reverse('campaignfinance:entityindex')
+        etag = self.get_etag(url)
+        Entity.objects.create(category=self.individual, last_name='gone').delete()
+        self.assertNotEqual(self.get_etag(url), etag)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_index_pages_need_a_shared_cache(self):
+        # Only the middleware's ETag of the rendered content
+        self.assertNotIn('Last-Modified', self.client.get(reverse('campaignfinance:entityindex')))
+        self.get_etag(reverse('campaignfinance:entitydetail', args=[self.donor.uuid]))
+
+    def test_bulk_inserts_touch_the_rows_they_point_at(self):
+        before = Entity.objects.get(pk=self.donor.pk).updated_at
+        importing.insert_rows(Transaction, [{
+            'category_id': self.contribution.pk, 'payer_entity_id': self.donor.pk,
+            'recorded_date': '2023-01-01', 'amount': Decimal('5.00'),
+        }], use_copy=False)
+        self.assertGreater(Entity.objects.get(pk=self.donor.pk).updated_at, before)
+        self.assertEqual(Entity.objects.get(pk=self.bystander.pk).updated_at, self.bystander.updated_at)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.expenditure = TransactionCategory.objects.create(name='expenditure')
+        cls.energy = IndustrySector.objects.create(name='energy')
+        cls.oil = Industry.objects.create(name='oil and gas', sector=cls.energy)
+        cls.wind = Industry.objects.create(name='wind', sector=cls.energy)
+        cls.lawyers = Industry.objects.create(name='attorneys')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1', industry=cls.oil)
+        cls.other_donor = Entity.objects.create(category=cls.individual, last_name='donor2', industry=cls.lawyers)
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+        cls.home = Address.objects.create(state_name='texas', county_name='tom green', zip_code='76901')
+        cls.away = Address.objects.create(state_name='texas', county_name='travis', zip_code='78701')
+        cls.home.residents.add(cls.donor)
+        cls.away.residents.add(cls.donor, cls.other_donor)
+
+    def give(self, donor, amount, recorded_date='2023-01-15'):
+        return Transaction.objects.create(
+            category=self.contribution, payer_entity=donor, payee_entity=self.committee,
+            campaign=self.campaign, recorded_date=recorded_date, amount=amount,
+        )
+
+    def snapshot(self):
+        return {
+            'industries': set(CampaignIndustryTotal.objects.values_list('campaign_id', 'industry_id', 'total', 'count')),
+            'months': set(IndustryMonthTotal.objects.values_list('industry_id', 'month', 'total', 'count')),
+            'places': set(PlaceTotal.objects.values_list('state_name', 'county_name', 'zip_code', 'total', 'count')),
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_campaign_summaries()
+        analytics.rebuild_analytics()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_rollups(self):
+        self.give(self.donor, 100)
+        self.give(self.donor, 50, '2023-02-01')
+        self.give(self.other_donor, 25)
+        Transaction.objects.create(
+            category=self.expenditure, payer_entity=self.committee, payee_entity=self.donor,
+            campaign=self.campaign, recorded_date='2023-01-15', amount=999,
+        )
+
+        self.assertEqual(self.snapshot(), {
+            'industries': {
+                (self.campaign.pk, self.oil.pk, Decimal('150.00'), 2),
+                (self.campaign.pk, self.lawyers.pk, Decimal('25.00'), 1),
+            },
+            'months': {
+                (self.oil.pk, date(2023, 1, 1), Decimal('100.00'), 1),
+                (self.oil.pk, date(2023, 2, 1), Decimal('50.00'), 1),
+                (self.lawyers.pk, date(2023, 1, 1), Decimal('25.00'), 1),
+            },
+            # Homes are the first residence added
+            'places': {
+                ('texas', 'tom green', '76901', Decimal('150.00'), 2),
+                ('texas', 'travis', '78701', Decimal('25.00'), 1),
+            },
+        })
+        self.assertMatchesRebuild()
+
+    def test_transaction_changes(self):
+        transaction = self.give(self.donor, 100)
+        self.give(self.other_donor, 25)
+        transaction.amount = 40
+        transaction.recorded_date = '2022-12-31'
+        transaction.save()
+        self.assertMatchesRebuild()
+        transaction.payer_entity = self.other_donor
+        transaction.save()
+        self.assertMatchesRebuild()
+        transaction.delete()
+        self.assertMatchesRebuild()
+
+    def test_donor_changes(self):
+        self.give(self.donor, 100)
+        self.give(self.other_donor, 25)
+
+        self.donor.industry = self.wind
+        self.donor.save()
+        self.assertMatchesRebuild()
+
+        self.home.residents.remove(self.donor)
+        self.assertMatchesRebuild()
+        self.assertIn(('texas', 'travis', '78701', Decimal('125.00'), 2), self.snapshot()['places'])
+
+        self.away.zip_code = '78702'
+        self.away.save()
+        self.assertMatchesRebuild()
+
+        self.other_donor.delete()
+        self.assertMatchesRebuild()
+        self.away.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.snapshot()['places'], set())
+
+    def test_merge(self):
+        self.give(self.donor, 100)
+        self.give(self.other_donor, 25)
+        linkage.merge_entities(self.donor, [self.other_donor])
+        self.assertMatchesRebuild()
+
+    def test_views(self):
+        self.give(self.donor, 100)
+        self.give(self.other_donor, 25, '2022-06-01')
+
+        response = self.client.get(reverse('campaignfinance:sectortotals'))
+        self.assertEqual(
+            [(row['period'].year, row['sector_name'], row['total']) for row in response.context['sector_totals']],
+            [(2022, None, Decimal('25.00')), (2023, 'energy', Decimal('100.00'))],
+        )
+        response = self.client.get(reverse('campaignfinance:sectortotals') + f'?period=month&sector={self.energy.uuid}')
+        self.assertEqual([row['period'] for row in response.context['sector_totals']], [date(2023, 1, 1)])
+        self.assertEqual(self.client.get(reverse('campaignfinance:sectortotals') + '?sector=nope').status_code, 404)
+
+        response = self.client.get(reverse('campaignfinance:placetotals') + '?by=zip&county=travis')
+        self.assertEqual(
+            [(row['zip_code'], row['total']) for row in response.context['place_totals']], [('78701', Decimal('25.00'))],
+        )
+
+        response = self.client.get(reverse('campaignfinance:campaigndetail', args=[self.campaign.uuid]))
+        self.assertEqual([total.industry for total in response.context['top_industries']], [self.oil, self.lawyers])
+
+
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.expenditure = TransactionCategory.objects.create(name='expenditure')
+        cls.loan = TransactionCategory.objects.create(name='loan')
+        cls.filer = Entity.objects.create(category=cls.individual, last_name='filer1')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.report = DocumentCategory.objects.create(name='report')
+
+    def setUp(self):
+        categories.reset_categories()
+
+    def create_document(self, name, contributions=0, unitemized_contributions=0, loans=0):
+        document = Document.objects.create(
+            category=self.report, name=name, filer_entity=self.filer, date_filed='2023-01-15',
+            coverage_start_date='2023-01-01', coverage_end_date='2023-01-15',
+        )
+        ReportedTotals.objects.create(
+            document=document, contributions=contributions, unitemized_contributions=unitemized_contributions,
+        )
+        ReportedSubtotals.objects.create(document=document, loans=loans)
+        return document
+
+    def give(self, document, amount, category=None):
+        return Transaction.objects.create(
+            category=category or self.contribution, payer_entity=self.donor, payee_entity=self.filer,
+            document=document, recorded_date='2023-01-10', amount=amount,
+        )
+
+    def get_discrepancies(self):
+        return set(Discrepancy.objects.values_list('document__name', 'check_name', 'reported', 'itemized', 'difference'))
+
+    def test_reconcile(self):
+        matching = self.create_document('matching', contributions=150, unitemized_contributions=50)
+        self.give(matching, 60)
+        self.give(matching, 40)
+        short = self.create_document('short', contributions=300, loans=1000)
+        self.give(short, 100)
+        self.give(short, 500, self.loan)
+
+        counts = reconciliation.reconcile_documents()
+        self.assertEqual(counts, {'documents': 2, 'changed': 1})
+        self.assertEqual(self.get_discrepancies(), {
+            ('short', 'contributions', Decimal('300.00'), Decimal('100.00'), Decimal('200.00')),
+            ('short', 'loans', Decimal('1000.00'), Decimal('500.00'), Decimal('500.00')),
+        })
+        self.assertEqual(Discrepancy.objects.get(check_name='contributions').itemized_count, 1)
+
+        counts = reconciliation.reconcile_documents(Document.objects.all(), tolerance=Decimal(200))
+        self.assertEqual(counts, {'documents': 2, 'changed': 1})
+        self.assertEqual({name for name, *_ in self.get_discrepancies()}, {'short'})
+        self.assertEqual(Discrepancy.objects.get().check_name, 'loans')
+
+    def test_incremental(self):
+        matching = self.create_document('matching', contributions=100)
+        self.give(matching, 100)
+        short = self.create_document('short', contributions=300)
+        transaction = self.give(short, 100)
+        reconciliation.reconcile_documents()
+        self.assertEqual(reconciliation.reconcile_documents(), {'documents': 0, 'changed': 0})
+
+        # Changing a transaction touches its document
+        transaction.amount = 300
+        transaction.save()
+        self.assertEqual(reconciliation.reconcile_documents(), {'documents': 1, 'changed': 1})
+        self.assertEqual(self.get_discrepancies(), set())
+
+        # So do bulk inserts
+        importing.insert_rows(Transaction, [{
+            'category_id': self.contribution.pk, 'payer_entity_id': self.donor.pk,
+            'document_id': matching.pk, 'recorded_date': '2023-01-12', 'amount': Decimal('5.00'),
+        }], use_copy=False)
+        self.assertEqual(reconciliation.reconcile_documents(), {'documents': 1, 'changed': 1})
+        self.assertEqual(self.get_discrepancies(), {
+            ('matching', 'contributions', Decimal('100.00'), Decimal('105.00'), Decimal('-5.00')),
+        })
+
+    def test_document_detail(self):
+        document = self.create_document('short', contributions=300)
+        self.give(document, 100)
+        url = reverse('campaignfinance:documentdetail', args=[document.uuid])
+        self.assertContains(self.client.get(url), 'Not checked against its itemized transactions yet.')
+
+        call_command('reconcile_documents', stdout=mock.MagicMock())
+        response = self.client.get(url)
+        self.assertEqual(
+            [discrepancy.difference for discrepancy in response.context['document'].document_discrepancies.all()],
+            [Decimal('200.00')],
+        )
+        self.assertContains(response, '$200.00')
+
+        call_command('reconcile_documents', '--full', '--tolerance', '500', stdout=mock.MagicMock())
+        self.assertContains(self.client.get(url), 'The itemized transactions match the reported totals.')
+
+    def test_document_with_nothing_reported(self):
+        document = Document.objects.create(
+            category=self.report, name='unreported', filer_entity=self.filer, date_filed='2023-01-15',
+            coverage_start_date='2023-01-01', coverage_end_date='2023-01-15',
+        )
+        self.give(document, 100)
+        reconciliation.reconcile_documents()
+        response = self.client.get(reverse('campaignfinance:documentdetail', args=[document.uuid]))
+        self.assertContains(response, 'Nothing reported to check the itemized transactions against.')
+        self.assertNotContains(response, 'match the reported totals')
+
+
+@override_settings(CONTRIBUTION_RULES={
+    'over_limit': {'limit': '100.00'},
+    'corporate_contribution': {'entity_categories': ['corporation']},
+    'outside_coverage': {},
+})
+class ViolationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.corporation = EntityCategory.objects.create(name='corporation')
+        cls.contribution = TransactionCategory.objects.create(name='contribution')
+        cls.expenditure = TransactionCategory.objects.create(name='expenditure')
+        cls.donor = Entity.objects.create(category=cls.individual, last_name='donor1')
+        cls.company = Entity.objects.create(category=cls.corporation, last_name='company1')
+        cls.committee = Entity.objects.create(category=cls.individual, last_name='committee1')
+        cls.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=cls.committee)
+        cls.report = DocumentCategory.objects.create(name='report')
+        cls.document = Document.objects.create(
+            category=cls.report, name='report1', filer_entity=cls.committee, date_filed='2023-02-01',
+            coverage_start_date='2023-01-01', coverage_end_date='2023-01-31',
+        )
+
+    def give(self, payer, amount, recorded_date='2023-01-15', category=None):
+        return Transaction.objects.create(
+            category=category or self.contribution, payer_entity=payer, payee_entity=self.committee,
+            campaign=self.campaign, document=self.document, recorded_date=recorded_date, amount=amount,
+        )
+
+    def get_violations(self):
+        return set(Violation.objects.values_list('transaction__amount', 'category__name', 'amount'))
+
+    def test_flagged_on_save(self):
+        self.give(self.donor, 60)
+        self.give(self.donor, 70, '2023-01-20')
+        self.give(self.company, 5)
+        self.give(self.donor, 8, '2023-03-01')
+        self.give(self.donor, 500, '2023-03-01', category=self.expenditure)
+
+        self.assertEqual(self.get_violations(), {
+            (Decimal('70.00'), 'over_limit', Decimal('30.00')),
+            (Decimal('5.00'), 'corporate_contribution', Decimal('5.00')),
+            (Decimal('8.00'), 'over_limit', Decimal('8.00')),
+            (Decimal('8.00'), 'outside_coverage', Decimal('8.00')),
+        })
+        self.assertEqual(
+            Violation.objects.get(category__name='over_limit', amount=30).detail,
+            "Brings the donor's total to $130.00, over the $100.00 limit",
+        )
+
+        # Flagging the whole history finds the same
+        flagged = self.get_violations()
+        counts = violations.flag_violations()
+        self.assertEqual(counts, {'over_limit': 2, 'corporate_contribution': 1, 'outside_coverage': 1})
+        self.assertEqual(self.get_violations(), flagged)
+
+    def test_rechecked_on_change(self):
+        self.give(self.donor, 60)
+        transaction = self.give(self.donor, 70, '2023-01-20')
+        transaction.amount = 30
+        transaction.save()
+        self.assertEqual(self.get_violations(), set())
+        transaction.recorded_date = '2022-12-31'
+        transaction.save()
+        self.assertEqual(self.get_violations(), {(Decimal('30.00'), 'outside_coverage', Decimal('30.00'))})
+        transaction.delete()
+        self.assertEqual(self.get_violations(), set())
+
+    def test_running_total_in_date_order(self):
+        later = self.give(self.donor, 80, '2023-01-20')
+        earlier = self.give(self.donor, 80, '2023-01-10')
+        # Saving the earlier one flags the later one
+        self.assertEqual(Violation.objects.get().transaction, later)
+
+        call_command('flag_violations', stdout=mock.MagicMock())
+        self.assertEqual(Violation.objects.get().transaction, later)
+
+        response = self.client.get(reverse('campaignfinance:transactiondetail', args=[later.uuid]))
+        self.assertContains(response, "over the $100.00 limit")
+
+        earlier.recorded_date = '2023-01-25'
+        earlier.save()
+        self.assertEqual(Violation.objects.get().transaction, earlier)
+        earlier.delete()
+        self.assertFalse(Violation.objects.exists())
+
+    def test_limit_per_election(self):
+        primary, general = (
+            Election.objects.create(date=election_date) for election_date in ('2023-03-07', '2023-11-07')
+        )
+        Campaign.objects.filter(pk=self.campaign.pk).update(election=primary)
+        runoff = Campaign.objects.create(
+            name='campaign2', registration_date='2023-01-01', committee_entity=self.committee, election=general,
+        )
+        self.give(self.donor, 80)
+        second = self.give(self.donor, 80, '2023-01-20')
+        second.campaign = runoff
+        second.save()
+        self.assertFalse(Violation.objects.exists())
+        self.assertEqual(violations.flag_violations()['over_limit'], 0)
+
+        second.campaign = self.campaign
+        second.save()
+        self.assertEqual(self.get_violations(), {(Decimal('80.00'), 'over_limit', Decimal('60.00'))})
+        self.assertEqual(violations.flag_violations()['over_limit'], 1)
+
+    def test_donor_totals_follow_changes(self):
+        def get_totals():
+            return set(DonorElectionTotal.objects.values_list('payer_entity', 'election', 'total', 'count'))
+
+        general = Election.objects.create(date='2023-11-07')
+        runoff = Campaign.objects.create(
+            name='campaign2', registration_date='2023-01-01', committee_entity=self.committee, election=general,
+        )
+        first = self.give(self.donor, 60)
+        second = self.give(self.donor, 70, '2023-01-10')
+        self.assertEqual(get_totals(), {(self.donor.pk, None, Decimal('130.00'), 2)})
+        # Counted back from the total, the earlier one is under the limit
+        self.assertEqual(self.get_violations(), {(Decimal('60.00'), 'over_limit', Decimal('30.00'))})
+
+        second.amount = 20
+        second.save()
+        self.assertEqual(get_totals(), {(self.donor.pk, None, Decimal('80.00'), 2)})
+        first.campaign = runoff
+        first.save()
+        self.assertEqual(get_totals(), {
+            (self.donor.pk, None, Decimal('20.00'), 1), (self.donor.pk, general.pk, Decimal('60.00'), 1),
+        })
+        self.assertEqual(self.get_violations(), set())
+
+        second.delete()
+        totals = get_totals()
+        self.assertEqual(totals, {(self.donor.pk, general.pk, Decimal('60.00'), 1)})
+        violations.flag_violations()
+        self.assertEqual(get_totals(), totals)
+
+    def test_unknown_coverage_not_flagged(self):
+        Document.objects.filter(pk=self.document.pk).update(coverage_start_date=None, coverage_end_date=None)
+        self.give(self.donor, 8, '2023-03-01')
+        self.assertFalse(Violation.objects.exists())
+        self.assertEqual(violations.flag_violations()['outside_coverage'], 0)
+
+    @override_settings(CONTRIBUTION_RULES={})
+    def test_rules_turned_off(self):
+        self.give(self.company, 500)
+        self.assertEqual(violations.flag_violations(), {})
+        self.assertFalse(Violation.objects.exists())
+
+
+# Pool threads have connections of their own, outside a TestCase's transaction
+@override_settings(DATABASE_POOL_SIZE=2, PAGE_CACHE_TIMEOUT=0)
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        self.individual = EntityCategory.objects.create(name='individual')
+        self.contribution = TransactionCategory.objects.create(name='contribution')
+        self.donor = Entity.objects.create(category=self.individual, first_name='Jane', last_name='Donor')
+        self.committee = Entity.objects.create(category=self.individual, last_name='Committee')
+        self.campaign = Campaign.objects.create(name='campaign1', registration_date='2023-01-01', committee_entity=self.committee)
+        Transaction.objects.create(
+            category=self.contribution, payer_entity=self.donor, payee_entity=self.committee,
+            campaign=self.campaign, recorded_date='2023-01-01', amount=100,
+        )
+        self.threads = []
+        call_pooled = asyncviews.call_pooled
+
+        def record_thread(func, timings=None):
+            self.threads.append(threading.current_thread().name)
+            return call_pooled(func, timings)
+
+        patcher = mock.patch.object(asyncviews, 'call_pooled', record_thread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_are_fetched_on_the_pool(self):
+        for url in [
+            reverse('campaignfinance:entitydetail', args=[self.donor.uuid]),
+            reverse('campaignfinance:campaigndetail', args=[self.campaign.uuid]),
+            reverse('campaignfinance:search') + '?q=donor',
+        ]:
+            self.threads = []
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'Donor')
+            self.assertTrue(self.threads, url)
+            self.assertTrue(all(name.startswith('database-pool') for name in self.threads), url)
+            # Including the queries the pool ran
+            self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    def test_sections_match_the_page(self):
+        response = self.client.get(reverse('campaignfinance:entitydetail', args=[self.donor.uuid]))
+        self.assertEqual(response.context['object'], self.donor)
+        self.assertEqual([t.amount for t in response.context['payer_transactions']], [100])
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # For the seeded document files
+        media = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(media.cleanup)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media.name))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.seed(transactions=300, entities=50)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_every_url_is_benchmarked(self):
+        results = benchmark.run(repeat=2)
+        self.assertIn('entitydetail', results)
+        self.assertIn('apidetail', results)
+        for name, result in results.items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'], name)
+        self.assertGreater(results['entitydetail']['queries'], 0)
+
+    def test_nothing_is_skipped(self):
+        self.assertEqual([name for name, url in benchmark.get_urls().items() if url is None], [])
+
+    def test_common_search_term(self):
+        # Every seeded address is in texas
+        self.assertGreater(len(search.search('texas', limit=1000)), 25)
+        with override_settings(PAGE_CACHE_TIMEOUT=0):
+            result = benchmark.measure(self.client, reverse('campaignfinance:search') + '?q=texas', repeat=10)
+        self.assertEqual(result['status'], 200)
+        self.assertLess(result['p95_ms'], 50)
+
+    def test_regressions(self):
+        result = {'url': '/', 'status': 200, 'queries': 5, 'p50_ms': 10, 'p95_ms': 20, 'peak_memory_kb': 100}
+        self.assertEqual(benchmark.find_regressions({'view': result}, {'view': result}), [])
+        slower = {**result, 'queries': 6, 'p95_ms': 40, 'peak_memory_kb': 200}
+        self.assertEqual(len(benchmark.find_regressions({'view': slower}, {'view': result})), 3)
+        # Not new views
+        self.assertEqual(benchmark.find_regressions({'view': slower}, {}), [])
+
+    def test_command_fails_on_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'baseline.json'
+            call_command('benchmark_views', 'entitydetail', '--repeat', '2', '--output', str(output), stdout=mock.MagicMock())
+            baseline = json.loads(output.read_text())
+            self.assertEqual(baseline['scale']['transactions'], 300)
+            self.assertEqual(list(baseline['views']), ['entitydetail'])
+
+            baseline['views']['entitydetail']['queries'] -= 1
+            output.write_text(json.dumps(baseline))
+            with self.assertRaisesMessage(CommandError, 'entitydetail'):
+                call_command('benchmark_views', 'entitydetail', '--repeat', '2', '--baseline', str(output), stdout=mock.MagicMock())
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.entities = [Entity.objects.create(category=cls.individual, last_name=f'entity{i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_server_timing(self):
+        url = reverse('campaignfinance:entitydetail', args=[self.entities[0].uuid])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        timing = dict(
+            (metric.split(';')[0], metric) for metric in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'db', 'tpl', 'app', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+        self.assertNotEqual(timing['tpl'], 'tpl;dur=0.0')
+
+    async def test_server_timing_under_asgi(self):
+        # Sync views run in a thread of their own under ASGI
+        for url in [
+            reverse('campaignfinance:entityindex'),
+            reverse('campaignfinance:entitydetail', args=[self.entities[0].uuid]),
+        ]:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"', url)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        url = reverse('campaignfinance:entityindex')
+        with self.assertLogs('campaignfinance.instrumentation', 'WARNING') as logs:
+            self.client.get(url)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], url)
+        self.assertEqual(entry['view'], 'campaignfinance:entityindex')
+        self.assertGreater(entry['queries'], 0)
+
+    def test_repeated_queries(self):
+        timings = instrumentation.RequestTimings()
+        with instrumentation.record(timings):
+            for entity in self.entities:
+                Entity.objects.get(pk=entity.pk)
+            Entity.objects.filter(pk__in=[1, 2]).exists()
+            Entity.objects.filter(pk__in=[1, 2, 3]).exists()
+        self.assertEqual(timings.queries, 5)
+        self.assertEqual([count for sql, count in timings.get_repeated()], [3, 2])
+        self.assertIn('IN (...)', timings.get_repeated()[1][0])
+
+        # Not once the request is over
+        Entity.objects.count()
+        self.assertEqual(timings.queries, 5)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            instrumentation.get_fingerprint("SELECT 1 FROM t WHERE a = 'x' AND b IN (%s, %s) LIMIT 21"),
+            'SELECT ? FROM t WHERE a = ? AND b IN (...) LIMIT ?',
+        )
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=600)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.individual = EntityCategory.objects.create(name='individual')
+        cls.entity = Entity.objects.create(category=cls.individual, last_name='entity1')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_value(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_cache_lookups(self):
+        route = 'campaignfinance:entitydetail'
+        requests = self.get_value('powertracker_requests_total', route=route, method='GET', status='200')
+        latencies = self.get_value('powertracker_request_seconds_count', route=route)
+        hits = self.get_value('powertracker_page_cache_lookups_total', kind='page', result='hit')
+        misses = self.get_value('powertracker_page_cache_lookups_total', kind='page', result='miss')
+
+        url = reverse('campaignfinance:entitydetail', args=[self.entity.uuid])
+        self.client.get(url)
+        self.client.get(url)
+
+        self.assertEqual(self.get_value('powertracker_requests_total', route=route, method='GET', status='200'), requests + 2)
+        self.assertEqual(self.get_value('powertracker_request_seconds_count', route=route), latencies + 2)
+        self.assertEqual(self.get_value('powertracker_page_cache_lookups_total', kind='page', result='miss'), misses + 1)
+        self.assertEqual(self.get_value('powertracker_page_cache_lookups_total', kind='page', result='hit'), hits + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/no/such/page')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn('powertracker_request_queries_bucket{', content)
+        self.assertIn('route="unmatched"', content)
+
+
+class StaticFilesTests(TestCase):
+    def test_collectstatic_hashes_and_compresses(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storages = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'campaignfinance.storage.CompressedManifestStaticFilesStorage'},
+        }
+        with override_settings(STATIC_ROOT=directory.name, STORAGES=storages):
+            call_command('collectstatic', '--no-input', verbosity=0)
+            url = static('campaignfinance/style.css')
+            self.assertRegex(url, r'/campaignfinance/style\.[0-9a-f]{12}\.css$')
+
+            root = Path(directory.name)
+            hashed = root / url.removeprefix(settings.STATIC_URL).lstrip('/')
+            self.assertEqual(gzip.decompress(Path(f'{hashed}.gz').read_bytes()), hashed.read_bytes())
+            # Images are compressed already
+            self.assertFalse(list(root.glob('campaignfinance/favicon.*.png.gz')))
+
+
+class DocumentFileViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = DocumentCategory.objects.create(name='campaign finance report')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.document = Document.objects.create(
+            category=self.category, name='report1', date_filed='2023-01-01',
+            coverage_start_date='2023-01-01', coverage_end_date='2023-01-31',
+            uploaded_file=SimpleUploadedFile('report1.pdf', b'%PDF-1.4 report'),
+        )
+        self.url = reverse('campaignfinance:documentfile', args=[self.document.uuid])
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=1)
+    def test_nginx_sends_the_file(self):
+        Document.objects.filter(pk=self.document.pk).update(uploaded_file='2023/report 1.pdf')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/media/2023/report%201.pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('inline', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+        # nginx answers conditional and range requests from the file
+        self.assertNotIn('ETag', response)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=0)
+    def test_django_sends_the_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 report')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=0)
+    def test_missing_file(self):
+        self.document.uploaded_file.storage.delete(self.document.uploaded_file.name)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_api_links_to_the_file(self):
+        response = self.client.get(reverse('campaignfinance:apidetail', args=['document', self.document.uuid]))
+        self.assertEqual(response.json()['uploaded_file'], self.url)
+
+    def test_document_without_a_file(self):
+        self.document.uploaded_file = ''
+        self.document.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(reverse('campaignfinance:documentdetail', args=[self.document.uuid]))
+        self.assertNotContains(response, self.url)
+
+    def test_document_page_links_to_the_file(self):
+        response = self.client.get(reverse('campaignfinance:documentdetail', args=[self.document.uuid]))
+        self.assertContains(response, f'href="{self.url}"')
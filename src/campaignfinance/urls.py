@@ -2,7 +2,7 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from . import views
+from . import api, views
 
 app_name = 'campaignfinance'
 urlpatterns = [
@@ -10,14 +10,25 @@ urlpatterns = [
 
     path('glossary', views.glossaryindex, name='glossaryindex'),
 
+    path('search', views.SearchView.as_view(), name='search'),
+
+    path('api/v1/', api.ApiRootView.as_view(), name='apiroot'),
+    path('api/v1/<slug:resource>/', api.ApiListView.as_view(), name='apilist'),
+    path('api/v1/<slug:resource>/<uuid:uuid>/', api.ApiDetailView.as_view(), name='apidetail'),
+
     path('entity', views.EntityIndexView.as_view(), name='entityindex'),
+    path('entity/export.<slug:format>', views.EntityExportView.as_view(), name='entityexport'),
     path('entity/<uuid:uuid>/', views.EntityDetailView.as_view(), name='entitydetail'),
+    path('entity/<uuid:uuid>/connections', views.EntityConnectionsView.as_view(), name='entityconnections'),
 
     path('industrysector', views.IndustrySectorIndexView.as_view(), name='industrysectorindex'),
     path('industrysector/<uuid:uuid>/', views.IndustrySectorDetailView.as_view(), name="industrysectordetail"),
 
     path('industry', views.IndustryIndexView.as_view(), name='industryindex'),
 
+    path('analytics/sectors', views.SectorTotalsView.as_view(), name='sectortotals'),
+    path('analytics/places', views.PlaceTotalsView.as_view(), name='placetotals'),
+
     path('externalid', views.ExternalIdIndexView.as_view(), name='externalidindex'),
     path('externalid/<uuid:uuid>/', views.ExternalIdDetailView.as_view(), name='externaliddetail'),
 
@@ -37,6 +48,7 @@ urlpatterns = [
 
     path('document', views.DocumentIndexView.as_view(), name='documentindex'),
     path('document/<uuid:uuid>/', views.DocumentDetailView.as_view(), name='documentdetail'),
+    path('document/<uuid:uuid>/file', views.DocumentFileView.as_view(), name='documentfile'),
 
     path('reportedtotals', views.ReportedTotalsIndexView.as_view(), name='reportedtotalsindex'),
     path('reportedtotals/<uuid:uuid>/', views.ReportedTotalsDetailView.as_view(), name='reportedtotalsdetail'),
@@ -45,6 +57,7 @@ urlpatterns = [
     path('reportedsubtotals/<uuid:uuid>/', views.ReportedSubtotalsDetailView.as_view(), name='reportedsubtotalsdetail'),
 
     path('transaction', views.TransactionIndexView.as_view(), name='transactionindex'),
+    path('transaction/export.<slug:format>', views.TransactionExportView.as_view(), name='transactionexport'),
     path('transaction/<uuid:uuid>/', views.TransactionDetailView.as_view(), name='transactiondetail'),
 
     path('address', views.AddressIndexView.as_view(), name='addressindex'),
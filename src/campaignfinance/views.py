@@ -1,6 +1,14 @@
+import mimetypes
+import os
+import uuid
+from datetime import date
+from urllib.parse import quote
+
 from django.views import generic
 from django.shortcuts import render
-from django.http import Http404
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import content_disposition_header
 
 # Models from campaign finance
 from .models import (EntityCategory, Entity, ExternalId, IndustrySector, Industry,
@@ -9,28 +17,93 @@ from .models import (EntityCategory, Entity, ExternalId, IndustrySector, Industr
                     DocumentCategory, Document, ReportedTotals,
                     ReportedSubtotals, TransactionCategory, Transaction,
                     AddressCategory, Address, PhoneNumber, Email, Website,
-                    AssumedName)
+                    AssumedName, SearchEntry)
+from . import analytics
+from .asyncviews import AsyncDetailMixin, fetch
+from .categories import filter_by_category
+from .conditional import ConditionalDetailMixin, ConditionalListMixin
+from .exports import ExportMixin
+from .graph import get_graph
+from .mixins import RelatedObjectsMixin
+from .pagecache import PageCacheMixin, get_tag, get_index_tag, get_or_set_fragment
+from .pagination import KeysetPaginationMixin, OffsetPage
+from .search import SEARCH_MODELS, search
 
 # Add easy urls like /spending and /giving that go to transaction
 # fields with relevant arguments to only show relavent transactions
 
 
-class HomePageIndex(generic.ListView):
+class HomePageIndex(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, generic.ListView):
+    model = Transaction
     template_name = 'campaignfinance/index.html'
     context_object_name = 'transaction_list'
 
+    select_related = ('category', 'payer_entity', 'payee_entity')
+
     def get_queryset(self):
-        return Transaction.objects.filter(category__name='contribution').order_by('-recorded_date')[:10]
+        queryset = filter_by_category(super().get_queryset(), TransactionCategory, 'contribution')
+        return queryset.order_by('-recorded_date')[:10]
 
 
 def glossaryindex(request):
     return render(request, 'campaignfinance/glossaryindex.html')
 
 
-class EntityIndexView(generic.ListView):
+class SearchView(generic.TemplateView):
+    template_name = 'campaignfinance/search.html'
+    paginate_by = 25
+    # Ranked results get less relevant quickly, deep offsets are not worth scanning
+    max_pages = 40
+
+    def get_page_number(self):
+        try:
+            number = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404("Invalid page number.")
+        if not 1 <= number <= self.max_pages:
+            raise Http404("Invalid page number.")
+        return number
+
+    def get_kind(self):
+        kind = self.request.GET.get('kind')
+        return kind if kind in SEARCH_MODELS else None
+
+    async def get(self, request, *args, **kwargs):
+        number = self.get_page_number()
+        query = request.GET.get('q', '').strip()
+        self.results = await fetch(
+            lambda: search(query, self.get_kind(), limit=self.paginate_by + 1, offset=(number - 1) * self.paginate_by)
+        )
+        response = self.render_to_response(self.get_context_data(**kwargs))
+        await fetch(response.render)
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        kind = self.get_kind()
+        number = self.get_page_number()
+
+        results = self.results
+        has_next = len(results) > self.paginate_by and number < self.max_pages
+        page = OffsetPage(results[:self.paginate_by], self.request, number, has_next)
+
+        context['query'] = query
+        context['kind'] = kind
+        context['kind_choices'] = SearchEntry.KIND_CHOICES
+        context['page_obj'] = page
+        context['is_paginated'] = page.has_other_pages()
+        context['result_list'] = page.object_list
+        return context
+
+
+class EntityIndexView(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
+    model = Entity
     template_name = 'campaignfinance/entityindex.html'
     context_object_name = 'entity_list'
 
+    select_related = ('category', 'industry')
+
     filter_categories = {
         'select': None,
         'person': 'individual',
@@ -55,10 +128,9 @@ class EntityIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'last name')]
 
         if category_name is not None:
-            category = EntityCategory.objects.get(name=category_name)
-            queryset = Entity.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), EntityCategory, category_name).order_by(sort_by)
         else:
-            queryset = Entity.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -75,60 +147,219 @@ class EntityIndexView(generic.ListView):
         return context
 
 
-class EntityDetailView(generic.DetailView):
+class EntityExportView(ExportMixin, EntityIndexView):
+    export_fields = {
+        'uuid': 'uuid',
+        'category': 'category__name',
+        'prefix': 'prefix',
+        'first_name': 'first_name',
+        'middle_name': 'middle_name',
+        'last_name': 'last_name',
+        'suffix': 'suffix',
+        'occupation': 'occupation',
+        'industry': 'industry__name',
+    }
+    export_name = 'entities'
+
+
+class EntityDetailView(PageCacheMixin, AsyncDetailMixin, ConditionalDetailMixin, RelatedObjectsMixin, generic.DetailView):
     model = Entity
     template_name = 'campaignfinance/entitydetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('category', 'industry')
+
+    # Busy committees have thousands of transactions, only the latest are shown
+    # with a link to the full transaction index
+    transaction_limit = 25
+
+    def get_transactions(self, role, counterparty):
+        queryset = (
+            Transaction.objects.filter(**{role: self.object}).select_related('category', counterparty)
+            .order_by('-recorded_date', '-pk')
+        )
+        # One extra row tells the template whether to show the "see all" link
+        return list(queryset[:self.transaction_limit + 1])
+
+    def get_sections(self):
+        entity = self.object
+
+        def get_list(related, *select_related):
+            return lambda: list(related.select_related(*select_related))
+
+        # Every section is one query into an evaluated list, so the template
+        # never has to call .exists() or follow foreign keys
+        return {
+            'payer_transactions': lambda: self.get_transactions('payer_entity', 'payee_entity'),
+            'payee_transactions': lambda: self.get_transactions('payee_entity', 'payer_entity'),
+            'candidate_campaigns': get_list(entity.entity_candidate_campaigns, 'office_sought'),
+            'holder_offices': get_list(entity.entity_holder_offices, 'government_entity'),
+            'former_offices': get_list(entity.entity_former_offices, 'office__government_entity'),
+            'parent_relationships': get_list(entity.entity_parent_relationships, 'category', 'child_entity'),
+            'child_relationships': get_list(entity.entity_child_relationships, 'category', 'parent_entity'),
+            'residences': get_list(entity.entity_residences, 'category'),
+            'owned_addresses': get_list(entity.entity_owners, 'category'),
+            'emails': get_list(entity.entity_email_owners),
+            'phone_numbers': get_list(entity.entity_phone_number_owners),
+            'websites': get_list(entity.entity_website_owners),
+            'external_ids': get_list(entity.entity_child_ids, 'parent_entity'),
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for name in ('payer_transactions', 'payee_transactions'):
+            transactions = context[name]
+            context[name] = transactions[:self.transaction_limit]
+            context[f'{name}_truncated'] = len(transactions) > self.transaction_limit
+        return context
+
+    def get_cache_tags(self):
+        sections = self.sections
+        return [
+            get_tag(self.object),
+            *(get_tag(address) for address in sections['residences'] + sections['owned_addresses']),
+            *(get_tag(campaign) for campaign in sections['candidate_campaigns']),
+        ]
+
 
-class IndustrySectorIndexView(generic.ListView):
+class EntityConnectionsView(RelatedObjectsMixin, generic.DetailView):
+    """Everything within a few hops of an entity, its money flow and, with ?to=<uuid>, the money trail to another entity."""
+    model = Entity
+    template_name = 'campaignfinance/entityconnections.html'
+    slug_field = 'uuid'
+    slug_url_kwarg = 'uuid'
+
+    select_related = ('category',)
+
+    max_hops = 3
+    connection_limit = 200
+    flow_limit = 10
+
+    def get_hops(self):
+        try:
+            hops = int(self.request.GET.get('hops', 2))
+        except ValueError:
+            raise Http404("Invalid number of hops.")
+        if not 1 <= hops <= self.max_hops:
+            raise Http404("Invalid number of hops.")
+        return hops
+
+    def get_target(self):
+        try:
+            target = uuid.UUID(self.request.GET.get('to', ''))
+        except ValueError:
+            return None
+        return Entity.objects.filter(uuid=target).first()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        entity = self.object
+        graph = get_graph()
+        hops = self.get_hops()
+
+        connections = graph.neighborhood('entity', entity.pk, hops=hops, limit=self.connection_limit)
+        flow = graph.flow(entity.pk, limit=self.flow_limit)
+        target = self.get_target()
+        path = graph.money_path(entity.pk, target.pk) if target else None
+
+        # One query per kind of object for everything the graph returned
+        wanted = {'entity': {entity.pk}, 'address': set(), 'campaign': set()}
+        for hop in connections:
+            wanted[hop.node[0]].add(hop.node[1])
+            wanted[hop.parent[0]].add(hop.parent[1])
+        for pk, _, _ in flow.senders + flow.recipients:
+            wanted['entity'].add(pk)
+        for step in path or ():
+            wanted['entity'].update((step.payer, step.payee))
+        objects = {
+            'entity': Entity.objects.select_related('category').in_bulk(wanted['entity']),
+            'address': Address.objects.in_bulk(wanted['address']),
+            'campaign': Campaign.objects.in_bulk(wanted['campaign']),
+        }
+
+        # The graph of another process may still hold rows deleted since it was built
+        entities = objects['entity']
+        context['hops'] = hops
+        context['hop_choices'] = range(1, self.max_hops + 1)
+        context['connections'] = [
+            {
+                'object': objects[hop.node[0]][hop.node[1]],
+                'kind': hop.node[0],
+                'via': objects[hop.parent[0]].get(hop.parent[1]),
+                'hop': hop,
+            } for hop in connections if hop.node[1] in objects[hop.node[0]]
+        ]
+        context['connections_truncated'] = len(connections) >= self.connection_limit
+        context['received'] = flow.received
+        context['given'] = flow.given
+        context['senders'] = [(entities[pk], amount, count) for pk, amount, count in flow.senders if pk in entities]
+        context['recipients'] = [(entities[pk], amount, count) for pk, amount, count in flow.recipients if pk in entities]
+        context['target'] = target
+        context['path'] = None
+        if path is not None and all(step.payer in entities and step.payee in entities for step in path):
+            context['path'] = [(entities[step.payer], entities[step.payee], step.amount, step.count) for step in path]
+        return context
+
+
+class IndustrySectorIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
+    model = IndustrySector
     template_name = 'campaignfinance/industrysectorindex.html'
     context_object_name = 'industry_sector_list'
 
     # default sort by sector name
 
     def get_queryset(self):
-        return IndustrySector.objects.all().order_by('name')
+        return super().get_queryset().order_by('name')
 
 
-class IndustrySectorDetailView(generic.DetailView):
+class IndustrySectorDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = IndustrySector
     template_name = 'campaignfinance/industrysectordetail.html'
     slug_field = "uuid"
     slug_url_kwarg = "uuid"
 
+    prefetch_related = ('sector_industries',)
 
-class IndustryIndexView(generic.ListView):
+
+class IndustryIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Industry
     template_name = 'campaignfinance/industryindex.html'
     context_object_name = "industry_list"
 
+    select_related = ('sector',)
+
     def get_queryset(self):
-        return Industry.objects.all().order_by('name')
+        return super().get_queryset().order_by('name')
 
 
-class ExternalIdIndexView(generic.ListView):
+class ExternalIdIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = ExternalId
     template_name = 'campaignfinance/externalidindex.html'
     context_object_name = 'external_id_list'
 
+    select_related = ('parent_entity', 'child_entity')
+
     def get_queryset(self):
-        return ExternalId.objects.all().order_by('pk')
+        return super().get_queryset().order_by('pk')
 
 
-class ExternalIdDetailView(generic.DetailView):
+class ExternalIdDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = ExternalId
     template_name = 'campaignfinance/externaliddetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('parent_entity', 'child_entity')
 
-class RelationshipIndexView(generic.ListView):
+
+class RelationshipIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Relationship
     template_name = 'campaignfinance/relationshipindex.html'
     context_object_name = "relationship_list"
 
+    select_related = ('category', 'parent_entity', 'child_entity')
+
     filter_categories = {
         'select': None,
         'spouse': 'spouse',
@@ -154,10 +385,9 @@ class RelationshipIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'category')]
 
         if category_name is not None:
-            category = RelationshipCategory.objects.get(name=category_name)
-            queryset = Relationship.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), RelationshipCategory, category_name).order_by(sort_by)
         else:
-            queryset = Relationship.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -175,18 +405,22 @@ class RelationshipIndexView(generic.ListView):
         return context
 
 
-class RelationshipDetailView(generic.DetailView):
+class RelationshipDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = Relationship
     template_name = 'campaignfinance/relationshipdetail.html'
     slug_field = "uuid"
     slug_url_kwarg = "uuid"
 
+    select_related = ('category', 'parent_entity', 'child_entity')
+
 
-class CampaignIndexView(generic.ListView):
+class CampaignIndexView(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Campaign
     template_name = 'campaignfinance/campaignindex.html'
     context_object_name = "campaign_list"
 
+    select_related = ('category', 'office_sought')
+
     filter_categories = {
         'select category': None,
         'candidate': 'candidate',
@@ -209,10 +443,9 @@ class CampaignIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'name')]
 
         if category_name is not None:
-            category = CampaignCategory.objects.get(name=category_name)
-            queryset = Campaign.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), CampaignCategory, category_name).order_by(sort_by)
         else:
-            queryset = Campaign.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -231,18 +464,85 @@ class CampaignIndexView(generic.ListView):
 
 
 
-class CampaignDetailView(generic.DetailView):
+class CampaignDetailView(PageCacheMixin, AsyncDetailMixin, ConditionalDetailMixin, RelatedObjectsMixin, generic.DetailView):
     model = Campaign
     template_name = 'campaignfinance/campaigndetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = (
+        'category',
+        'candidate_entity',
+        'treasurer_entity',
+        'committee_entity',
+        'office_sought',
+        'election',
+        'campaign_summary',
+    )
+
+    # The page shows the precomputed summary and only the latest transactions,
+    # with links to the full transaction index
+    donor_limit = 10
+    industry_limit = 10
+    transaction_limit = 25
+
+    def get_latest_transactions(self, **filters):
+        counterparty = 'payer_entity' if 'payee_entity_id' in filters else 'payee_entity'
+        queryset = Transaction.objects.filter(**filters).select_related(counterparty).order_by('-recorded_date', '-pk')
+        transactions = list(queryset[:self.transaction_limit + 1])
+        return transactions[:self.transaction_limit], len(transactions) > self.transaction_limit
+
+    def get_sections(self):
+        campaign = self.object
+        tags = self.get_cache_tags()
+        # Also cached for signed in readers, who skip the page cache
+        sections = {
+            'top_donors': lambda: get_or_set_fragment(
+                f'campaign-top-donors:{campaign.pk}', tags,
+                lambda: list(
+                    campaign.campaign_donor_totals.select_related('donor_entity').order_by('-total', 'pk')[:self.donor_limit]
+                ),
+            ),
+            'category_totals': lambda: get_or_set_fragment(
+                f'campaign-category-totals:{campaign.pk}', tags,
+                lambda: list(campaign.campaign_category_totals.select_related('category').order_by('category__name')),
+            ),
+            'top_industries': lambda: get_or_set_fragment(
+                f'campaign-top-industries:{campaign.pk}', tags,
+                lambda: list(
+                    campaign.campaign_industry_totals.select_related('industry__sector')
+                    .order_by('-total', 'pk')[:self.industry_limit]
+                ),
+            ),
+        }
+        if campaign.committee_entity_id is not None:
+            sections['contributions'] = lambda: self.get_latest_transactions(payee_entity_id=campaign.committee_entity_id)
+            sections['expenditures'] = lambda: self.get_latest_transactions(payer_entity_id=campaign.committee_entity_id)
+        return sections
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['summary'] = getattr(self.object, 'campaign_summary', None)
+        for name in ('contributions', 'expenditures'):
+            context[name], context[f'{name}_truncated'] = context.get(name, ([], False))
+        return context
+
+    def get_cache_tags(self):
+        # Its summary and transactions are the committee's
+        campaign = self.object
+        tags = [get_tag(campaign)]
+        if campaign.committee_entity_id is not None:
+            tags.append(get_tag(Entity, campaign.committee_entity_id))
+        return tags
 
-class OfficeIndexView(generic.ListView):
+
+class OfficeIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Office
     template_name = 'campaignfinance/officeindex.html'
     context_object_name = 'office_list'
 
+    select_related = ('government_entity', 'holder_entity')
+
     sort_by_fields = {
         'select': 'name',
         'title': 'name',
@@ -254,7 +554,7 @@ class OfficeIndexView(generic.ListView):
 
     def get_queryset(self):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'title')]
-        queryset = Office.objects.all().order_by(sort_by)
+        queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -268,18 +568,23 @@ class OfficeIndexView(generic.ListView):
         return context
 
 
-class OfficeDetailView(generic.DetailView):
+class OfficeDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = Office
     template_name = 'campaignfinance/officedetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('government_entity', 'holder_entity')
+    prefetch_related = ('office_former_holders__entity',)
+
 
-class FormerOfficeHolderIndexView(generic.ListView):
+class FormerOfficeHolderIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = FormerOfficeHolder
     template_name = 'campaignfinance/formerofficeholderindex.html'
     context_object_name = 'former_office_holder_list'
 
+    select_related = ('office', 'entity')
+
     sort_by_fields = {
         'select': 'office',
         'office': 'office',
@@ -288,7 +593,7 @@ class FormerOfficeHolderIndexView(generic.ListView):
 
     def get_queryset(self):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'office')]
-        queryset = FormerOfficeHolder.objects.all().order_by(sort_by)
+        queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -302,11 +607,13 @@ class FormerOfficeHolderIndexView(generic.ListView):
         return context
 
 
-class ElectionIndexView(generic.ListView):
+class ElectionIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Election
     template_name = 'campaignfinance/electionindex.html'
     context_object_name = 'election_list'
 
+    select_related = ('category', 'government_entity')
+
     filter_categories = {
         'select': None,
         'primary': 'primary',
@@ -330,10 +637,9 @@ class ElectionIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'date')]
 
         if category_name is not None:
-            category = ElectionCategory.objects.get(name=category_name)
-            queryset = Election.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), ElectionCategory, category_name).order_by(sort_by)
         else:
-            queryset = Election.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -351,18 +657,23 @@ class ElectionIndexView(generic.ListView):
         return context
 
 
-class ElectionDetailView(generic.DetailView):
+class ElectionDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = Election
     template_name = 'campaignfinance/electiondetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('category', 'government_entity')
+    prefetch_related = ('election_campaigns__office_sought',)
+
 
-class DocumentIndexView(generic.ListView):
+class DocumentIndexView(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Document
     template_name = 'campaignfinance/documentindex.html'
     context_object_name = 'document_list'
 
+    select_related = ('category', 'filer_entity')
+
     sort_by_fields = {
         'select': '-date_filed',
         'name': 'name',
@@ -375,7 +686,7 @@ class DocumentIndexView(generic.ListView):
 
     def get_queryset(self):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'date')]
-        queryset = Document.objects.all().order_by(sort_by)
+        queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -391,54 +702,101 @@ class DocumentIndexView(generic.ListView):
         return context
 
 
-class DocumentDetailView(generic.DetailView):
+class DocumentDetailView(PageCacheMixin, ConditionalDetailMixin, RelatedObjectsMixin, generic.DetailView):
     model = Document
     template_name = 'campaignfinance/documentdetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = (
+        'category',
+        'filer_entity',
+        'officer_oath_entity',
+        'document_reported_totals',
+        'document_reported_subtotals',
+    )
+    prefetch_related = (
+        'document_discrepancies',
+    )
+
+
+class DocumentFileView(generic.DetailView):
+    """
+    A document's uploaded file. Django only decides what is sent; nginx sends
+    it, with range requests for PDF viewers and sendfile, after an
+    X-Accel-Redirect to its internal MEDIA_URL location, so large files never
+    hold up a worker. Without nginx, as when debugging, Django sends it.
+    """
+    queryset = Document.objects.exclude(uploaded_file='')
+    slug_field = 'uuid'
+    slug_url_kwarg = 'uuid'
 
-class ReportedTotalsIndexView(generic.ListView):
+    def get(self, request, *args, **kwargs):
+        document = self.get_object()
+        name = document.uploaded_file.name
+        if not settings.MEDIA_ACCEL_REDIRECT:
+            try:
+                file = document.uploaded_file.open('rb')
+            except FileNotFoundError:
+                raise Http404("Missing document file.")
+            return FileResponse(file, filename=os.path.basename(name))
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response['Content-Disposition'] = content_disposition_header(False, os.path.basename(name))
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_URL + name)
+        return response
+
+
+class ReportedTotalsIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = ReportedTotals
     template_name = 'campaignfinance/reportedtotalsindex.html'
     context_object_name = 'reported_totals_list'
 
+    select_related = ('document',)
+
     # default sort by source document name
 
     def get_queryset(self):
-        return ReportedTotals.objects.all().order_by('pk')
+        return super().get_queryset().order_by('pk')
 
 
-class ReportedTotalsDetailView(generic.DetailView):
+class ReportedTotalsDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = ReportedTotals
     template_name = 'campaignfinance/reportedtotalsdetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('document__filer_entity',)
+
 
-class ReportedSubtotalsIndexView(generic.ListView):
+class ReportedSubtotalsIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = ReportedSubtotals
     template_name = 'campaignfinance/reportedsubtotalsindex.html'
     context_object_name = 'reported_subtotals_list'
 
+    select_related = ('document',)
+
     # default sort by source document name
 
     def get_queryset(self):
-        return ReportedSubtotals.objects.all().order_by('pk')
+        return super().get_queryset().order_by('pk')
 
 
-class ReportedSubtotalsDetailView(generic.DetailView):
+class ReportedSubtotalsDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = ReportedSubtotals
     template_name = 'campaignfinance/reportedsubtotalsdetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('document__filer_entity',)
 
-class TransactionIndexView(generic.ListView):
+
+class TransactionIndexView(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Transaction
     template_name = 'campaignfinance/transactionindex.html'
     context_object_name = 'transaction_list'
 
+    select_related = ('category', 'payer_entity', 'payee_entity')
+
     filter_categories = {
         'select category': None,
         'contribution': 'contribution',
@@ -456,6 +814,19 @@ class TransactionIndexView(generic.ListView):
         'amount': 'amount',
     }
 
+    # Used by the "see all" links on entity and campaign pages
+    entity_filters = {
+        'payer': 'payer_entity__uuid',
+        'payee': 'payee_entity__uuid',
+        'campaign': 'campaign__uuid',
+    }
+
+    # Inclusive range of recorded dates, as YYYY-MM-DD
+    date_filters = {
+        'start': 'recorded_date__gte',
+        'end': 'recorded_date__lte',
+    }
+
     def get_queryset(self):
         try:
             category_name = self.filter_categories[self.request.GET.get('category')]
@@ -464,10 +835,25 @@ class TransactionIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'date')]
 
         if category_name is not None:
-            category = TransactionCategory.objects.get(name=category_name)
-            queryset = Transaction.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), TransactionCategory, category_name).order_by(sort_by)
         else:
-            queryset = Transaction.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
+
+        for param, lookup in self.entity_filters.items():
+            entity_uuid = self.request.GET.get(param)
+            if entity_uuid:
+                try:
+                    queryset = queryset.filter(**{lookup: uuid.UUID(entity_uuid)})
+                except ValueError:
+                    raise Http404("Invalid entity id.")
+
+        for param, lookup in self.date_filters.items():
+            value = self.request.GET.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+                except ValueError:
+                    raise Http404("Invalid date.")
 
         return queryset
 
@@ -485,18 +871,51 @@ class TransactionIndexView(generic.ListView):
         return context
 
 
-class TransactionDetailView(generic.DetailView):
+class TransactionExportView(ExportMixin, TransactionIndexView):
+    export_fields = {
+        'uuid': 'uuid',
+        'recorded_date': 'recorded_date',
+        'category': 'category__name',
+        'amount': 'amount',
+        'payer_uuid': 'payer_entity__uuid',
+        'payer_last_name': 'payer_entity__last_name',
+        'payer_first_name': 'payer_entity__first_name',
+        'payee_uuid': 'payee_entity__uuid',
+        'payee_last_name': 'payee_entity__last_name',
+        'payee_first_name': 'payee_entity__first_name',
+        'campaign_uuid': 'campaign__uuid',
+        'campaign_name': 'campaign__name',
+        'reason': 'reason',
+        'document_uuid': 'document__uuid',
+    }
+    export_name = 'transactions'
+
+
+class TransactionDetailView(PageCacheMixin, ConditionalDetailMixin, RelatedObjectsMixin, generic.DetailView):
     model = Transaction
     template_name = 'campaignfinance/transactiondetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = (
+        'category',
+        'campaign',
+        'payer_entity',
+        'payee_entity',
+        'document',
+    )
+    prefetch_related = (
+        'transaction_violations__category',
+    )
+
 
-class AddressIndexView(generic.ListView):
+class AddressIndexView(PageCacheMixin, ConditionalListMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Address
     template_name = 'campaignfinance/addressindex.html'
     context_object_name = 'address_list'
 
+    select_related = ('category',)
+
     filter_categories = {
         'select category': None,
         'p.o. box': 'po box',
@@ -521,10 +940,9 @@ class AddressIndexView(generic.ListView):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'street')]
 
         if category_name is not None:
-            category = AddressCategory.objects.get(name=category_name)
-            queryset = Address.objects.filter(category=category).order_by(sort_by)
+            queryset = filter_by_category(super().get_queryset(), AddressCategory, category_name).order_by(sort_by)
         else:
-            queryset = Address.objects.all().order_by(sort_by)
+            queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -542,27 +960,32 @@ class AddressIndexView(generic.ListView):
         return context
 
 
-class AddressDetailView(generic.DetailView):
+class AddressDetailView(PageCacheMixin, ConditionalDetailMixin, RelatedObjectsMixin, generic.DetailView):
     model = Address
     template_name = 'campaignfinance/addressdetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('category',)
+    prefetch_related = ('owners', 'residents')
 
-class PhoneNumberIndexView(generic.ListView):
+
+class PhoneNumberIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = PhoneNumber
     template_name = 'campaignfinance/phonenumberindex.html'
     context_object_name = 'phone_number_list'
 
+    select_related = ('owner',)
+
     sort_by_fields = {
-        'select': 'phone_number',
+        'select': 'area_code',
         'phone number': 'area_code',
-        'owner': 'owner_entity',
+        'owner': 'owner',
     }
 
     def get_queryset(self):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'phone number')]
-        queryset = PhoneNumber.objects.all().order_by(sort_by)
+        queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -576,26 +999,32 @@ class PhoneNumberIndexView(generic.ListView):
         return context
 
 
-class PhoneNumberDetailView(generic.DetailView):
+class PhoneNumberDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = PhoneNumber
     template_name = 'campaignfinance/phonenumberdetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('owner',)
+    prefetch_related = ('associated_entities',)
 
-class EmailIndexView(generic.ListView):
+
+class EmailIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
+    model = Email
     template_name = 'campaignfinance/emailindex.html'
     context_object_name = 'email_list'
 
+    select_related = ('owner',)
+
     sort_by_fields = {
         'select': 'address',
         'address': 'address',
-        'owner': 'owner_entity',
+        'owner': 'owner',
     }
 
     def get_queryset(self):
         sort_by = self.sort_by_fields[self.request.GET.get('sortby', 'address')]
-        queryset = Email.objects.all().order_by(sort_by)
+        queryset = super().get_queryset().order_by(sort_by)
 
         return queryset
 
@@ -608,14 +1037,17 @@ class EmailIndexView(generic.ListView):
         return context
 
 
-class EmailDetailView(generic.DetailView):
+class EmailDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = Email
     template_name = 'campaignfinance/emaildetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('owner',)
+    prefetch_related = ('associated_entities',)
+
 
-class WebsiteIndexView(generic.ListView):
+class WebsiteIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = Website
     template_name = 'campaignfinance/websiteindex.html'
     context_object_name = 'website_list'
@@ -623,17 +1055,20 @@ class WebsiteIndexView(generic.ListView):
     # default sort by website address
 
     def get_queryset(self):
-        return Website.objects.all().order_by('address')
+        return super().get_queryset().order_by('address')
 
 
-class WebsiteDetailView(generic.DetailView):
+class WebsiteDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = Website
     template_name = 'campaignfinance/websitedetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
 
+    select_related = ('owner',)
+    prefetch_related = ('associated_entities',)
+
 
-class AssumedNameIndexView(generic.ListView):
+class AssumedNameIndexView(PageCacheMixin, RelatedObjectsMixin, KeysetPaginationMixin, generic.ListView):
     model = AssumedName
     template_name = 'campaignfinance/assumednameindex.html'
     context_object_name = 'assumed_name_list'
@@ -641,11 +1076,64 @@ class AssumedNameIndexView(generic.ListView):
     # default sort should be alphabetical 
 
     def get_queryset(self):
-        return AssumedName.objects.all().order_by('name')
+        return super().get_queryset().order_by('name')
 
 
-class AssumedNameDetailView(generic.DetailView):
+class AssumedNameDetailView(PageCacheMixin, RelatedObjectsMixin, generic.DetailView):
     model = AssumedName
     template_name = 'campaignfinance/assumednamedetail.html'
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
+
+    prefetch_related = ('associated_entities',)
+
+
+class AnalyticsMixin:
+    """
+    Pages reading the analytics rollups (analytics.py), which change with
+    transactions, donors and addresses without sending signals themselves.
+    """
+    def get_cache_tags(self):
+        return [get_index_tag(model) for model in (Transaction, Entity, Address, Industry, IndustrySector)]
+
+
+class SectorTotalsView(AnalyticsMixin, PageCacheMixin, generic.TemplateView):
+    template_name = 'campaignfinance/sectortotals.html'
+    periods = ('year', 'month')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        period = self.request.GET.get('period')
+        if period not in self.periods:
+            period = self.periods[0]
+
+        sector = None
+        if self.request.GET.get('sector'):
+            try:
+                sector = IndustrySector.objects.get(uuid=uuid.UUID(self.request.GET['sector']))
+            except (ValueError, IndustrySector.DoesNotExist):
+                raise Http404("No such sector.")
+
+        context['period'] = period
+        context['sector'] = sector
+        context['sector_totals'] = analytics.get_sector_totals(period, sector)
+        return context
+
+
+class PlaceTotalsView(AnalyticsMixin, PageCacheMixin, generic.TemplateView):
+    template_name = 'campaignfinance/placetotals.html'
+    place_filters = {'state': 'state_name', 'county': 'county_name'}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        by = self.request.GET.get('by')
+        if by not in analytics.PLACE_GROUPINGS:
+            by = 'county'
+        filters = {
+            lookup: self.request.GET[param] for param, lookup in self.place_filters.items() if self.request.GET.get(param)
+        }
+
+        context['by'] = by
+        context['filters'] = {param: self.request.GET.get(param, '') for param in self.place_filters}
+        context['place_totals'] = analytics.get_place_totals(by, **filters)
+        return context
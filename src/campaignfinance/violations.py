@@ -0,0 +1,375 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+
+from .analytics import CONTRIBUTION
+from .categories import get_category_id, filter_by_category
+from .importing import can_copy, insert_rows
+from .models import (EntityCategory, Entity, Campaign, Document, TransactionCategory, Transaction,
+                     ViolationCategory, Violation, DonorElectionTotal)
+from .summaries import add_to_row
+
+# Flags contributions that break the rules in settings.CONTRIBUTION_RULES,
+# one Violation per rule broken, filed under a ViolationCategory named after
+# the rule.
+#
+# Each contribution is checked when it is saved (signals.py). The donor
+# limit applies per election: everything a donor gave a committee for the
+# election of the transaction's campaign counts, or for no election when
+# it has none. A contribution is over the limit if the donor's running total,
+# in (recorded_date, pk) order, was once it was made. Saving or deleting a
+# transaction changes the running totals after it, so the donor's later
+# contributions in the same election are checked again too.
+#
+# The donor's total for the election is kept in DonorElectionTotal, which the
+# signal handlers add each saved or deleted transaction to. A running total
+# is that total less the transactions after it, which are few as long as
+# contributions are entered roughly in date order, so a save never sums the
+# donor's whole history.
+#
+# flag_violations() (or the management command) flags the whole history in
+# bulk instead, with the running totals in date order, and recomputes the
+# donor totals. Run it after bulk imports, after changing the rules, and
+# after changing the entity categories, campaign committees and elections or
+# coverage dates the rules look at.
+
+CENT = Decimal('0.01')
+
+LimitState = namedtuple(
+    'LimitState', ['pk', 'payer_entity_id', 'payee_entity_id', 'campaign_id', 'recorded_date', 'amount'],
+)
+
+
+def get_limit_state(instance):
+    # Dates and amounts set in code may still be strings or floats
+    recorded_date = instance.recorded_date
+    if isinstance(recorded_date, str):
+        recorded_date = date.fromisoformat(recorded_date)
+    return LimitState(
+        instance.pk,
+        instance.payer_entity_id,
+        instance.payee_entity_id,
+        instance.campaign_id,
+        recorded_date,
+        Decimal(str(instance.amount or 0)),
+    )
+
+
+def later_than(state):
+    """Transactions after the one in state, in running total order."""
+    return Q(recorded_date__gt=state.recorded_date) | Q(recorded_date=state.recorded_date, pk__gt=state.pk)
+
+
+class Rule:
+    name = None
+    description = ''
+
+    def check(self, instance):
+        """(amount, detail) if the contribution breaks the rule, else None."""
+        raise NotImplementedError
+
+    def find(self, contributions):
+        """(transaction id, amount, detail) of every contribution that breaks the rule."""
+        raise NotImplementedError
+
+    def find_later(self, state):
+        """
+        ([transaction id], [(transaction id, amount, detail)]) of the other
+        contributions a change to the transaction in state may have changed
+        the result for, and of those that break the rule, or None.
+        """
+        return None
+
+    def apply(self, state, sign):
+        """Adds (sign=1) or removes (sign=-1) one transaction from what the rule keeps track of."""
+
+    def rebuild(self, batch_size):
+        """Recomputes what the rule keeps track of from the transactions table."""
+
+
+def add_donor_totals(transactions, batch_size=5000):
+    """Adds up the DonorElectionTotal rows of transactions, for donors and committees that have none."""
+    committees = Campaign.objects.filter(committee_entity__isnull=False).values('committee_entity_id')
+    totals = (
+        transactions.filter(payer_entity__isnull=False, payee_entity_id__in=committees)
+        .values('payer_entity_id', 'payee_entity_id', 'campaign__election_id')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+    )
+    DonorElectionTotal.objects.bulk_create([
+        DonorElectionTotal(
+            payer_entity_id=row['payer_entity_id'], payee_entity_id=row['payee_entity_id'],
+            election_id=row['campaign__election_id'], total=row['total'], count=row['count'],
+        ) for row in totals.iterator()
+    ], batch_size=batch_size)
+
+
+class DonorLimitRule(Rule):
+    name = 'over_limit'
+    description = "Contributions that bring a donor's total to a campaign in an election over the limit."
+
+    def __init__(self, limit):
+        self.limit = Decimal(limit)
+
+    def get_violation(self, amount, total):
+        if total <= self.limit:
+            return None
+        detail = f"Brings the donor's total to ${total.quantize(CENT)}, over the ${self.limit} limit"
+        return min(amount, total - self.limit), detail
+
+    def applies(self, state):
+        # Only money given to a campaign's committee counts
+        return (
+            state.payer_entity_id is not None and state.payee_entity_id is not None
+            and Campaign.objects.filter(committee_entity_id=state.payee_entity_id).exists()
+        )
+
+    def get_total_lookup(self, state):
+        """The DonorElectionTotal of the donor, committee and election of the transaction in state."""
+        election_id = None
+        if state.campaign_id is not None:
+            election_id = Campaign.objects.filter(pk=state.campaign_id).values_list('election_id', flat=True).first()
+        return {
+            'payer_entity_id': state.payer_entity_id,
+            'payee_entity_id': state.payee_entity_id,
+            'election_id': election_id,
+        }
+
+    def get_total(self, lookup):
+        total = DonorElectionTotal.objects.filter(**lookup).values_list('total', flat=True).first()
+        return Decimal(str(total or 0))
+
+    def get_later(self, lookup, state):
+        """(pk, category id, amount) of the transactions counting after the one in state, last first."""
+        return (
+            Transaction.objects.filter(
+                later_than(state),
+                payer_entity_id=lookup['payer_entity_id'],
+                payee_entity_id=lookup['payee_entity_id'],
+                campaign__election_id=lookup['election_id'],
+            )
+            .order_by('-recorded_date', '-pk')
+            .values_list('pk', 'category_id', 'amount')
+        )
+
+    def apply(self, state, sign):
+        if not self.applies(state):
+            return
+        lookup = self.get_total_lookup(state)
+        add_to_row(DonorElectionTotal, lookup, {'total': state.amount * sign, 'count': sign})
+        if sign < 0:
+            DonorElectionTotal.objects.filter(**lookup, count__lte=0).delete()
+
+    def get_running_totals(self, transactions):
+        # Everything a donor gave a committee counts towards the total, like
+        # in CampaignDonorTotal, but only contributions are flagged
+        return (
+            transactions.filter(payer_entity__isnull=False)
+            .annotate(running_total=Window(
+                Sum('amount'),
+                partition_by=[F('payee_entity_id'), F('payer_entity_id'), F('campaign__election_id')],
+                order_by=[F('recorded_date').asc(), F('pk').asc()],
+            ))
+            .filter(running_total__gt=self.limit)
+            .values_list('pk', 'category_id', 'amount', 'running_total')
+        )
+
+    def check(self, instance):
+        state = get_limit_state(instance)
+        if not self.applies(state):
+            return None
+        lookup = self.get_total_lookup(state)
+        later = self.get_later(lookup, state).aggregate(total=Sum('amount'))['total']
+        total = self.get_total(lookup) - Decimal(str(later or 0))
+        return self.get_violation(state.amount, total)
+
+    def find(self, contributions):
+        contribution_id = get_category_id(TransactionCategory, CONTRIBUTION)
+        committees = Campaign.objects.filter(committee_entity__isnull=False).values('committee_entity_id')
+        running = self.get_running_totals(Transaction.objects.filter(payee_entity_id__in=committees))
+        for pk, category_id, amount, running_total in running.iterator():
+            if category_id == contribution_id:
+                yield pk, *self.get_violation(amount, Decimal(str(running_total)))
+
+    def find_later(self, state):
+        if not self.applies(state):
+            return None
+        lookup = self.get_total_lookup(state)
+        later = list(self.get_later(lookup, state))
+        if not later:
+            return None
+        # Counting back from the donor's total, last transaction first
+        contribution_id = get_category_id(TransactionCategory, CONTRIBUTION)
+        running_total = self.get_total(lookup)
+        broken = []
+        for pk, category_id, amount in later:
+            if category_id == contribution_id:
+                violation = self.get_violation(amount, running_total)
+                if violation is not None:
+                    broken.append((pk, *violation))
+            running_total -= amount
+        return [pk for pk, _, _ in later], broken
+
+    def rebuild(self, batch_size):
+        DonorElectionTotal.objects.all().delete()
+        add_donor_totals(Transaction.objects.all(), batch_size)
+
+
+class EntityCategoryRule(Rule):
+    name = 'corporate_contribution'
+    description = "Contributions from entity categories that may not contribute, such as corporations."
+
+    def __init__(self, entity_categories):
+        self.entity_categories = entity_categories
+
+    def get_category_ids(self):
+        return {get_category_id(EntityCategory, name) for name in self.entity_categories} - {None}
+
+    def check(self, instance):
+        if instance.payer_entity_id is None:
+            return None
+        category_id = Entity.objects.filter(pk=instance.payer_entity_id).values_list('category_id', flat=True).first()
+        if category_id not in self.get_category_ids():
+            return None
+        return Decimal(str(instance.amount)), "Contribution from a prohibited source"
+
+    def find(self, contributions):
+        contributions = contributions.filter(payer_entity__category_id__in=self.get_category_ids())
+        for pk, amount in contributions.values_list('pk', 'amount').iterator():
+            yield pk, amount, "Contribution from a prohibited source"
+
+
+class CoverageRule(Rule):
+    name = 'outside_coverage'
+    description = "Contributions dated outside the coverage period of the report listing them."
+
+    def get_detail(self, start, end):
+        return f"Dated outside the report's coverage period of {start} to {end}"
+
+    def check(self, instance):
+        if instance.document_id is None:
+            return None
+        coverage = Document.objects.filter(pk=instance.document_id).values_list(
+            'coverage_start_date', 'coverage_end_date',
+        ).first()
+        recorded_date = instance.recorded_date
+        if isinstance(recorded_date, str):
+            recorded_date = date.fromisoformat(recorded_date)
+        if coverage is None or None in coverage or coverage[0] <= recorded_date <= coverage[1]:
+            return None
+        return Decimal(str(instance.amount)), self.get_detail(*coverage)
+
+    def find(self, contributions):
+        # Reports with no known coverage period are never flagged
+        contributions = contributions.filter(
+            document__coverage_start_date__isnull=False, document__coverage_end_date__isnull=False,
+        )
+        outside = contributions.filter(
+            Q(recorded_date__lt=F('document__coverage_start_date')) | Q(recorded_date__gt=F('document__coverage_end_date'))
+        ).values_list('pk', 'amount', 'document__coverage_start_date', 'document__coverage_end_date')
+        for pk, amount, start, end in outside.iterator():
+            yield pk, amount, self.get_detail(start, end)
+
+
+RULES = {rule.name: rule for rule in (DonorLimitRule, EntityCategoryRule, CoverageRule)}
+
+
+def get_rules():
+    return [RULES[name](**options) for name, options in getattr(settings, 'CONTRIBUTION_RULES', {}).items()]
+
+
+def get_violation_category_id(rule):
+    # Only looked up once a rule is broken, which is rare
+    return ViolationCategory.objects.get_or_create(name=rule.name, defaults={'description': rule.description})[0].pk
+
+
+def check_transaction(instance):
+    """Flags one transaction, replacing its previous violations."""
+    Violation.objects.filter(transaction_id=instance.pk).delete()
+    if instance.category_id is None or instance.category_id != get_category_id(TransactionCategory, CONTRIBUTION):
+        return []
+    violations = []
+    for rule in get_rules():
+        found = rule.check(instance)
+        if found is not None:
+            amount, detail = found
+            violations.append(Violation(
+                category_id=get_violation_category_id(rule),
+                transaction_id=instance.pk,
+                amount=amount,
+                detail=detail,
+            ))
+    return Violation.objects.bulk_create(violations)
+
+
+def apply_change(previous, current):
+    """
+    Moves a changed transaction in what the rules keep track of, given its
+    LimitState before and after the change (None when it was created or
+    deleted). Run before checking it.
+    """
+    if previous == current:
+        return
+    for rule in get_rules():
+        if previous is not None:
+            rule.apply(previous, -1)
+        if current is not None:
+            rule.apply(current, 1)
+
+
+def recheck_later(previous, current):
+    """
+    Flags again the contributions whose violations a change to a transaction
+    may have changed, given its LimitState before and after the change (None
+    when it was created or deleted).
+    """
+    if previous == current:
+        return
+    states = [state for state in (previous, current) if state is not None]
+    if len(states) == 2 and (
+        (previous.payer_entity_id, previous.payee_entity_id, previous.campaign_id)
+        == (current.payer_entity_id, current.payee_entity_id, current.campaign_id)
+    ):
+        # The same scope, checked from the earlier of the two
+        states = [min(states, key=lambda state: state.recorded_date)]
+    rules = get_rules()
+    for state in states:
+        for rule in rules:
+            found = rule.find_later(state)
+            if found is None:
+                continue
+            later, broken = found
+            Violation.objects.filter(transaction_id__in=later, category__name=rule.name).delete()
+            if broken:
+                category_id = get_violation_category_id(rule)
+                Violation.objects.bulk_create([
+                    Violation(category_id=category_id, transaction_id=pk, amount=amount, detail=detail)
+                    for pk, amount, detail in broken
+                ])
+
+
+@transaction.atomic
+def flag_violations(batch_size=5000):
+    """Flags every transaction from scratch. Returns the number of violations by rule."""
+    Violation.objects.all().delete()
+    contributions = filter_by_category(Transaction.objects.all(), TransactionCategory, CONTRIBUTION)
+    use_copy = can_copy()
+    counts = {}
+    for rule in get_rules():
+        rule.rebuild(batch_size)
+        category_id = get_violation_category_id(rule)
+        counts[rule.name] = 0
+        batch = []
+        for transaction_id, amount, detail in rule.find(contributions):
+            batch.append({'category_id': category_id, 'transaction_id': transaction_id, 'amount': amount, 'detail': detail})
+            if len(batch) >= batch_size:
+                insert_rows(Violation, batch, use_copy)
+                counts[rule.name] += len(batch)
+                batch = []
+        if batch:
+            insert_rows(Violation, batch, use_copy)
+            counts[rule.name] += len(batch)
+    return counts
@@ -0,0 +1,27 @@
+import os
+import shutil
+
+# gunicorn reads this file from the directory it is started in.
+#
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to files
+# there, which /metrics adds up (campaignfinance/metrics.py). Start from an
+# empty directory, and stop counting the live values of workers that exited.
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Build the connections graph before the first request needs it
+    from campaignfinance.graph import start_refresh
+    start_refresh()
@@ -42,7 +42,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Times queries, templates and the rest of each request, for the
+    # Server-Timing header and the slow request log
+    # (campaignfinance/instrumentation.py)
+    'campaignfinance.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Answers If-None-Match/If-Modified-Since from the headers views set,
+    # including on page cache hits (campaignfinance/conditional.py)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,7 +62,8 @@ ROOT_URLCONF = 'powertracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, with rendering timed for the middleware above
+        'BACKEND': 'campaignfinance.instrumentation.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,9 +92,21 @@ DATABASES = {
         'PASSWORD': os.environ.get('DJANGO_DATABASE_PASSWORD', 'password'),
         'HOST': os.environ.get('DJANGO_DATABASE_HOST', 'localhost'),
         'PORT': os.environ.get('DJANGO_DATABASE_PORT', '5432'),
+        # Seconds a connection is kept for reuse, 0 closes it after each
+        # request. Under ASGI only the connection pool below keeps them, the
+        # threads requests run in do not outlive the request, so the container
+        # serves WSGI
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0)),
+        # Check that a kept connection still works before reusing it
+        'CONN_HEALTH_CHECKS': bool(int(os.environ.get('DJANGO_CONN_HEALTH_CHECKS', 1))),
     }
 }
 
+# Threads per process that the async views (campaignfinance/asyncviews.py)
+# run their queries on, each with its own persistent connection. 0 runs them
+# in the request's thread, one after the other.
+DATABASE_POOL_SIZE = int(os.environ.get('DJANGO_DATABASE_POOL_SIZE', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -131,7 +151,93 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 
+# Outside DEBUG, collectstatic names static files after a hash of their
+# content and writes compressed copies next to them, which nginx serves with
+# far-future cache headers (campaignfinance/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'campaignfinance.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Have nginx send uploaded document files from its internal MEDIA_URL
+# location, instead of Django (campaignfinance.views.DocumentFileView)
+MEDIA_ACCEL_REDIRECT = int(os.environ.get('DJANGO_MEDIA_ACCEL_REDIRECT', not DEBUG))
+
 CSRF_TRUSTED_ORIGINS = os.environ.get('DJANGO_CSRF_TRUSTED_ORIGINS', 'http://127.0.0.1').split(' ')
+
+# Seconds after which a process rebuilds its in-memory connections graph
+# (campaignfinance/graph.py) to pick up changes made by other processes,
+# such as bulk imports
+GRAPH_MAX_AGE = int(os.environ.get('DJANGO_GRAPH_MAX_AGE', 3600))
+
+# Cache of pages served to anonymous readers (campaignfinance/pagecache.py).
+# Set DJANGO_REDIS_URL, e.g. redis://localhost:6379/0, to share it between
+# processes. The tag versions that make cached pages stale, and that
+# conditional GETs compare, only reach the other processes through it.
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+    CACHE_SHARED = True
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'powertracker',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+    CACHE_SHARED = False
+
+# Seconds a cached page is served for at most, 0 turns the page cache off.
+# Off by default without a shared cache, where a process would keep serving
+# pages changed through the others, or by the import commands.
+PAGE_CACHE_TIMEOUT = int(os.environ.get('DJANGO_PAGE_CACHE_TIMEOUT', 600 if CACHE_SHARED else 0))
+
+# Rules that flag contributions (campaignfinance/violations.py), by name with
+# their options. Remove a rule to turn it off, and run
+# `manage.py flag_violations` after changing them.
+CONTRIBUTION_RULES = {
+    # Most a donor may give a campaign's committee per election, in dollars
+    'over_limit': {'limit': os.environ.get('DJANGO_CONTRIBUTION_LIMIT', '3300.00')},
+    # Entity categories that may not contribute
+    'corporate_contribution': {'entity_categories': ['corporation']},
+    # Contributions dated outside the coverage period of the report listing them
+    'outside_coverage': {},
+}
+
+# Time queries, templates and the rest of each request, for the Server-Timing
+# header and the request metrics at /metrics, and log requests slower than
+# SLOW_REQUEST_MS milliseconds with the queries they repeat
+# (campaignfinance/instrumentation.py)
+REQUEST_INSTRUMENTATION = int(os.environ.get('DJANGO_REQUEST_INSTRUMENTATION', 1))
+SLOW_REQUEST_MS = int(os.environ.get('DJANGO_SLOW_REQUEST_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'campaignfinance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}